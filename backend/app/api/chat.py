@@ -27,14 +27,20 @@ async def chat(request: ChatRequest):
         logger.info("Chat request received", 
                    query=request.query[:100] + "..." if len(request.query) > 100 else request.query,
                    top_k=request.top_k,
-                   use_local_llm=request.use_local_llm)
+                   use_local_llm=request.use_local_llm,
+                   document_ids=request.document_ids,
+                   ef_search=request.ef_search)
         
         # Validate query
         if not request.query or not request.query.strip():
             raise ValueError("Query cannot be empty")
         
-        # Search for relevant documents
-        context_chunks = vector_store.search(request.query, top_k=request.top_k)
+        # Search for relevant documents, only within the requested ones if scoped
+        metadata_filter = {"document_id": request.document_ids} if request.document_ids else None
+        context_chunks = await vector_store.asearch(request.query,
+                                                    top_k=request.top_k,
+                                                    metadata_filter=metadata_filter,
+                                                    ef_search=request.ef_search)
         
         if not context_chunks:
             logger.warning("No relevant context found for query", query=request.query)
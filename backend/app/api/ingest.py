@@ -1,16 +1,21 @@
 """
 Data ingestion API endpoints
 """
+import functools
+import hashlib
 import time
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 
 import sqlalchemy
 from sqlalchemy import create_engine, text
 from fastapi import APIRouter, HTTPException
 
-from ..models.schemas import IngestRequest, IngestResponse, ErrorResponse
+from ..models.schemas import IngestRequest, IngestResponse, IngestJobResponse, ErrorResponse
+from ..core.chunker import FileChunker
 from ..core.file_processor import file_processor
+from ..core.ingest_jobs import IngestJob, IngestJobQueue
+from ..core.ingest_pipeline import IngestPipeline
 from ..core.vector_store import vector_store
 from ..core.logging import get_logger
 from .database import active_connections
@@ -19,56 +24,39 @@ logger = get_logger("ingest_api")
 router = APIRouter(prefix="/ingest", tags=["ingest"])
 
 
-@router.post("/", response_model=IngestResponse)
+@router.post("/", response_model=IngestJobResponse, status_code=202)
 async def ingest_data(request: IngestRequest):
     """
-    Ingest data from files or database into the vector store
+    Queue an ingestion of files or a database into the vector store
+    
+    The work runs on the background job pool; poll `GET /ingest/jobs/{job_id}`
+    for progress and the result.
     
     Args:
         request: Ingestion request with source type and parameters
         
     Returns:
-        IngestResponse: Ingestion status and statistics
+        IngestJobResponse: The queued job
     """
-    start_time = time.time()
-    
     try:
         logger.info("Data ingestion request received", 
                    source_type=request.source_type,
                    chunk_size=request.chunk_size)
         
-        documents = []
-        
+        # Reject requests that cannot succeed before queueing them
         if request.source_type == "files":
-            documents = await _ingest_from_files(request.file_ids or [])
+            if not request.file_ids:
+                raise ValueError("No file IDs provided")
         elif request.source_type == "database":
-            documents = await _ingest_from_database(request.connection_id)
+            if request.connection_id not in active_connections:
+                raise ValueError(f"Connection {request.connection_id} not found")
         else:
             raise ValueError(f"Unsupported source type: {request.source_type}")
         
-        if not documents:
-            raise ValueError("No documents found to ingest")
-        
-        # Add documents to vector store
-        vector_store.add_documents(documents)
-        
-        processing_time = time.time() - start_time
-        stats = vector_store.get_stats()
-        
-        response = IngestResponse(
-            status="success",
-            message=f"Successfully ingested {len(documents)} documents",
-            chunks_processed=len(documents),
-            index_size=stats["total_documents"],
-            processing_time=processing_time
-        )
-        
-        logger.info("Data ingestion completed successfully",
-                   documents_processed=len(documents),
-                   processing_time=processing_time,
-                   total_index_size=stats["total_documents"])
-        
-        return response
+        # Connections live in this process only, so database jobs cannot resume after a restart
+        restart_error = "Connection lost on restart" if request.source_type == "database" else None
+        job = ingest_jobs.submit(request.dict(), restart_error=restart_error)
+        return IngestJobResponse(**job.to_dict())
         
     except ValueError as e:
         logger.error("Data ingestion failed - validation error", error=str(e))
@@ -79,136 +67,236 @@ async def ingest_data(request: IngestRequest):
         raise HTTPException(status_code=500, detail=f"Data ingestion failed: {str(e)}")
 
 
-async def _ingest_from_files(file_ids: List[str]) -> List[Dict[str, Any]]:
-    """Ingest data from uploaded files"""
-    try:
-        documents = []
-        upload_dir = Path(file_processor.upload_dir)
-        
-        for file_id in file_ids:
-            # Find the file by ID
-            file_path = None
-            file_type = None
-            
-            for ext in [".pdf", ".csv", ".docx"]:
-                potential_path = upload_dir / f"{file_id}{ext}"
-                if potential_path.exists():
-                    file_path = potential_path
-                    file_type = ext[1:]  # Remove the dot
-                    break
-            
-            if not file_path or not file_path.exists():
-                logger.warning("File not found for ingestion", file_id=file_id)
-                continue
-            
-            # Extract text from file
-            text = file_processor.extract_text(str(file_path), file_type)
-            
-            # Chunk the text
-            chunks = file_processor.chunk_text(text, 
-                                             chunk_size=1000, 
-                                             chunk_overlap=200)
-            
-            # Create documents for each chunk
-            for i, chunk in enumerate(chunks):
-                document = {
-                    "text": chunk,
-                    "metadata": {
-                        "file_id": file_id,
-                        "file_name": file_path.name,
-                        "file_type": file_type,
-                        "chunk_index": i,
-                        "total_chunks": len(chunks),
-                        "source": "file_upload"
-                    }
-                }
-                documents.append(document)
-            
-            logger.info("File processed for ingestion", 
-                       file_id=file_id,
-                       file_name=file_path.name,
-                       chunks_created=len(chunks))
+@router.get("/jobs", response_model=List[IngestJobResponse])
+async def list_ingest_jobs():
+    """
+    List ingestion jobs, newest first
+    
+    Returns:
+        List[IngestJobResponse]: Queued, running and recently finished jobs
+    """
+    return [IngestJobResponse(**job.to_dict()) for job in ingest_jobs.list_jobs()]
+
+
+@router.get("/jobs/{job_id}", response_model=IngestJobResponse)
+async def get_ingest_job(job_id: str):
+    """
+    Get the status and per-stage progress of an ingestion job
+    
+    Args:
+        job_id: Job ID returned by `POST /ingest/`
         
-        return documents
+    Returns:
+        IngestJobResponse: Job status, progress and, once completed, the result
+    """
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Ingestion job {job_id} not found")
+    return IngestJobResponse(**job.to_dict())
+
+
+@router.delete("/jobs/{job_id}", response_model=IngestJobResponse)
+async def cancel_ingest_job(job_id: str):
+    """
+    Cancel an ingestion job
+    
+    Queued jobs are cancelled at once; running jobs stop before their next
+    index append. Documents already committed stay in the vector store, and
+    the chunks of the document in progress are removed.
+    
+    Args:
+        job_id: Job ID returned by `POST /ingest/`
         
-    except Exception as e:
-        logger.error("Failed to ingest from files", error=str(e))
-        raise
+    Returns:
+        IngestJobResponse: The job after the cancellation request
+    """
+    job = ingest_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Ingestion job {job_id} not found")
+    return IngestJobResponse(**job.to_dict())
 
 
-async def _ingest_from_database(connection_id: str) -> List[Dict[str, Any]]:
-    """Ingest data from database connection"""
-    try:
-        if connection_id not in active_connections:
-            raise ValueError(f"Connection {connection_id} not found")
+def _run_ingest_job(job: IngestJob) -> Dict[str, Any]:
+    """
+    Run an ingestion job on a worker thread
+    
+    Returns:
+        dict: IngestResponse fields, stored as the job result
+    """
+    start_time = time.time()
+    request = IngestRequest(**job.request)
+    
+    if request.source_type == "files":
+        job.set_total(len(request.file_ids or []))
+        # FileChunker sizes are in tokens, the request's in characters
+        chunker = FileChunker(chunk_size=max(1, request.chunk_size // 4),
+                              chunk_overlap=request.chunk_overlap // 4)
+        sources = _ingest_from_files(request.file_ids or [], chunker, request.document_ids or {})
+    elif request.source_type == "database":
+        sources = _ingest_from_database(request.connection_id, job)
+    else:
+        raise ValueError(f"Unsupported source type: {request.source_type}")
+    
+    # Parsing, chunking, embedding and indexing overlap; each source document
+    # is committed (added, replaced or skipped) as a unit once fully indexed
+    pipeline = IngestPipeline(vector_store, chunk_size=request.chunk_size, chunk_overlap=request.chunk_overlap)
+    results = pipeline.run(sources, on_progress=job.advance, checkpoint=job.checkpoint)
+    
+    if not results:
+        raise ValueError("No documents found to ingest")
+    
+    counts = {status: sum(1 for r in results if r["status"] == status)
+              for status in ("added", "replaced", "unchanged")}
+    chunks_processed = sum(r["chunks_added"] for r in results)
+    
+    processing_time = time.time() - start_time
+    stats = vector_store.get_stats()
+    
+    response = IngestResponse(
+        status="success",
+        message=(f"Ingested {len(results)} documents: {counts['added']} added, "
+                 f"{counts['replaced']} replaced, {counts['unchanged']} unchanged"),
+        chunks_processed=chunks_processed,
+        index_size=stats["total_documents"],
+        processing_time=processing_time,
+        documents_added=counts["added"],
+        documents_replaced=counts["replaced"],
+        documents_unchanged=counts["unchanged"]
+    )
+    
+    logger.info("Data ingestion completed successfully",
+               job_id=job.job_id,
+               documents_processed=len(results),
+               chunks_processed=chunks_processed,
+               **{f"documents_{status}": count for status, count in counts.items()},
+               processing_time=processing_time,
+               total_index_size=stats["total_documents"])
+    
+    return response.dict()
+
+
+def _ingest_from_files(file_ids: List[str], chunker: FileChunker,
+                       document_ids: Dict[str, str]) -> Iterator[Dict[str, Any]]:
+    """
+    Ingest data from uploaded files
+    
+    Yields one source per file with its document ID, content hash, chunk
+    metadata and a chunk reader; `chunker` parses the file page by page
+    (PDF pages on its worker processes) as the pipeline pulls them. Files
+    whose content is already indexed are marked unchanged, so they are
+    skipped before any parsing.
+    
+    Each file is its own document unless `document_ids` maps its file ID to
+    an existing document ID, in which case it replaces that document.
+    """
+    upload_dir = Path(file_processor.upload_dir)
+    
+    for file_id in file_ids:
+        # Find the file by ID
+        file_path = None
+        file_type = None
         
-        connection_info = active_connections[connection_id]
-        engine = create_engine(connection_info["db_url"], echo=False)
+        for ext in [".pdf", ".csv", ".docx"]:
+            potential_path = upload_dir / f"{file_id}{ext}"
+            if potential_path.exists():
+                file_path = potential_path
+                file_type = ext[1:]  # Remove the dot
+                break
         
-        documents = []
+        if not file_path or not file_path.exists():
+            logger.warning("File not found for ingestion", file_id=file_id)
+            continue
         
-        with engine.connect() as connection:
-            # Get all tables
-            tables = connection_info["tables"]
-            
-            for table_name in tables:
-                try:
-                    # Get table data
-                    query = text(f"SELECT * FROM {table_name} LIMIT 1000")  # Limit for safety
-                    result = connection.execute(query)
-                    rows = result.fetchall()
-                    
-                    # Convert rows to text
-                    if rows:
-                        # Get column names
-                        columns = result.keys()
-                        
-                        # Create text representation
-                        table_text = f"Table: {table_name}\n"
-                        table_text += f"Columns: {', '.join(columns)}\n\n"
-                        
-                        for i, row in enumerate(rows):
-                            row_text = f"Row {i + 1}: "
-                            for col in columns:
-                                row_text += f"{col}: {row[col]}, "
-                            table_text += row_text.rstrip(", ") + "\n"
-                        
-                        # Chunk the table text
-                        chunks = file_processor.chunk_text(table_text, 
-                                                         chunk_size=1000, 
-                                                         chunk_overlap=200)
-                        
-                        # Create documents for each chunk
-                        for j, chunk in enumerate(chunks):
-                            document = {
-                                "text": chunk,
-                                "metadata": {
-                                    "table_name": table_name,
-                                    "connection_id": connection_id,
-                                    "chunk_index": j,
-                                    "total_chunks": len(chunks),
-                                    "source": "database",
-                                    "row_count": len(rows)
-                                }
-                            }
-                            documents.append(document)
-                        
-                        logger.info("Table processed for ingestion", 
-                                   table_name=table_name,
-                                   rows=len(rows),
-                                   chunks_created=len(chunks))
-                
-                except Exception as e:
-                    logger.warning("Failed to process table", 
-                                 table_name=table_name, 
-                                 error=str(e))
-                    continue
+        # Uploads sharing a name stay separate documents unless the caller asks for a replacement
+        document_id = document_ids.get(file_id) or f"file:{file_id}"
+        file_name = file_processor.get_file_info(file_id).get("filename") or file_path.name
+        content_hash = file_processor.get_file_hash(str(file_path))
         
-        return documents
+        unchanged = vector_store.is_document_current(document_id, content_hash)
+        if unchanged:
+            logger.info("File unchanged since last ingestion", file_id=file_id, document_id=document_id)
         
-    except Exception as e:
-        logger.error("Failed to ingest from database", error=str(e))
-        raise
+        yield {
+            "document_id": document_id,
+            "content_hash": content_hash,
+            "unchanged": unchanged,
+            "metadata": {
+                "file_id": file_id,
+                "file_name": file_name,
+                "file_type": file_type,
+                "source": "file_upload"
+            },
+            "chunks": functools.partial(chunker.iter_chunks, file_path)
+        }
+
+
+def _ingest_from_database(connection_id: str, job: IngestJob) -> Iterator[Dict[str, Any]]:
+    """Ingest data from database connection, one source document per table"""
+    if connection_id not in active_connections:
+        raise ValueError(f"Connection {connection_id} not found")
+    
+    connection_info = active_connections[connection_id]
+    engine = create_engine(connection_info["db_url"], echo=False)
+    
+    # Tables are identified by database and name, without exposing credentials
+    database_key = hashlib.md5(connection_info["db_url"].encode("utf-8")).hexdigest()[:12]
+    
+    with engine.connect() as connection:
+        # Get all tables
+        tables = connection_info["tables"]
+        job.set_total(len(tables))
+        
+        for table_name in tables:
+            try:
+                # Get table data
+                query = text(f"SELECT * FROM {table_name} LIMIT 1000")  # Limit for safety
+                result = connection.execute(query)
+                rows = result.fetchall()
+                
+                # Convert rows to text
+                if not rows:
+                    continue
+                
+                # Get column names
+                columns = result.keys()
+                
+                # Create text representation
+                table_text = f"Table: {table_name}\n"
+                table_text += f"Columns: {', '.join(columns)}\n\n"
+                
+                for i, row in enumerate(rows):
+                    row_text = f"Row {i + 1}: "
+                    for col in columns:
+                        row_text += f"{col}: {row[col]}, "
+                    table_text += row_text.rstrip(", ") + "\n"
+                
+                source = {
+                    "document_id": f"db:{database_key}:{table_name}",
+                    "content_hash": hashlib.md5(table_text.encode("utf-8")).hexdigest(),
+                    "metadata": {
+                        "table_name": table_name,
+                        "connection_id": connection_id,
+                        "source": "database",
+                        "row_count": len(rows)
+                    },
+                    "pages": functools.partial(iter, [table_text])
+                }
+                
+                source["unchanged"] = vector_store.is_document_current(source["document_id"], source["content_hash"])
+                if source["unchanged"]:
+                    logger.info("Table unchanged since last ingestion", table_name=table_name)
+                
+                logger.info("Table read for ingestion", 
+                           table_name=table_name,
+                           rows=len(rows))
+            
+            except Exception as e:
+                logger.warning("Failed to process table", 
+                             table_name=table_name, 
+                             error=str(e))
+                continue
+            
+            yield source
 
 
 @router.get("/status")
@@ -227,6 +315,7 @@ async def get_ingestion_status():
         return {
             "status": "success",
             "vector_store_stats": stats,
+            "ingest_jobs": ingest_jobs.get_stats(),
             "message": f"Vector store contains {stats['total_documents']} documents"
         }
         
@@ -258,3 +347,7 @@ async def clear_vector_store():
     except Exception as e:
         logger.error("Failed to clear vector store", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to clear vector store")
+
+
+# Background ingestion jobs (started and stopped with the application)
+ingest_jobs = IngestJobQueue(_run_ingest_job)
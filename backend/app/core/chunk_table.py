@@ -0,0 +1,1031 @@
+"""
+Columnar Chunk Storage for PrivAI
+Chunk metadata stored as columns keyed by FAISS vector id, memory-mappable on disk
+"""
+import hashlib
+import io
+import json
+import math
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Iterable, Set, Tuple
+
+import numpy as np
+
+from .logging import get_logger
+
+logger = get_logger("chunk_table")
+
+# Rows are stored in FAISS vector id order; int64 chunk ids also get a sorted copy for lookups
+CHUNK_TABLE_FILES = {
+    "chunk_ids": "chunk_ids.npy",
+    "vector_ids": "chunk_vector_ids.npy",
+    "sorted_chunk_ids": "chunk_ids_sorted.npy",
+    "sorted_rows": "chunk_ids_sorted_rows.npy",
+    "text_offsets": "chunk_text_offsets.npy",
+    "text": "chunk_text.bin",
+    "record_offsets": "chunk_record_offsets.npy",
+    "records": "chunk_records.bin",
+}
+DICTIONARY_FILE = "chunk_dictionary.json"
+FIELD_FILE = "chunk_field_{}.npy"
+
+# String metadata fields shared by many chunks, stored as int32 codes into one dictionary
+DICTIONARY_FIELDS = (
+    "document_id", "source_file", "file_name", "file_type",
+    "chunk_type", "table_name", "source"
+)
+
+# Integer metadata fields stored as int64 columns, for range filters
+NUMERIC_FIELDS = ("page_number",)
+MISSING_NUMBER = np.iinfo(np.int64).min
+
+# Fields with inverted indexes for filtered search
+INDEXED_FIELDS = DICTIONARY_FIELDS + NUMERIC_FIELDS
+
+# Removal version of rows that were never removed
+LIVE = np.iinfo(np.int64).max
+
+# Visibility version of staged rows: past any version a view is taken at, so only
+# the store's own lookups (made as of STAGED) see them until they are published
+STAGED = LIVE - 1
+
+# Operators of range conditions, e.g. {"page_number": {"gte": 3, "lte": 7}}
+RANGE_OPERATORS = ("gt", "gte", "lt", "lte")
+
+# Entry fields rebuilt on read rather than stored per row
+_DERIVED_FIELDS = ("text", "metadata", "embedding_dim")
+
+# Chunk ids derived from content take the upper half of the 53-bit range: they
+# never meet ids allocated from the vector id counter, and stay exact as JSON
+# numbers in JavaScript clients
+DERIVED_CHUNK_ID_BASE = 1 << 52
+
+
+def derive_chunk_id(content_hash: str, chunk_index: int) -> int:
+    """
+    Stable chunk id of a chunk position in some content, the same on every ingestion.
+
+    Args:
+        content_hash: Hash of the file or document content
+        chunk_index: Index of the chunk within it
+
+    Returns:
+        Chunk id in the derived range
+    """
+    digest = hashlib.blake2b(f"{content_hash}:{chunk_index}".encode("utf-8"), digest_size=8).digest()
+    return DERIVED_CHUNK_ID_BASE | (int.from_bytes(digest, "big") & (DERIVED_CHUNK_ID_BASE - 1))
+
+
+def next_derived_chunk_id(chunk_id: int) -> int:
+    """Next id of the derived range, for probing past a collision."""
+    return DERIVED_CHUNK_ID_BASE | ((chunk_id + 1) & (DERIVED_CHUNK_ID_BASE - 1))
+
+
+def _npy_bytes(array_: np.ndarray) -> bytes:
+    """Serialize an array in .npy format."""
+    buffer = io.BytesIO()
+    np.save(buffer, array_, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def _offsets(lengths: np.ndarray) -> np.ndarray:
+    """Heap offsets (n + 1 entries) from value lengths."""
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _is_int(value: Any) -> bool:
+    """Whether a value can be stored in a numeric column."""
+    return (isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_))
+            and MISSING_NUMBER < value <= np.iinfo(np.int64).max)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_))
+
+
+def matches_condition(value: Any, condition: Any) -> bool:
+    """
+    Check a metadata value against a filter condition.
+
+    A condition is a value (equality), a list/tuple/set of values (any of), or
+    a dict of range operators (`gt`, `gte`, `lt`, `lte`) for numbers.
+
+    Args:
+        value: Metadata value (None if the field is missing)
+        condition: Filter condition
+
+    Returns:
+        True if the value satisfies the condition
+    """
+    if isinstance(condition, dict):
+        if not _is_number(value) or not condition or set(condition) - set(RANGE_OPERATORS):
+            return False
+        return all((op == "gt" and value > bound) or (op == "gte" and value >= bound) or
+                   (op == "lt" and value < bound) or (op == "lte" and value <= bound)
+                   for op, bound in condition.items())
+    if isinstance(condition, (list, tuple, set, frozenset)):
+        return value in condition
+    return value == condition
+
+
+def _parse_condition(field: str, condition: Any) -> Optional[List[Tuple[Any, Any]]]:
+    """
+    Translate a condition on an indexed field into inclusive (low, high) value ranges.
+
+    Returns:
+        Ranges of field values (strings for dictionary fields), or None if the
+        condition cannot be answered from the field's index
+    """
+    values = list(condition) if isinstance(condition, (list, tuple, set, frozenset)) else [condition]
+
+    if field in DICTIONARY_FIELDS:
+        if not all(isinstance(value, str) for value in values):
+            return None
+        return [(value, value) for value in values]
+
+    if field in NUMERIC_FIELDS:
+        if isinstance(condition, dict):
+            if not condition or set(condition) - set(RANGE_OPERATORS) or not all(map(_is_number, condition.values())):
+                return None
+            low, high = MISSING_NUMBER + 1, int(np.iinfo(np.int64).max)
+            if "gte" in condition:
+                low = max(low, math.ceil(condition["gte"]))
+            if "gt" in condition:
+                low = max(low, math.floor(condition["gt"]) + 1)
+            if "lte" in condition:
+                high = min(high, math.floor(condition["lte"]))
+            if "lt" in condition:
+                high = min(high, math.ceil(condition["lt"]) - 1)
+            return [(low, high)] if low <= high else []
+        if not all(_is_int(value) for value in values):
+            return None
+        return [(int(value), int(value)) for value in values]
+
+    return None
+
+
+def _union(parts: List[np.ndarray]) -> np.ndarray:
+    """Sorted union of row arrays."""
+    if not parts:
+        return np.zeros(0, dtype=np.int64)
+    return np.unique(np.concatenate(parts)).astype(np.int64, copy=False)
+
+
+def _gather_heap(heap: np.ndarray, offsets: np.ndarray, rows: Optional[np.ndarray]) -> Tuple[bytes, np.ndarray]:
+    """Copy the values of some rows (all if None) out of a byte heap, returning (bytes, lengths)."""
+    if rows is None:
+        return heap.tobytes(), np.diff(offsets)
+    starts, ends = offsets[rows], offsets[rows + 1]
+    data = b"".join(heap[start:end].tobytes() for start, end in zip(starts.tolist(), ends.tolist()))
+    return data, ends - starts
+
+
+class ChunkTable:
+    """
+    Read-only columns of one snapshot's chunk metadata.
+
+    Chunk ids and vector ids are int64 arrays, dictionary fields are
+    int32 code columns, numeric fields int64 columns, and chunk text and the remaining entry fields (JSON)
+    live in byte heaps addressed by offsets. Loaded with mmap, nothing is
+    parsed at startup and the pages are shared between processes.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], fields: Dict[str, np.ndarray], dictionary: List[str]):
+        """
+        Initialize the table.
+
+        Args:
+            columns: Arrays keyed like CHUNK_TABLE_FILES
+            fields: Code column of each dictionary field and value column of each numeric field
+            dictionary: Values of the dictionary codes
+        """
+        self.chunk_ids = columns["chunk_ids"]
+        self.vector_ids = columns["vector_ids"]
+        self.sorted_chunk_ids = columns["sorted_chunk_ids"]
+        self.sorted_rows = columns["sorted_rows"]
+        self.text = columns["text"]
+        self.text_offsets = columns["text_offsets"]
+        self.records = columns["records"]
+        self.record_offsets = columns["record_offsets"]
+        self.fields = fields
+        self.dictionary = dictionary
+
+        # Tables written before int64 chunk ids stored UUID strings; those
+        # chunks take their vector id as chunk id, and the strings are kept
+        # only to translate references to them (see `find_legacy_chunk`)
+        self.legacy_chunk_ids: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        if self.chunk_ids.dtype.kind == "S":
+            self.legacy_chunk_ids = (self.sorted_chunk_ids, self.sorted_rows)
+            self.chunk_ids = self.sorted_chunk_ids = self.vector_ids
+            self.sorted_rows = np.arange(len(self.vector_ids), dtype=np.int64)
+
+    @staticmethod
+    def serialize(chunk_ids: np.ndarray,
+                  vector_ids: np.ndarray,
+                  fields: Dict[str, np.ndarray],
+                  dictionary: List[str],
+                  text: bytes,
+                  text_lengths: np.ndarray,
+                  records: bytes,
+                  record_lengths: np.ndarray) -> Dict[str, bytes]:
+        """
+        Build the table files from columns sorted by vector id.
+
+        Returns:
+            File contents by file name
+        """
+        chunk_ids = chunk_ids.astype(np.int64)
+        sorted_rows = np.argsort(chunk_ids, kind="stable").astype(np.int64)
+
+        files = {
+            CHUNK_TABLE_FILES["chunk_ids"]: _npy_bytes(chunk_ids),
+            CHUNK_TABLE_FILES["vector_ids"]: _npy_bytes(vector_ids.astype(np.int64)),
+            CHUNK_TABLE_FILES["sorted_chunk_ids"]: _npy_bytes(chunk_ids[sorted_rows]),
+            CHUNK_TABLE_FILES["sorted_rows"]: _npy_bytes(sorted_rows),
+            CHUNK_TABLE_FILES["text_offsets"]: _npy_bytes(_offsets(text_lengths)),
+            CHUNK_TABLE_FILES["text"]: text,
+            CHUNK_TABLE_FILES["record_offsets"]: _npy_bytes(_offsets(record_lengths)),
+            CHUNK_TABLE_FILES["records"]: records,
+            DICTIONARY_FILE: json.dumps(dictionary).encode("utf-8"),
+        }
+        for field, codes in fields.items():
+            files[FIELD_FILE.format(field)] = _npy_bytes(codes.astype(np.int64 if field in NUMERIC_FIELDS else np.int32))
+
+        return files
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True,
+             files: Optional[Dict[str, str]] = None) -> Optional["ChunkTable"]:
+        """
+        Load a table saved by `serialize`.
+
+        Args:
+            directory: Directory holding the table files
+            mmap: Map the files read-only instead of reading them into memory
+            files: File name by the name `serialize` gave it, e.g. from a
+                snapshot manifest (files keep those names if omitted)
+
+        Returns:
+            ChunkTable, or None if the directory has no table
+        """
+        directory = Path(directory)
+        files = files or {}
+        paths = {column: directory / files.get(name, name) for column, name in CHUNK_TABLE_FILES.items()}
+        if not all(path.exists() for path in paths.values()):
+            return None
+
+        mmap_mode = "r" if mmap else None
+        columns = {}
+        for column, path in paths.items():
+            if path.suffix == ".npy":
+                columns[column] = np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+            elif mmap and path.stat().st_size:
+                columns[column] = np.memmap(path, dtype=np.uint8, mode="r")
+            else:
+                columns[column] = np.fromfile(path, dtype=np.uint8)
+
+        # Tables written before dictionary encoding keep every field in the records
+        dictionary_path = directory / files.get(DICTIONARY_FILE, DICTIONARY_FILE)
+        dictionary = json.loads(dictionary_path.read_text(encoding="utf-8")) if dictionary_path.exists() else []
+        fields = {}
+        for field in INDEXED_FIELDS:
+            name = FIELD_FILE.format(field)
+            path = directory / files.get(name, name)
+            if path.exists():
+                fields[field] = np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+
+        table = cls(columns, fields, dictionary)
+        logger.info("Chunk table loaded", rows=len(table), dictionary_size=len(dictionary), mmap=mmap)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def find_chunk(self, chunk_id: int) -> int:
+        """Row of a chunk id, or -1."""
+        position = int(np.searchsorted(self.sorted_chunk_ids, chunk_id))
+        if position < len(self.sorted_chunk_ids) and self.sorted_chunk_ids[position] == chunk_id:
+            return int(self.sorted_rows[position])
+        return -1
+
+    def find_legacy_chunk(self, chunk_id: str) -> int:
+        """Row of a UUID string chunk id of an older table, or -1."""
+        if self.legacy_chunk_ids is None:
+            return -1
+        sorted_ids, rows = self.legacy_chunk_ids
+        key = chunk_id.encode("utf-8")
+        position = int(np.searchsorted(sorted_ids, key))
+        if position < len(sorted_ids) and sorted_ids[position] == key:
+            return int(rows[position])
+        return -1
+
+    def find_vector(self, vector_id: int) -> int:
+        """Row of a FAISS vector id, or -1."""
+        position = int(np.searchsorted(self.vector_ids, vector_id))
+        if position < len(self.vector_ids) and self.vector_ids[position] == vector_id:
+            return position
+        return -1
+
+    def text_bytes(self, row: int) -> bytes:
+        return self.text[self.text_offsets[row]:self.text_offsets[row + 1]].tobytes()
+
+    def record_bytes(self, row: int) -> bytes:
+        return self.records[self.record_offsets[row]:self.record_offsets[row + 1]].tobytes()
+
+
+class _Column:
+    """
+    Append-only numeric column that searches read while chunks are added.
+
+    Rows are written past the end that published views read up to. Growing
+    copies the rows into a new array, so a reader still holding the old array
+    keeps a consistent prefix.
+    """
+
+    def __init__(self, dtype, capacity: int = 1024):
+        self.data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values: List[int]) -> None:
+        end = self.size + len(values)
+        if end > len(self.data):
+            grown = np.empty(max(end, 2 * len(self.data)), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:end] = values
+        self.size = end
+
+    def set(self, row: int, value: int) -> None:
+        self.data[row] = value
+
+    def view(self, size: Optional[int] = None) -> np.ndarray:
+        """The first `size` rows (all rows if None)."""
+        # The size is read before the array, which holds at least that many rows even if grown meanwhile
+        size = self.size if size is None else size
+        return self.data[:size]
+
+    def __getitem__(self, row: int) -> int:
+        return int(self.data[row])
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class ChunkStore:
+    """
+    Columnar chunk metadata keyed by FAISS vector id.
+
+    Rows loaded from a snapshot stay in the (possibly memory-mapped)
+    ChunkTable; rows added since are appended to compact in-memory columns
+    (arrays, encoded text and JSON records) instead of one dict per chunk.
+    Vector ids only grow, so both parts are sorted by vector id. Text and
+    metadata are decoded only for the rows a caller asks for.
+
+    Indexed fields (`INDEXED_FIELDS`) have inverted indexes: snapshot columns
+    are sorted on first use, and in-memory rows are indexed as they are added,
+    so `select` finds matching chunks without decoding any row.
+
+    Changes are versioned: every add and removal bumps `version`, and a
+    removed row records the version that removed it instead of being cleared.
+    `snapshot()` returns a ChunkView that keeps seeing the chunks of its
+    version, so searches read views while one writer at a time changes the store.
+
+    Rows can be added staged: they record the version that published them,
+    which is `STAGED` until `publish` is called, so no view sees them before.
+    The store's own lookups do see them, as writers need to fold, remove or
+    export their vectors.
+    """
+
+    def __init__(self, embedding_dim: int, table: Optional[ChunkTable] = None):
+        """
+        Initialize the store.
+
+        Args:
+            embedding_dim: Embedding dimension reported in chunk entries
+            table: Snapshot table holding the initial rows
+        """
+        self.embedding_dim = embedding_dim
+        self.version = 0
+        self._attach(table)
+
+    def _attach(self, table: Optional[ChunkTable]) -> None:
+        """Reset the store to the rows of a table."""
+        self.table = table
+        self._base_rows = len(table) if table is not None else 0
+        self._base_removed: Optional[np.ndarray] = None  # Removal version per row, allocated on the first removal
+        self._base_dead = 0
+        self._base_columns: Dict[str, np.ndarray] = {}  # Fields of older tables, decoded on first use
+        self._base_postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+        self.dictionary = list(table.dictionary) if table is not None else []
+        self._codes = {value: code for code, value in enumerate(self.dictionary)}
+        # Searches add dictionary values too, when they decode the fields of older tables
+        self._codes_lock = threading.Lock()
+
+        self._vector_ids = _Column(np.int64)
+        self._chunk_ids = _Column(np.int64)
+        self._removed = _Column(np.int64)
+        self._added = _Column(np.int64)  # Version that made each in-memory row visible
+        self._staged: Set[int] = set()  # In-memory rows added staged and not yet published
+        self._rows_by_chunk: Dict[int, int] = {}
+        self._legacy_ids: Dict[str, int] = {}  # UUID string ids of older snapshots
+        self._text: List[bytes] = []
+        self._records: List[bytes] = []
+        self._fields = {field: _Column(np.int32) for field in DICTIONARY_FIELDS}
+        self._fields.update({field: _Column(np.int64) for field in NUMERIC_FIELDS})
+        self._postings: Dict[str, Dict[int, _Column]] = {field: {} for field in DICTIONARY_FIELDS}
+        self._dead = 0
+
+    @classmethod
+    def from_dicts(cls,
+                   embedding_dim: int,
+                   chunk_metadata: Dict[str, Dict[str, Any]],
+                   chunk_id_to_index: Dict[str, int]) -> "ChunkStore":
+        """
+        Build a store from the pickled dicts of older snapshots.
+
+        The UUID string chunk ids are replaced by the vector ids, and stay
+        resolvable through `legacy_chunk_id`.
+
+        Args:
+            embedding_dim: Embedding dimension
+            chunk_metadata: Chunk entries by UUID string chunk id
+            chunk_id_to_index: FAISS vector id by UUID string chunk id
+
+        Returns:
+            ChunkStore holding the same chunks
+        """
+        store = cls(embedding_dim)
+        rows = sorted((vector_id, chunk_id) for chunk_id, vector_id in chunk_id_to_index.items()
+                      if chunk_id in chunk_metadata)
+        if rows:
+            vector_ids = [vector_id for vector_id, _ in rows]
+            store.add(vector_ids, [chunk_metadata[chunk_id] for _, chunk_id in rows], vector_ids)
+            store.map_legacy_ids([chunk_id for _, chunk_id in rows], vector_ids)
+        return store
+
+    def _code(self, value: str) -> int:
+        """Dictionary code of a string, adding it if new."""
+        code = self._codes.get(value)
+        if code is None:
+            with self._codes_lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = len(self.dictionary)
+                    self.dictionary.append(value)
+                    self._codes[value] = code
+        return code
+
+    def _rows(self) -> int:
+        """Rows written so far, snapshot and in-memory."""
+        return self._base_rows + len(self._vector_ids)
+
+    def _last_vector_id(self) -> int:
+        if len(self._vector_ids):
+            return self._vector_ids[len(self._vector_ids) - 1]
+        return int(self.table.vector_ids[-1]) if self._base_rows else -1
+
+    def add(self,
+            chunk_ids: List[int],
+            entries: List[Dict[str, Any]],
+            vector_ids: Iterable[int],
+            staged: bool = False) -> None:
+        """
+        Append chunks; vector ids must be greater than any already stored.
+
+        Args:
+            chunk_ids: Chunk IDs, not held by any live chunk
+            entries: Chunk entries with 'text' and 'metadata'
+            vector_ids: FAISS vector ids of the chunks
+            staged: Hide the chunks from views until `publish`
+        """
+        vector_ids = [int(vector_id) for vector_id in vector_ids]
+        if vector_ids and (vector_ids[0] <= self._last_vector_id() or vector_ids != sorted(vector_ids)):
+            raise ValueError("Vector ids must be added in increasing order")
+
+        self.version += 1
+        first_row = len(self._vector_ids)
+        columns = {field: [] for field in INDEXED_FIELDS}
+        postings = {field: {} for field in DICTIONARY_FIELDS}
+
+        for tail_row, entry in enumerate(entries, start=first_row):
+            metadata = dict(entry.get('metadata') or {})
+            for field in DICTIONARY_FIELDS:
+                value = metadata.get(field)
+                if isinstance(value, str):
+                    code = self._code(value)
+                    columns[field].append(code)
+                    postings[field].setdefault(code, []).append(tail_row)
+                    del metadata[field]
+                else:
+                    columns[field].append(-1)
+            for field in NUMERIC_FIELDS:
+                value = metadata.get(field)
+                if _is_int(value):
+                    columns[field].append(int(value))
+                    del metadata[field]
+                else:
+                    columns[field].append(MISSING_NUMBER)
+
+            record = {key: value for key, value in entry.items() if key not in _DERIVED_FIELDS}
+            record['metadata'] = metadata
+
+            self._text.append(entry['text'].encode("utf-8"))
+            self._records.append(json.dumps(record, default=str).encode("utf-8"))
+
+        # Views count rows by vector id, so that column grows last
+        chunk_ids = [int(chunk_id) for chunk_id in chunk_ids]
+        for field, values in columns.items():
+            self._fields[field].extend(values)
+        for field, rows_by_code in postings.items():
+            for code, rows in rows_by_code.items():
+                self._postings[field].setdefault(code, _Column(np.int64, capacity=16)).extend(rows)
+        self._chunk_ids.extend(chunk_ids)
+        self._removed.extend([LIVE] * len(vector_ids))
+        self._added.extend([STAGED if staged else self.version] * len(vector_ids))
+        if staged:
+            self._staged.update(range(first_row, first_row + len(vector_ids)))
+        self._vector_ids.extend(vector_ids)
+        self._rows_by_chunk.update(zip(chunk_ids, range(first_row, first_row + len(chunk_ids))))
+
+    def remove(self, chunk_ids: List[int]) -> List[Tuple[int, int]]:
+        """
+        Remove chunks.
+
+        Args:
+            chunk_ids: Chunk IDs to remove
+
+        Returns:
+            (chunk_id, vector_id) of the chunks that were present
+        """
+        self.version += 1
+        rows = self._rows()
+        removed = []
+
+        for chunk_id in chunk_ids:
+            row = self._find_chunk(chunk_id, STAGED, rows)
+            if row < 0:
+                continue
+
+            # Views of earlier versions still see the row as live
+            if row < self._base_rows:
+                if self._base_removed is None:
+                    self._base_removed = np.full(self._base_rows, LIVE, dtype=np.int64)
+                self._base_removed[row] = self.version
+                self._base_dead += 1
+            else:
+                self._removed.set(row - self._base_rows, self.version)
+                self._staged.discard(row - self._base_rows)
+                self._dead += 1
+            removed.append((chunk_id, self._vector_id(row)))
+
+        return removed
+
+    def publish(self, chunk_ids: List[int]) -> int:
+        """
+        Make staged chunks visible to views taken from now on.
+
+        Args:
+            chunk_ids: Chunk IDs; chunks that are not staged are skipped
+
+        Returns:
+            Number of chunks published
+        """
+        self.version += 1
+        published = 0
+        for chunk_id in chunk_ids:
+            tail_row = self._rows_by_chunk.get(chunk_id)
+            if tail_row in self._staged:
+                self._added.set(tail_row, self.version)
+                self._staged.discard(tail_row)
+                published += 1
+        return published
+
+    def staged_count(self) -> int:
+        """Number of staged chunks."""
+        return len(self._staged)
+
+    def staged_chunk_ids(self) -> List[int]:
+        """Chunk ids of the staged chunks."""
+        return [self._chunk_ids[tail_row] for tail_row in sorted(self._staged)]
+
+    def staged_chunks(self) -> List[Tuple[int, int, Dict[str, Any]]]:
+        """(chunk id, vector id, entry) of each staged chunk, in staging order."""
+        return [(self._chunk_ids[tail_row], self._vector_ids[tail_row], self._entry(self._base_rows + tail_row))
+                for tail_row in sorted(self._staged)]
+
+    def staged_vector_ids(self) -> np.ndarray:
+        """Vector ids of the staged chunks, ascending."""
+        return self._vector_ids.view()[sorted(self._staged)]
+
+    def clear(self) -> None:
+        """Remove all chunks and detach from the snapshot table."""
+        self.version += 1
+        self._attach(None)
+
+    def snapshot(self) -> "ChunkView":
+        """View of the chunks as they are now, unaffected by later changes."""
+        return ChunkView(self)
+
+    def _is_live(self, row: int, version: int) -> bool:
+        """Whether a row was published and not removed as of a version."""
+        if row < self._base_rows:
+            base_removed = self._base_removed
+            return base_removed is None or bool(base_removed[row] > version)
+        tail_row = row - self._base_rows
+        return self._added[tail_row] <= version < self._removed[tail_row]
+
+    def _find_chunk(self, chunk_id: int, version: int, rows: int) -> int:
+        """Row of a chunk live as of a version among the first `rows` rows, or -1 (rows past the table are in-memory rows)."""
+        if not _is_int(chunk_id):
+            return -1
+
+        # A re-added id shadows the removed snapshot row it came from
+        tail_row = self._rows_by_chunk.get(int(chunk_id))
+        if tail_row is not None and self._base_rows + tail_row < rows:
+            row = self._base_rows + tail_row
+        elif self._base_rows:
+            row = self.table.find_chunk(chunk_id)
+        else:
+            return -1
+
+        return row if row >= 0 and self._is_live(row, version) else -1
+
+    def _find_vector(self, vector_id: int, version: int, rows: int) -> int:
+        """Row of a vector id live as of a version among the first `rows` rows, or -1."""
+        tail = self._vector_ids.view(rows - self._base_rows)
+        if len(tail) and vector_id >= tail[0]:
+            position = int(np.searchsorted(tail, vector_id))
+            found = position < len(tail) and tail[position] == vector_id
+            row = self._base_rows + position if found else -1
+        elif self._base_rows:
+            row = self.table.find_vector(vector_id)
+        else:
+            return -1
+
+        return row if row >= 0 and self._is_live(row, version) else -1
+
+    def _vector_id(self, row: int) -> int:
+        if row < self._base_rows:
+            return int(self.table.vector_ids[row])
+        return self._vector_ids[row - self._base_rows]
+
+    def _chunk_id(self, row: int) -> int:
+        if row < self._base_rows:
+            return int(self.table.chunk_ids[row])
+        return self._chunk_ids[row - self._base_rows]
+
+    def map_legacy_ids(self, legacy_ids: List[str], chunk_ids: List[int]) -> None:
+        """Record the chunk ids that replaced UUID string ids, e.g. of replayed older segments."""
+        self._legacy_ids.update(zip(legacy_ids, chunk_ids))
+
+    def legacy_chunk_id(self, chunk_id: str) -> Optional[int]:
+        """Chunk id that replaced a UUID string id of an older snapshot, or None."""
+        if chunk_id in self._legacy_ids:
+            return self._legacy_ids[chunk_id]
+        row = self.table.find_legacy_chunk(chunk_id) if self._base_rows else -1
+        return self._chunk_id(row) if row >= 0 else None
+
+    def _entry(self, row: int) -> Dict[str, Any]:
+        """Decode the entry ('text', 'metadata', ...) of a row."""
+        if row < self._base_rows:
+            text = self.table.text_bytes(row)
+            record = json.loads(self.table.record_bytes(row))
+            values = {field: int(column[row]) for field, column in self.table.fields.items()}
+        else:
+            tail_row = row - self._base_rows
+            text = self._text[tail_row]
+            record = json.loads(self._records[tail_row])
+            values = {field: column[tail_row] for field, column in self._fields.items()}
+
+        metadata = record.pop('metadata', {})
+        for field, value in values.items():
+            if field in NUMERIC_FIELDS:
+                if value != MISSING_NUMBER:
+                    metadata[field] = value
+            elif value >= 0:
+                metadata[field] = self.dictionary[value]
+
+        entry = {'text': text.decode("utf-8"), 'metadata': metadata, 'embedding_dim': self.embedding_dim}
+        entry.update(record)
+        return entry
+
+    def get(self, chunk_id: int) -> Optional[Dict[str, Any]]:
+        """Entry of a chunk, or None."""
+        return self.snapshot().get(chunk_id)
+
+    def get_vector_id(self, chunk_id: int) -> Optional[int]:
+        """FAISS vector id of a chunk (staged or live), or None."""
+        row = self._find_chunk(chunk_id, STAGED, self._rows())
+        return self._vector_id(row) if row >= 0 else None
+
+    def has_vector(self, vector_id: int) -> bool:
+        """Whether a vector id belongs to a staged or live chunk."""
+        return self._find_vector(vector_id, STAGED, self._rows()) >= 0
+
+    def get_by_vector(self, vector_id: int) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """(chunk_id, entry) of the chunk stored under a vector id, or None."""
+        return self.snapshot().get_by_vector(vector_id)
+
+    def lookup_vectors(self, vector_ids: np.ndarray) -> np.ndarray:
+        """Rows of many vector ids at once, staged rows included (see `ChunkView.lookup_vectors`)."""
+        return self._lookup_vectors(vector_ids, STAGED, self._rows())
+
+    def _lookup_vectors(self, vector_ids: np.ndarray, version: int, rows: int) -> np.ndarray:
+        """Rows of vector ids live as of a version among the first `rows` rows, or -1."""
+        vector_ids = np.asarray(vector_ids, dtype=np.int64)
+        found_rows = np.full(vector_ids.shape, -1, dtype=np.int64)
+
+        if self._base_rows:
+            base_ids = np.asarray(self.table.vector_ids)
+            positions = np.minimum(np.searchsorted(base_ids, vector_ids), self._base_rows - 1)
+            found = base_ids[positions] == vector_ids
+            base_removed = self._base_removed
+            if base_removed is not None:
+                found &= base_removed[positions] > version
+            found_rows[found] = positions[found]
+
+        tail_rows = rows - self._base_rows
+        if tail_rows:
+            tail_ids = self._vector_ids.view(tail_rows)
+            positions = np.minimum(np.searchsorted(tail_ids, vector_ids), tail_rows - 1)
+            found = ((tail_ids[positions] == vector_ids) & (self._added.view(tail_rows)[positions] <= version) &
+                     (self._removed.view(tail_rows)[positions] > version))
+            found_rows[found] = self._base_rows + positions[found]
+
+        return found_rows
+
+    def chunk_at(self, row: int) -> Tuple[int, Dict[str, Any]]:
+        """(chunk_id, entry) of a row returned by `lookup_vectors`."""
+        return self._chunk_id(row), self._entry(row)
+
+    def chunk_ids_of(self, vector_ids: np.ndarray) -> List[int]:
+        """Chunk ids of staged or live vector ids (e.g. from `select`), without decoding their entries."""
+        rows = self.lookup_vectors(vector_ids)
+        return [self._chunk_id(row) for row in rows[rows >= 0].tolist()]
+
+    def live_vector_ids(self) -> np.ndarray:
+        """Vector ids of all staged and live chunks, ascending."""
+        parts = []
+        if self._base_rows:
+            base = np.asarray(self.table.vector_ids)
+            parts.append(base if self._base_removed is None else base[self._base_removed == LIVE])
+        if len(self._vector_ids):
+            parts.append(self._vector_ids.view()[self._removed.view() == LIVE])
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+    def _base_column(self, field: str) -> np.ndarray:
+        """Snapshot column of an indexed field, decoded from the records for older tables."""
+        column = self.table.fields.get(field)
+        if column is None:
+            column = self._base_columns.get(field)
+        if column is None:
+            numeric = field in NUMERIC_FIELDS
+            column = np.full(self._base_rows, MISSING_NUMBER if numeric else -1,
+                             dtype=np.int64 if numeric else np.int32)
+            for row in range(self._base_rows):
+                value = json.loads(self.table.record_bytes(row)).get('metadata', {}).get(field)
+                if numeric and _is_int(value):
+                    column[row] = value
+                elif not numeric and isinstance(value, str):
+                    column[row] = self._code(value)
+            self._base_columns[field] = column
+        return column
+
+    def _sorted_base_column(self, field: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(sorted values, their rows) of a snapshot column, built on first use."""
+        postings = self._base_postings.get(field)
+        if postings is None:
+            column = np.asarray(self._base_column(field))
+            rows = np.argsort(column, kind="stable")
+            postings = (column[rows], rows.astype(np.int64))
+            self._base_postings[field] = postings
+        return postings
+
+    def _rows_matching(self, field: str, ranges: List[Tuple[Any, Any]], tail_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Snapshot rows and the first `tail_rows` in-memory rows whose field falls in any of the value ranges."""
+        if self._base_rows:
+            # Decodes older tables first, which can add dictionary values
+            values, rows = self._sorted_base_column(field)
+
+        if field in DICTIONARY_FIELDS:
+            codes = [self._codes[low] for low, _ in ranges if low in self._codes]
+            ranges = [(code, code) for code in codes]
+
+        base = []
+        if self._base_rows:
+            for low, high in ranges:
+                start, end = np.searchsorted(values, low, "left"), np.searchsorted(values, high, "right")
+                base.append(rows[start:end])
+
+        tail = []
+        if tail_rows:
+            if field in DICTIONARY_FIELDS:
+                # Postings are ascending and may already list rows added after the view
+                postings = [self._postings[field].get(low) for low, _ in ranges]
+                postings = [posting.view() for posting in postings if posting is not None]
+                tail = [posting[:np.searchsorted(posting, tail_rows)] for posting in postings]
+            else:
+                column = self._fields[field].view(tail_rows)
+                tail = [np.flatnonzero((column >= low) & (column <= high)) for low, high in ranges]
+
+        return _union(base), _union(tail)
+
+    def can_select(self, field: str, condition: Any) -> bool:
+        """Whether a filter condition on a field can be answered by `select`."""
+        return _parse_condition(field, condition) is not None
+
+    def select(self, conditions: Dict[str, Any]) -> np.ndarray:
+        """Vector ids of staged and live chunks matching all conditions (see `ChunkView.select`)."""
+        return self._select(conditions, STAGED, self._rows())
+
+    def _select(self, conditions: Dict[str, Any], version: int, rows: int) -> np.ndarray:
+        """Vector ids of chunks live as of a version among the first `rows` rows that match all conditions."""
+        tail_count = rows - self._base_rows
+        base_rows = tail_rows = None
+
+        for field, condition in conditions.items():
+            ranges = _parse_condition(field, condition)
+            if ranges is None:
+                raise ValueError(f"Condition on '{field}' cannot use a metadata index")
+
+            base, tail = self._rows_matching(field, ranges, tail_count)
+            base_rows = base if base_rows is None else np.intersect1d(base_rows, base, assume_unique=True)
+            tail_rows = tail if tail_rows is None else np.intersect1d(tail_rows, tail, assume_unique=True)
+
+        parts = []
+        if base_rows is not None and len(base_rows):
+            base_removed = self._base_removed
+            if base_removed is not None:
+                base_rows = base_rows[base_removed[base_rows] > version]
+            parts.append(np.asarray(self.table.vector_ids)[base_rows])
+        if tail_rows is not None and len(tail_rows):
+            live = ((self._added.view(tail_count)[tail_rows] <= version) &
+                    (self._removed.view(tail_count)[tail_rows] > version))
+            parts.append(self._vector_ids.view(tail_count)[tail_rows[live]])
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+    def items(self) -> Iterable[Tuple[int, Dict[str, Any]]]:
+        """Iterate over (chunk_id, entry) of live chunks (decodes every row)."""
+        for row in range(self._rows()):
+            if self._is_live(row, self.version):
+                yield self._chunk_id(row), self._entry(row)
+
+    def serialize(self) -> Dict[str, bytes]:
+        """
+        Build snapshot table files for the live chunks (staged chunks are left out).
+
+        Snapshot rows are copied as raw bytes and codes; nothing is decoded.
+
+        Returns:
+            File contents by file name
+        """
+        chunk_ids, vector_ids = [], []
+        fields = {field: [] for field in INDEXED_FIELDS}
+        text, text_lengths, records, record_lengths = [], [], [], []
+
+        if self._base_rows:
+            table = self.table
+            rows = None if self._base_removed is None else np.flatnonzero(self._base_removed == LIVE)
+
+            def select(column):
+                column = np.asarray(column)
+                return column if rows is None else column[rows]
+
+            chunk_ids.append(select(table.chunk_ids))
+            vector_ids.append(select(table.vector_ids))
+            for field in INDEXED_FIELDS:
+                column = table.fields.get(field, self._base_columns.get(field))
+                if column is None:
+                    column = np.full(self._base_rows, MISSING_NUMBER if field in NUMERIC_FIELDS else -1)
+                fields[field].append(select(column))
+
+            data, lengths = _gather_heap(table.text, table.text_offsets, rows)
+            text.append(data)
+            text_lengths.append(lengths)
+            data, lengths = _gather_heap(table.records, table.record_offsets, rows)
+            records.append(data)
+            record_lengths.append(lengths)
+
+        if len(self._vector_ids):
+            live = np.flatnonzero((self._removed.view() == LIVE) & (self._added.view() != STAGED))
+            chunk_ids.append(self._chunk_ids.view()[live])
+            vector_ids.append(self._vector_ids.view()[live])
+            for field in INDEXED_FIELDS:
+                fields[field].append(self._fields[field].view()[live].astype(np.int64))
+
+            live = live.tolist()
+            text.append(b"".join(self._text[i] for i in live))
+            text_lengths.append(np.array([len(self._text[i]) for i in live], dtype=np.int64))
+            records.append(b"".join(self._records[i] for i in live))
+            record_lengths.append(np.array([len(self._records[i]) for i in live], dtype=np.int64))
+
+        def combine(parts, dtype):
+            parts = [part for part in parts if len(part)]
+            return np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+
+        return ChunkTable.serialize(
+            chunk_ids=combine(chunk_ids, np.int64),
+            vector_ids=combine(vector_ids, np.int64),
+            fields={field: combine(parts, np.int64) for field, parts in fields.items()},
+            dictionary=self.dictionary,
+            text=b"".join(text),
+            text_lengths=combine(text_lengths, np.int64),
+            records=b"".join(records),
+            record_lengths=combine(record_lengths, np.int64)
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get storage statistics.
+
+        Returns:
+            Dictionary with snapshot and in-memory row counts and dictionary size
+        """
+        return {
+            'snapshot_rows': self._base_rows - self._base_dead,
+            'memory_rows': len(self._vector_ids) - self._dead - len(self._staged),
+            'staged_rows': len(self._staged),
+            'dictionary_size': len(self.dictionary)
+        }
+
+    def __len__(self) -> int:
+        """Number of live chunks (staged chunks are not counted)."""
+        return self._base_rows - self._base_dead + len(self._vector_ids) - self._dead - len(self._staged)
+
+    def __contains__(self, chunk_id: int) -> bool:
+        """Whether a chunk id is held by a staged or live chunk."""
+        return self._find_chunk(chunk_id, STAGED, self._rows()) >= 0
+
+
+class ChunkView:
+    """
+    The chunks of a ChunkStore as of one version, for searches.
+
+    Rows added after the view was taken lie past its row count, and rows
+    removed later carry a newer removal version, so a view keeps returning
+    the same chunks while the store changes. Views are cheap to take.
+    """
+
+    def __init__(self, store: ChunkStore):
+        """
+        Initialize the view.
+
+        Args:
+            store: Store to view as of its current version
+        """
+        self._store = store
+        self.version = store.version
+        self._rows = store._rows()
+        self._live = len(store)
+
+    def get(self, chunk_id: int) -> Optional[Dict[str, Any]]:
+        """Entry of a chunk, or None."""
+        row = self._store._find_chunk(chunk_id, self.version, self._rows)
+        return self._store._entry(row) if row >= 0 else None
+
+    def get_by_vector(self, vector_id: int) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """(chunk_id, entry) of the chunk stored under a vector id, or None."""
+        row = self._store._find_vector(vector_id, self.version, self._rows)
+        return self._store.chunk_at(row) if row >= 0 else None
+
+    def lookup_vectors(self, vector_ids: np.ndarray) -> np.ndarray:
+        """
+        Find the rows of many vector ids at once (e.g. a FAISS result matrix).
+
+        Args:
+            vector_ids: Array of vector ids of any shape (-1 for no result)
+
+        Returns:
+            Array of the same shape with the row of each live vector id, or -1
+        """
+        return self._store._lookup_vectors(vector_ids, self.version, self._rows)
+
+    def chunk_at(self, row: int) -> Tuple[int, Dict[str, Any]]:
+        """(chunk_id, entry) of a row returned by `lookup_vectors`."""
+        return self._store.chunk_at(row)
+
+    def can_select(self, field: str, condition: Any) -> bool:
+        """Whether a filter condition on a field can be answered by `select`."""
+        return self._store.can_select(field, condition)
+
+    def select(self, conditions: Dict[str, Any]) -> np.ndarray:
+        """
+        Find live chunks matching all conditions using the inverted indexes.
+
+        Args:
+            conditions: Condition by indexed field (see `matches_condition`)
+
+        Returns:
+            Vector ids of the matching chunks, ascending
+        """
+        return self._store._select(conditions, self.version, self._rows)
+
+    def __len__(self) -> int:
+        return self._live
+
+    def __contains__(self, chunk_id: int) -> bool:
+        return self._store._find_chunk(chunk_id, self.version, self._rows) >= 0
@@ -2,12 +2,16 @@
 File Parser & Chunker for PrivAI
 Handles parsing of various file types and intelligent text chunking for embeddings
 """
+import multiprocessing
 import os
 import re
+import threading
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Union, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Union, Tuple
 import hashlib
 
 # Optional imports for file processing
@@ -32,10 +36,83 @@ try:
 except ImportError:
     DOCX_AVAILABLE = False
 
+from .config import settings
 from .logging import get_logger
 
 logger = get_logger("chunker")
 
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _format_pdf_tables(tables: List[List[List[str]]]) -> str:
+    """Format tables extracted from a PDF page into readable text."""
+    formatted_tables = []
+    
+    for table in tables:
+        if not table:
+            continue
+        
+        table_text = "Table:\n"
+        for row in table:
+            if row:
+                table_text += " | ".join(str(cell) if cell else "" for cell in row) + "\n"
+        formatted_tables.append(table_text)
+    
+    return "\n\n".join(formatted_tables)
+
+
+def _extract_pdf_page(page) -> str:
+    """Text of a pdfplumber page followed by its tables, or "" for an empty page."""
+    page_text = page.extract_text()
+    if not page_text or not page_text.strip():
+        return ""
+    
+    # Extract tables if present
+    tables = page.extract_tables()
+    table_text = _format_pdf_tables(tables) if tables else ""
+    
+    # Combine page text and table text
+    if table_text:
+        page_text += "\n\nTables:\n" + table_text
+    return page_text
+
+
+def _extract_pdf_pages(file_path: str, first_page: int, last_page: int) -> List[Tuple[int, str]]:
+    """Extract a contiguous range of pages of a PDF, opening it once (runs in a parser worker process)."""
+    with pdfplumber.open(file_path) as pdf:
+        return [(page_num, _extract_pdf_page(pdf.pages[page_num - 1]))
+                for page_num in range(first_page, last_page + 1)]
+
+
+def _pdf_pool_workers() -> int:
+    """Number of PDF parser worker processes."""
+    return settings.pdf_parse_workers or os.cpu_count() or 1
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """Start the PDF parser worker processes on first use."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # spawn: the server is multithreaded (request handlers, ingestion
+            # stages, OpenMP), and a forked worker could inherit a lock another
+            # thread held at fork time and deadlock on it
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=_pdf_pool_workers(),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pdf_pool
+
+
+def close_pdf_pool() -> None:
+    """Shut down the PDF parser worker processes (application shutdown)."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        pool, _pdf_pool = _pdf_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
 
 class FileChunker:
     """
@@ -72,6 +149,26 @@ class FileChunker:
         Returns:
             List of dictionaries containing chunk data and metadata
             
+        Raises:
+            ValueError: If file type is not supported
+            FileNotFoundError: If file doesn't exist
+        """
+        return [chunk for page_chunks in self.iter_chunks(file_path) for chunk in page_chunks]
+    
+    def iter_chunks(self, file_path: Union[str, Path]) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Parse a file page by page.
+        
+        PDF pages are extracted by worker processes when the file has at least
+        `pdf_parse_min_pages` pages; chunks still come out in page order, with
+        the same metadata as a serial parse. Other file types yield one list.
+        
+        Args:
+            file_path: Path to the file to parse
+            
+        Yields:
+            Chunk dictionaries of each non-empty page, in page order
+            
         Raises:
             ValueError: If file type is not supported
             FileNotFoundError: If file doesn't exist
@@ -93,11 +190,11 @@ class FileChunker:
         
         # Parse based on file type
         if file_extension == '.pdf':
-            return self._parse_pdf(file_path, file_hash)
+            yield from self._iter_pdf(file_path, file_hash)
         elif file_extension in ['.docx', '.doc']:
-            return self._parse_docx(file_path, file_hash)
+            yield self._parse_docx(file_path, file_hash)
         elif file_extension in ['.csv', '.xlsx', '.xls']:
-            return self._parse_tabular(file_path, file_hash)
+            yield self._parse_tabular(file_path, file_hash)
         else:
             raise ValueError(f"Unsupported file type: {file_extension}")
     
@@ -112,35 +209,43 @@ class FileChunker:
         Returns:
             List of chunk dictionaries
         """
+        return [chunk for page_chunks in self._iter_pdf(file_path, file_hash) for chunk in page_chunks]
+    
+    def _iter_pdf(self, file_path: Path, file_hash: str) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Parse PDF file page by page, yielding the chunks of each non-empty page.
+        
+        Chunk indexes run across the whole document rather than restarting
+        on each page.
+        
+        Args:
+            file_path: Path to PDF file
+            file_hash: File hash for tracking
+            
+        Yields:
+            Chunk dictionaries of one page
+        """
         if not PDFPLUMBER_AVAILABLE:
             raise ImportError("pdfplumber is required for PDF processing. Install with: pip install pdfplumber")
         
-        chunks = []
+        chunk_count = 0
         
         try:
             with pdfplumber.open(file_path) as pdf:
                 total_pages = len(pdf.pages)
-                logger.info("PDF parsing started", pages=total_pages)
+                parallel = settings.pdf_parse_workers != 1 and total_pages >= settings.pdf_parse_min_pages
+                logger.info("PDF parsing started", pages=total_pages, parallel=parallel)
                 
-                for page_num, page in enumerate(pdf.pages, 1):
-                    # Extract text from page
-                    page_text = page.extract_text()
-                    
-                    if not page_text or not page_text.strip():
+                if parallel:
+                    pages = self._extract_pdf_parallel(file_path, total_pages)
+                else:
+                    pages = ((page_num, _extract_pdf_page(page)) for page_num, page in enumerate(pdf.pages, 1))
+                
+                for page_num, full_text in pages:
+                    if not full_text:
                         logger.warning("Empty page found", page=page_num)
                         continue
                     
-                    # Extract tables if present
-                    tables = page.extract_tables()
-                    table_text = ""
-                    if tables:
-                        table_text = self._format_tables(tables)
-                    
-                    # Combine page text and table text
-                    full_text = page_text
-                    if table_text:
-                        full_text += "\n\nTables:\n" + table_text
-                    
                     # Create chunks from page text
                     page_chunks = self._create_chunks(
                         text=full_text,
@@ -151,18 +256,49 @@ class FileChunker:
                         chunk_type="pdf_page"
                     )
                     
-                    chunks.extend(page_chunks)
+                    # Number chunks across the document, not per page, so their derived IDs stay distinct
+                    for chunk in page_chunks:
+                        chunk["metadata"]["chunk_index"] += chunk_count
+                    
+                    chunk_count += len(page_chunks)
+                    yield page_chunks
                 
                 logger.info("PDF parsing completed", 
                            file=str(file_path),
                            pages=total_pages,
-                           chunks=len(chunks))
+                           chunks=chunk_count)
                 
         except Exception as e:
             logger.error("PDF parsing failed", file=str(file_path), error=str(e))
             raise
+    
+    def _extract_pdf_parallel(self, file_path: Path, total_pages: int) -> Iterator[Tuple[int, str]]:
+        """
+        Extract PDF pages on the parser worker processes.
         
-        return chunks
+        Opening a PDF parses its whole cross-reference table, so each worker
+        gets one contiguous range of pages and opens the file once. Ranges
+        finishing ahead of the consumer only hold extracted text.
+        
+        Args:
+            file_path: Path to PDF file
+            total_pages: Number of pages in the PDF
+            
+        Yields:
+            (page number, page text) in page order
+        """
+        executor = _get_pdf_pool()
+        workers = min(_pdf_pool_workers(), total_pages)
+        bounds = [1 + total_pages * worker // workers for worker in range(workers + 1)]
+        pending = deque(executor.submit(_extract_pdf_pages, str(file_path), first, next_first - 1)
+                        for first, next_first in zip(bounds, bounds[1:]))
+        
+        try:
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
     
     def _parse_docx(self, file_path: Path, file_hash: str) -> List[Dict[str, Any]]:
         """
@@ -490,19 +626,7 @@ class FileChunker:
         Returns:
             Formatted table text
         """
-        formatted_tables = []
-        
-        for table in tables:
-            if not table:
-                continue
-            
-            table_text = "Table:\n"
-            for row in table:
-                if row:
-                    table_text += " | ".join(str(cell) if cell else "" for cell in row) + "\n"
-            formatted_tables.append(table_text)
-        
-        return "\n\n".join(formatted_tables)
+        return _format_pdf_tables(tables)
     
     def _format_docx_table(self, table: Table) -> str:
         """
@@ -27,9 +27,51 @@ class Settings(BaseSettings):
     
     # Vector database
     faiss_index_path: str = "data/faiss_index"
+    vector_index_precision: str = "float32"  # "float32", "float16" or "int8" (scalar-quantized index)
+    vector_compaction_threshold: float = 0.2  # Deleted fraction that triggers index compaction
+    vector_delete_overfetch: float = 1.5  # Extra search depth to make up for deleted vectors
+    vector_segment_log: bool = True  # Append changes to segment files instead of rewriting the index
+    vector_segment_merge_threshold: int = 32  # Segments that trigger a background merge into the base snapshot
+    vector_delta_fold_size: int = 16384  # Buffered new vectors that always trigger a background fold into a copy of the index
+    vector_delta_fold_ratio: float = 0.1  # ...or fewer: this fraction of the indexed vectors (folding copies the index)
+    vector_delta_fold_min: int = 1024  # ...but at least this many, except when an ingest commits a document
+    vector_index_mmap: bool = True  # Map the saved index and chunk table read-only (shared by workers)
+    vector_filter_exact_max: int = 2048  # Filtered searches over at most this many chunks score each one exactly
+    vector_ivf_nlist: int = 0  # IVF lists (0: 4·√N, chosen from the corpus size at training time)
+    vector_ivf_nprobe: int = 0  # IVF lists searched per query by default (0: nlist / 16)
+    vector_ivf_train_min: int = 4096  # Vectors kept in an exact staging index before the IVF lists are trained
+    vector_ivf_train_sample: int = 32768  # Vectors sampled from the corpus to train the IVF centroids
+    vector_ivf_drift_ratio: float = 1.5  # Retrain when new vectors sit this much further from their centroids
+    vector_ivfpq_m: int = 0  # PQ bytes per vector of "ivfpq" indexes (0: one per 4 dimensions)
+    vector_ivfpq_rerank: int = 8  # "ivfpq" re-ranks k x this many PQ candidates against the full vectors
+    vector_hnsw_m: int = 32  # HNSW graph neighbours per node (fixed once the graph is built)
+    vector_hnsw_ef_construction: int = 200  # HNSW candidate list size while building (higher: better graph, slower adds)
+    vector_hnsw_ef_search: int = 50  # HNSW candidate list size per query, unless a query sets ef_search
+    vector_build_threads: int = 0  # OpenMP threads for FAISS adds, training and rebuilds (0: all cores)
+    vector_search_threads: int = 0  # OpenMP threads per FAISS search call (0: all cores)
     embedding_model: str = "all-MiniLM-L6-v2"
     chunk_size: int = 1000
     chunk_overlap: int = 200
+    embedding_cache_max_entries: int = 500000
+    embedding_cache_dtype: str = "float32"  # "float32" or "float16" (half the cache size)
+    embedding_max_batch_items: int = 256
+    embedding_backend: str = "torch"  # "torch" or "onnx"
+    embedding_quantization: bool = False  # int8 dynamic quantization (CPU)
+    embedding_parity_threshold: float = 0.99
+    embedding_workers: int = 0  # Worker processes for bulk encoding (0 = in-process)
+    embedding_worker_threads: int = 0  # torch threads per worker (0 = cpu_count // workers)
+    embedding_pool_min_texts: int = 256  # Smaller jobs stay in-process
+    query_batch_max_wait_ms: float = 5.0  # How long a query waits for others to share its forward pass
+    query_batch_max_size: int = 64
+    query_cache_max_entries: int = 10000
+    query_cache_ttl_seconds: float = 3600.0
+    ingest_workers: int = 2  # Ingestion jobs running at the same time
+    ingest_jobs_dir: str = "data/ingest_jobs"  # Job files, so unfinished jobs resume after a restart
+    ingest_jobs_keep: int = 100  # Finished jobs kept for GET /ingest/jobs/{id}
+    ingest_batch_chunks: int = 256  # Chunks per embedding batch and index append while streaming a document
+    ingest_pipeline_buffer: int = 8  # Items buffered between ingestion pipeline stages
+    pdf_parse_workers: int = 0  # Worker processes extracting PDF pages (0: all cores, 1: in-process)
+    pdf_parse_min_pages: int = 8  # Smaller PDFs are extracted in-process
     
     # AI/LLM
     local_llm_model: str = "microsoft/DialoGPT-medium"
@@ -0,0 +1,206 @@
+"""
+Delta Vectors for PrivAI
+Vectors added since the last index fold, searched exactly next to the index
+"""
+import io
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+DELTA_VECTORS_FILE = "delta_vectors.npy"
+DELTA_IDS_FILE = "delta_ids.npy"
+
+
+class DeltaVectors:
+    """
+    Append-only buffer of the vectors added since the index was last folded.
+
+    Ingestion appends here instead of adding to the FAISS index, which searches
+    may be reading. Appends only write rows past the end that published views
+    read up to, and growing copies into new arrays, so a `DeltaView` stays
+    valid while more vectors are added. A background fold adds the buffered
+    vectors to a copy of the index and swaps it in.
+    """
+
+    def __init__(self, dim: int):
+        """
+        Initialize an empty buffer.
+
+        Args:
+            dim: Vector dimension
+        """
+        self.dim = dim
+        self._vectors = np.empty((1024, dim), dtype=np.float32)
+        self._ids = np.empty(1024, dtype=np.int64)
+        self._size = 0
+
+    @classmethod
+    def load(cls, directory: Path, dim: int, files: Optional[Dict[str, str]] = None) -> "DeltaVectors":
+        """
+        Load a buffer saved by `serialize`.
+
+        Args:
+            directory: Snapshot directory
+            dim: Vector dimension
+            files: File name by the name `serialize` gave it (as in a snapshot manifest)
+
+        Returns:
+            DeltaVectors holding the saved vectors (empty if none were saved)
+        """
+        files = files or {}
+        delta = cls(dim)
+        ids_path = directory / files.get(DELTA_IDS_FILE, DELTA_IDS_FILE)
+        if ids_path.exists():
+            delta.add(np.load(directory / files.get(DELTA_VECTORS_FILE, DELTA_VECTORS_FILE)), np.load(ids_path))
+        return delta
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray) -> None:
+        """
+        Append vectors; ids must be greater than any already buffered.
+
+        Args:
+            vectors: Vectors, one row each
+            ids: Their FAISS vector ids
+        """
+        end = self._size + len(ids)
+        if end > len(self._ids):
+            capacity = max(end, 2 * len(self._ids))
+            vectors_grown = np.empty((capacity, self.dim), dtype=np.float32)
+            ids_grown = np.empty(capacity, dtype=np.int64)
+            vectors_grown[:self._size] = self._vectors[:self._size]
+            ids_grown[:self._size] = self._ids[:self._size]
+            self._vectors, self._ids = vectors_grown, ids_grown
+
+        self._vectors[self._size:end] = vectors
+        self._ids[self._size:end] = ids
+        self._size = end
+
+    def view(self) -> "DeltaView":
+        """View of the vectors buffered now, unaffected by later appends."""
+        return DeltaView(self._vectors[:self._size], self._ids[:self._size])
+
+    def drop(self, count: int) -> "DeltaVectors":
+        """
+        Buffer without the first `count` vectors, e.g. once they were folded into the index.
+
+        Returns:
+            New DeltaVectors; this buffer and its views are left unchanged
+        """
+        rest = DeltaVectors(self.dim)
+        rest.add(self._vectors[count:self._size], self._ids[count:self._size])
+        return rest
+
+    def serialize(self) -> Dict[str, bytes]:
+        """
+        Build the snapshot files of the buffer.
+
+        Returns:
+            File contents by file name
+        """
+        files = {}
+        for name, array_ in ((DELTA_VECTORS_FILE, self._vectors[:self._size]), (DELTA_IDS_FILE, self._ids[:self._size])):
+            buffer = io.BytesIO()
+            np.save(buffer, array_, allow_pickle=False)
+            files[name] = buffer.getvalue()
+        return files
+
+    def nbytes(self) -> int:
+        """Bytes taken by the buffered vectors."""
+        return self._size * self.dim * 4
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class DeltaView:
+    """Buffered vectors as of one point in time, searched by brute force."""
+
+    def __init__(self, vectors: np.ndarray, ids: np.ndarray):
+        self.vectors = vectors
+        self.ids = ids
+
+    def search(self,
+               queries: np.ndarray,
+               k: int,
+               metric: int,
+               allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact k-nearest-neighbour search over the buffered vectors.
+
+        Args:
+            queries: Query matrix
+            k: Number of results per query
+            metric: FAISS metric type
+            allowed: Ascending vector ids to restrict the search to
+
+        Returns:
+            (scores, vector ids), each of shape (len(queries), <= k)
+        """
+        vectors, ids = self.vectors, self.ids
+        if allowed is not None:
+            positions = np.flatnonzero(self.contains_mask(allowed))
+            vectors, ids = vectors[positions], ids[positions]
+
+        k = min(k, len(ids))
+        if not k:
+            return np.zeros((len(queries), 0), dtype=np.float32), np.zeros((len(queries), 0), dtype=np.int64)
+
+        scores, positions = faiss.knn(np.ascontiguousarray(queries, dtype=np.float32), vectors, k, metric=metric)
+        return scores, np.where(positions >= 0, ids[positions], -1)
+
+    def contains_mask(self, vector_ids: np.ndarray) -> np.ndarray:
+        """For each buffered vector, whether its id is among ascending `vector_ids`."""
+        vector_ids = np.asarray(vector_ids, dtype=np.int64)
+        if not len(vector_ids):
+            return np.zeros(len(self.ids), dtype=bool)
+        positions = np.minimum(np.searchsorted(vector_ids, self.ids), len(vector_ids) - 1)
+        return vector_ids[positions] == self.ids
+
+    def contains(self, vector_ids: np.ndarray) -> np.ndarray:
+        """For each of `vector_ids`, whether it is buffered."""
+        vector_ids = np.asarray(vector_ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.zeros(vector_ids.shape, dtype=bool)
+        positions = np.minimum(np.searchsorted(self.ids, vector_ids), len(self.ids) - 1)
+        return self.ids[positions] == vector_ids
+
+    def reconstruct(self, vector_ids: np.ndarray) -> np.ndarray:
+        """Vectors of buffered ids."""
+        return self.vectors[np.searchsorted(self.ids, np.asarray(vector_ids, dtype=np.int64))]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def merge_results(parts: List[Tuple[np.ndarray, np.ndarray]], k: int, metric: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merge per-query results of several searches into the best k.
+
+    Args:
+        parts: (scores, vector ids) of each search, ids -1 for no result
+        k: Number of results to keep per query
+        metric: FAISS metric type (inner product scores rank higher-first)
+
+    Returns:
+        (scores, vector ids), each of shape (queries, k)
+    """
+    scores = np.concatenate([scores for scores, _ in parts], axis=1)
+    ids = np.concatenate([ids for _, ids in parts], axis=1)
+
+    higher_first = metric == faiss.METRIC_INNER_PRODUCT
+    keys = np.where(ids >= 0, -scores if higher_first else scores, np.inf)
+    order = np.argsort(keys, axis=1, kind="stable")[:, :k]
+    scores, ids = np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+    if ids.shape[1] < k:
+        padding = ((0, 0), (0, k - ids.shape[1]))
+        scores = np.pad(scores, padding, constant_values=-np.inf if higher_first else np.inf)
+        ids = np.pad(ids, padding, constant_values=-1)
+    return scores, ids
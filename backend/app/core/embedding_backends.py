@@ -0,0 +1,307 @@
+"""
+Embedding Inference Backends for PrivAI
+Int8 dynamic quantization and ONNX Runtime CPU execution for sentence-transformer models
+"""
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+# Optional imports for inference backends
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+from .logging import get_logger
+
+logger = get_logger("embedding_backends")
+
+SUPPORTED_BACKENDS = ("torch", "onnx")
+
+# Short, mixed-length sentences used to check that an optimized backend still
+# produces the same embeddings as the fp32 reference
+PARITY_SAMPLE_TEXTS = [
+    "What is the fee policy?",
+    "When does the semester start?",
+    "Students must maintain 75% attendance to be eligible for the final examination.",
+    "Table: Course | Credits | Instructor\nData Structures | 4 | Dr. Rao\nOperating Systems | 3 | Dr. Iyer",
+    "The library remains open from 8 AM to 10 PM on all working days, including during the examination period.",
+]
+
+
+def quantize_dynamic_int8(model):
+    """
+    Apply torch dynamic int8 quantization to the linear layers of a model.
+
+    Args:
+        model: SentenceTransformer (or any torch.nn.Module) running on CPU
+
+    Returns:
+        Quantized copy of the model
+    """
+    if not TORCH_AVAILABLE:
+        raise ImportError("torch is required for int8 quantization. Install with: pip install torch")
+
+    quantized = torch.quantization.quantize_dynamic(
+        model,
+        {torch.nn.Linear},
+        dtype=torch.qint8
+    )
+
+    logger.info("Applied dynamic int8 quantization to linear layers")
+    return quantized
+
+
+class OnnxEmbeddingModel:
+    """
+    ONNX Runtime implementation of a sentence-transformer encoder.
+    Exposes the subset of the SentenceTransformer API used by EmbeddingGenerator.
+    """
+
+    def __init__(self, onnx_path: str, tokenizer, max_seq_length: int,
+                 embedding_dim: int, pooling: str = "mean",
+                 intra_op_threads: int = 0):
+        """
+        Initialize an ONNX Runtime session for an exported encoder.
+
+        Args:
+            onnx_path: Path to the exported ONNX model
+            tokenizer: Hugging Face tokenizer of the original model
+            max_seq_length: Truncation length
+            embedding_dim: Output embedding dimension
+            pooling: Pooling mode ("mean" or "cls")
+            intra_op_threads: ONNX Runtime intra-op threads (0 lets ORT decide)
+        """
+        if not ONNXRUNTIME_AVAILABLE:
+            raise ImportError(
+                "onnxruntime is required for the ONNX backend. "
+                "Install with: pip install onnxruntime"
+            )
+
+        self.onnx_path = Path(onnx_path)
+        self.tokenizer = tokenizer
+        self.max_seq_length = max_seq_length
+        self.embedding_dim = embedding_dim
+        self.pooling = pooling
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+
+        self.session = ort.InferenceSession(
+            str(self.onnx_path),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        logger.info("ONNX Runtime session created",
+                   onnx_path=str(self.onnx_path),
+                   inputs=sorted(self.input_names))
+
+    @classmethod
+    def from_sentence_transformer(cls, model, export_dir: str,
+                                  model_name: str,
+                                  use_quantization: bool = False) -> "OnnxEmbeddingModel":
+        """
+        Export a SentenceTransformer to ONNX (once) and load it with ONNX Runtime.
+
+        Args:
+            model: Loaded SentenceTransformer
+            export_dir: Directory holding exported models
+            model_name: Model name, used for the exported file name
+            use_quantization: Whether to also apply ONNX Runtime int8 dynamic quantization
+
+        Returns:
+            OnnxEmbeddingModel instance
+        """
+        if not TORCH_AVAILABLE:
+            raise ImportError("torch is required to export models to ONNX. Install with: pip install torch")
+
+        export_dir = Path(export_dir)
+        export_dir.mkdir(parents=True, exist_ok=True)
+
+        safe_name = model_name.replace("/", "__")
+        onnx_path = export_dir / f"{safe_name}.onnx"
+
+        transformer = model[0]
+        pooling = "cls" if getattr(model[1], "pooling_mode_cls_token", False) else "mean"
+
+        if not onnx_path.exists():
+            cls._export(transformer, onnx_path)
+
+        if use_quantization:
+            quantized_path = export_dir / f"{safe_name}.int8.onnx"
+            if not quantized_path.exists():
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+                quantize_dynamic(str(onnx_path), str(quantized_path), weight_type=QuantType.QInt8)
+                logger.info("Quantized ONNX model", path=str(quantized_path))
+            onnx_path = quantized_path
+
+        return cls(
+            onnx_path=str(onnx_path),
+            tokenizer=transformer.tokenizer,
+            max_seq_length=model.max_seq_length,
+            embedding_dim=model.get_sentence_embedding_dimension(),
+            pooling=pooling
+        )
+
+    @staticmethod
+    def _export(transformer, onnx_path: Path) -> None:
+        """Export the Hugging Face encoder of a sentence-transformer to ONNX."""
+        logger.info("Exporting model to ONNX", path=str(onnx_path))
+
+        auto_model = transformer.auto_model
+        auto_model.eval()
+
+        sample = transformer.tokenizer(["export sample"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        tmp_path = onnx_path.with_suffix(".tmp")
+        with torch.no_grad():
+            torch.onnx.export(
+                auto_model,
+                tuple(sample[name] for name in input_names),
+                str(tmp_path),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+        tmp_path.replace(onnx_path)
+
+        logger.info("ONNX export completed", path=str(onnx_path))
+
+    def encode(self, sentences: List[str], batch_size: int = 32,
+               convert_to_tensor: bool = False, show_progress_bar: bool = False,
+               normalize_embeddings: bool = False) -> np.ndarray:
+        """
+        Encode sentences into embeddings.
+
+        Args:
+            sentences: Texts to encode
+            batch_size: Number of texts per session run
+            convert_to_tensor: Unused, kept for SentenceTransformer compatibility
+            show_progress_bar: Unused, kept for SentenceTransformer compatibility
+            normalize_embeddings: Whether to L2-normalize the embeddings
+
+        Returns:
+            Array of shape (len(sentences), embedding_dim)
+        """
+        outputs = []
+
+        for start in range(0, len(sentences), batch_size):
+            batch = sentences[start:start + batch_size]
+            encoded = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded}
+
+            token_embeddings = self.session.run(None, feeds)[0]
+
+            if self.pooling == "cls":
+                pooled = token_embeddings[:, 0]
+            else:
+                mask = encoded["attention_mask"][..., None].astype(np.float32)
+                pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+            outputs.append(pooled.astype(np.float32))
+
+        embeddings = np.vstack(outputs) if outputs else np.empty((0, self.embedding_dim), dtype=np.float32)
+
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+
+        return embeddings
+
+    def get_sentence_embedding_dimension(self) -> int:
+        """Get the output embedding dimension."""
+        return self.embedding_dim
+
+    def get_memory_usage(self) -> int:
+        """Get the size of the ONNX model weights in bytes."""
+        return self.onnx_path.stat().st_size if self.onnx_path.exists() else 0
+
+
+def check_backend_parity(reference_model, candidate_model,
+                         texts: Optional[List[str]] = None,
+                         threshold: float = 0.99) -> Dict[str, Any]:
+    """
+    Compare a candidate backend's embeddings with the fp32 reference.
+
+    Args:
+        reference_model: fp32 model (anything with an `encode` method)
+        candidate_model: Quantized or ONNX model to validate
+        texts: Texts to compare on (defaults to PARITY_SAMPLE_TEXTS)
+        threshold: Minimum per-text cosine similarity required to pass
+
+    Returns:
+        Dictionary with min/mean cosine similarity and pass/fail
+    """
+    texts = texts or PARITY_SAMPLE_TEXTS
+
+    reference = np.asarray(reference_model.encode(texts, convert_to_tensor=False,
+                                                  show_progress_bar=False,
+                                                  normalize_embeddings=True), dtype=np.float32)
+    candidate = np.asarray(candidate_model.encode(texts, convert_to_tensor=False,
+                                                  show_progress_bar=False,
+                                                  normalize_embeddings=True), dtype=np.float32)
+
+    cosines = np.sum(reference * candidate, axis=1)
+
+    return {
+        "texts": len(texts),
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "threshold": threshold,
+        "passed": bool(cosines.min() >= threshold)
+    }
+
+
+def measure_throughput(model, texts: List[str], batch_size: int = 32,
+                       repeats: int = 3) -> Dict[str, Any]:
+    """
+    Measure encoding throughput of a model.
+
+    Args:
+        model: Model with an `encode` method
+        texts: Texts to encode
+        batch_size: Batch size passed to `encode`
+        repeats: Number of timed runs (the best run is reported)
+
+    Returns:
+        Dictionary with best wall time and texts per second
+    """
+    # Warm-up run so one-time graph/kernel setup is not timed
+    model.encode(texts[:batch_size], batch_size=batch_size, convert_to_tensor=False,
+                 show_progress_bar=False, normalize_embeddings=True)
+
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.encode(texts, batch_size=batch_size, convert_to_tensor=False,
+                     show_progress_bar=False, normalize_embeddings=True)
+        best = min(best, time.perf_counter() - start)
+
+    return {
+        "texts": len(texts),
+        "batch_size": batch_size,
+        "seconds": best,
+        "texts_per_second": len(texts) / best if best > 0 else 0.0
+    }
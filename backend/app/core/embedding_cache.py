@@ -0,0 +1,524 @@
+"""
+Embedding Cache for PrivAI
+Content-addressed embedding cache backed by one append-only, memory-mapped matrix file
+"""
+import json
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+
+from .logging import get_logger
+from .segment_log import FileLock, write_file_atomic
+
+logger = get_logger("embedding_cache")
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of embedding vectors.
+
+    Vectors are appended as rows of a single float32 (or float16) matrix file
+    that is read through a memory map; a parallel key file holds the 16-byte digest of each
+    row. An in-memory key -> row index makes lookups O(1) and keeps LRU order,
+    and the cache is compacted when it grows past `max_entries`.
+
+    Several caches (threads or processes) may share a directory. Appends,
+    compactions and reloads hold an inter-process lock on `cache.lock`, and
+    each append first reads the rows other writers added. Compaction writes
+    the next generation of files and switches `cache_meta.json` to it, so
+    files that other caches still map are never replaced in place.
+    """
+
+    MATRIX_FILES = {"float32": "embeddings.{generation}.f32", "float16": "embeddings.{generation}.f16"}
+    KEYS_FILE = "keys.{generation}.bin"
+    META_FILE = "cache_meta.json"
+    LOCK_FILE = "cache.lock"
+    KEY_BYTES = 16
+
+    # Data files of any generation (and of the older unversioned layout)
+    DATA_FILE_PATTERN = re.compile(r"^(embeddings(\.\d+)?\.f(32|16)|keys(\.\d+)?\.bin)$")
+
+    def __init__(self,
+                 cache_dir: str,
+                 embedding_dim: int,
+                 max_entries: int = 500000,
+                 evict_ratio: float = 0.9,
+                 dtype: str = "float32"):
+        """
+        Initialize the embedding cache.
+
+        Args:
+            cache_dir: Directory holding the cache files
+            embedding_dim: Dimension of the cached vectors
+            max_entries: Maximum number of cached vectors before eviction
+            evict_ratio: Fraction of max_entries kept after an eviction pass
+            dtype: Storage precision of cached vectors ("float32" or "float16");
+                lookups always return float32
+        """
+        if dtype not in self.MATRIX_FILES:
+            raise ValueError(f"Unsupported cache dtype: {dtype}. Use one of {list(self.MATRIX_FILES)}")
+
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.embedding_dim = embedding_dim
+        self.max_entries = max_entries
+        self.evict_ratio = evict_ratio
+        self.dtype = np.dtype(dtype)
+
+        self.meta_file = self.cache_dir / self.META_FILE
+
+        self._index: "OrderedDict[bytes, int]" = OrderedDict()  # key -> row, LRU order
+        self._rows = 0
+        self._generation = 0
+        self._matrix: Optional[np.memmap] = None
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(self.cache_dir / self.LOCK_FILE)
+
+        with self._lock, self._file_lock:
+            self._load()
+
+        logger.info("EmbeddingCache initialized",
+                   cache_dir=str(self.cache_dir),
+                   embedding_dim=embedding_dim,
+                   dtype=dtype,
+                   entries=len(self._index),
+                   max_entries=max_entries)
+
+    @property
+    def row_bytes(self) -> int:
+        """Size in bytes of one cached vector."""
+        return self.embedding_dim * self.dtype.itemsize
+
+    @property
+    def matrix_file(self) -> Path:
+        """Matrix file of the current generation."""
+        return self._matrix_path(self._generation)
+
+    @property
+    def keys_file(self) -> Path:
+        """Key file of the current generation."""
+        return self._keys_path(self._generation)
+
+    def _matrix_path(self, generation: int) -> Path:
+        return self.cache_dir / self.MATRIX_FILES[self.dtype.name].format(generation=generation)
+
+    def _keys_path(self, generation: int) -> Path:
+        return self.cache_dir / self.KEYS_FILE.format(generation=generation)
+
+    def _read_meta(self) -> Optional[Dict[str, Any]]:
+        """Cache metadata, or None if there is none yet."""
+        if not self.meta_file.exists():
+            return None
+        with open(self.meta_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self, generation: int) -> None:
+        """Switch the cache to a generation of files (caller holds the file lock)."""
+        meta = {"embedding_dim": self.embedding_dim, "dtype": self.dtype.name, "generation": generation}
+        write_file_atomic(self.meta_file, json.dumps(meta).encode("utf-8"))
+
+    def _load(self) -> None:
+        """Load the key index and map the matrix file (caller holds the file lock)."""
+        try:
+            meta = self._read_meta()
+            if meta is None or "generation" not in meta:
+                # New directory, or written before files were versioned
+                self._reset_files(meta)
+                return
+
+            if meta.get("embedding_dim") != self.embedding_dim or meta.get("dtype") != self.dtype.name:
+                logger.warning("Embedding cache layout changed, resetting cache",
+                              cached_dim=meta.get("embedding_dim"),
+                              expected_dim=self.embedding_dim,
+                              cached_dtype=meta.get("dtype"),
+                              expected_dtype=self.dtype.name)
+                self._reset_files(meta)
+                return
+
+            self._generation = int(meta["generation"])
+            self._index.clear()
+            self._rows = 0
+            self._matrix = None
+            self._read_new_rows()
+            self._remove_stale_files()
+
+        except Exception as e:
+            logger.warning("Failed to load embedding cache, resetting", error=str(e))
+            self._reset_files(None)
+
+    def _refresh(self) -> None:
+        """Pick up what other caches on the directory wrote (caller holds the file lock)."""
+        meta = self._read_meta()
+        if meta is None or meta.get("generation") != self._generation:
+            # Compacted or cleared elsewhere: row numbers changed
+            self._load()
+        else:
+            self._read_new_rows()
+
+    def _read_new_rows(self) -> None:
+        """Index rows appended to the current files since the last read (caller holds the file lock)."""
+        key_rows = self.keys_file.stat().st_size // self.KEY_BYTES if self.keys_file.exists() else 0
+        matrix_rows = self.matrix_file.stat().st_size // self.row_bytes if self.matrix_file.exists() else 0
+
+        # A crash between the two appends leaves a trailing partial row; drop it
+        rows = min(key_rows, matrix_rows)
+        self._truncate_files(rows)
+        if rows == self._rows:
+            return
+        if rows < self._rows:
+            raise RuntimeError(f"Embedding cache files shrank from {self._rows} to {rows} rows")
+
+        with open(self.keys_file, "rb") as f:
+            f.seek(self._rows * self.KEY_BYTES)
+            raw_keys = f.read((rows - self._rows) * self.KEY_BYTES)
+
+        for offset in range(rows - self._rows):
+            key = raw_keys[offset * self.KEY_BYTES:(offset + 1) * self.KEY_BYTES]
+            self._index[key] = self._rows + offset
+            self._index.move_to_end(key)
+
+        self._rows = rows
+        self._remap()
+
+    def _reset_files(self, meta: Optional[Dict[str, Any]]) -> None:
+        """Start an empty generation of files (caller holds the file lock)."""
+        generation = max(self._generation, int((meta or {}).get("generation", 0))) + 1
+
+        self._matrix = None
+        self._index.clear()
+        self._rows = 0
+
+        self._matrix_path(generation).write_bytes(b"")
+        self._keys_path(generation).write_bytes(b"")
+        self._write_meta(generation)
+        self._generation = generation
+        self._remove_stale_files()
+
+    def _remove_stale_files(self) -> None:
+        """Delete data files of other generations (files still mapped elsewhere are retried later)."""
+        current = {self.matrix_file.name, self.keys_file.name}
+        for path in self.cache_dir.iterdir():
+            if path.name not in current and self.DATA_FILE_PATTERN.match(path.name):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def _truncate_files(self, rows: int) -> None:
+        """Truncate both files to exactly `rows` rows."""
+        for path, size in ((self.keys_file, rows * self.KEY_BYTES),
+                           (self.matrix_file, rows * self.row_bytes)):
+            if not path.exists():
+                path.touch()
+            if path.stat().st_size != size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def _remap(self) -> None:
+        """Re-create the memory map after the matrix file changed size."""
+        self._matrix = None
+        if self._rows > 0:
+            self._matrix = np.memmap(self.matrix_file, dtype=self.dtype, mode="r",
+                                     shape=(self._rows, self.embedding_dim))
+
+    @staticmethod
+    def _to_key(cache_key: str) -> bytes:
+        """Convert a hex digest cache key to its 16-byte form."""
+        return bytes.fromhex(cache_key)[:EmbeddingCache.KEY_BYTES].ljust(EmbeddingCache.KEY_BYTES, b"\0")
+
+    def get(self, cache_key: str) -> Optional[np.ndarray]:
+        """
+        Look up a single embedding.
+
+        Args:
+            cache_key: Hex digest cache key
+
+        Returns:
+            Cached embedding or None if not found
+        """
+        hit_positions, embeddings = self.get_many([cache_key])
+        return embeddings[0] if hit_positions else None
+
+    def get_many(self, cache_keys: List[str]) -> Tuple[List[int], np.ndarray]:
+        """
+        Look up many embeddings with a single gather from the matrix file.
+
+        Args:
+            cache_keys: Hex digest cache keys
+
+        Returns:
+            Tuple of (positions in `cache_keys` that were found, matrix of their embeddings)
+        """
+        with self._lock:
+            hit_positions = []
+            rows = []
+
+            for position, cache_key in enumerate(cache_keys):
+                key = self._to_key(cache_key)
+                row = self._index.get(key)
+                if row is not None:
+                    self._index.move_to_end(key)
+                    hit_positions.append(position)
+                    rows.append(row)
+
+            if not rows:
+                return [], np.empty((0, self.embedding_dim), dtype=np.float32)
+
+            embeddings = np.asarray(self._matrix[np.asarray(rows)], dtype=np.float32)
+            return hit_positions, embeddings
+
+    def put(self, cache_key: str, embedding: np.ndarray) -> None:
+        """
+        Store a single embedding.
+
+        Args:
+            cache_key: Hex digest cache key
+            embedding: Embedding vector
+        """
+        self.put_many([cache_key], [embedding])
+
+    def put_many(self, cache_keys: List[str], embeddings) -> int:
+        """
+        Append many embeddings to the cache in one write.
+
+        Args:
+            cache_keys: Hex digest cache keys
+            embeddings: Embedding vectors (list of arrays or 2D array)
+
+        Returns:
+            Number of new entries written
+        """
+        if len(cache_keys) != len(embeddings):
+            raise ValueError(f"Number of keys ({len(cache_keys)}) must match number of embeddings ({len(embeddings)})")
+
+        with self._lock:
+            new_keys = []
+            new_positions = []
+            seen = set()
+
+            for position, cache_key in enumerate(cache_keys):
+                key = self._to_key(cache_key)
+                if key in self._index or key in seen:
+                    continue
+                seen.add(key)
+                new_keys.append(key)
+                new_positions.append(position)
+
+            if not new_keys:
+                return 0
+
+            matrix = np.asarray([embeddings[p] for p in new_positions], dtype=self.dtype)
+            if matrix.shape[1] != self.embedding_dim:
+                raise ValueError(f"Embeddings have dimension {matrix.shape[1]}, expected {self.embedding_dim}")
+
+            with self._file_lock:
+                # Append after the rows other caches wrote, at the files' real row count
+                self._refresh()
+                fresh = [i for i, key in enumerate(new_keys) if key not in self._index]
+                if not fresh:
+                    return 0
+                if len(fresh) < len(new_keys):
+                    new_keys = [new_keys[i] for i in fresh]
+                    matrix = matrix[fresh]
+
+                # Matrix first, keys second: a key is only visible once its row is complete
+                with open(self.matrix_file, "ab") as f:
+                    f.write(np.ascontiguousarray(matrix).tobytes())
+                with open(self.keys_file, "ab") as f:
+                    f.write(b"".join(new_keys))
+
+                for offset, key in enumerate(new_keys):
+                    self._index[key] = self._rows + offset
+                self._rows += len(new_keys)
+                self._remap()
+
+                if len(self._index) > self.max_entries:
+                    self._evict()
+
+            return len(new_keys)
+
+    def _evict(self) -> None:
+        """Drop least recently used entries and compact the files."""
+        keep = int(self.max_entries * self.evict_ratio)
+        evicted = len(self._index) - keep
+
+        while len(self._index) > keep:
+            self._index.popitem(last=False)
+
+        self._compact()
+
+        logger.info("Embedding cache evicted entries",
+                   evicted=evicted,
+                   remaining=len(self._index))
+
+    def _compact(self) -> None:
+        """Write the live rows, in LRU order, as the next generation of files (caller holds the file lock)."""
+        keys = list(self._index.keys())
+        rows = np.asarray(list(self._index.values()), dtype=np.int64)
+        generation = self._generation + 1
+
+        if len(rows) > 0:
+            np.ascontiguousarray(self._matrix[rows], dtype=self.dtype).tofile(self._matrix_path(generation))
+        else:
+            self._matrix_path(generation).write_bytes(b"")
+        with open(self._keys_path(generation), "wb") as f:
+            f.write(b"".join(keys))
+
+        # Other caches reload on their next write once the metadata points at the new files
+        self._write_meta(generation)
+        self._generation = generation
+
+        self._index = OrderedDict((key, row) for row, key in enumerate(keys))
+        self._rows = len(keys)
+        self._remap()
+        self._remove_stale_files()
+
+    def __contains__(self, cache_key: str) -> bool:
+        """Check if a key is cached."""
+        return self._to_key(cache_key) in self._index
+
+    def __len__(self) -> int:
+        """Return the number of cached embeddings."""
+        return len(self._index)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics without touching the filesystem.
+
+        Returns:
+            Dictionary with cache statistics
+        """
+        return {
+            "entries": len(self._index),
+            "rows_on_disk": self._rows,
+            "generation": self._generation,
+            "disk_bytes": self._rows * (self.row_bytes + self.KEY_BYTES),
+            "max_entries": self.max_entries,
+            "embedding_dim": self.embedding_dim,
+            "dtype": self.dtype.name
+        }
+
+    def clear(self) -> int:
+        """
+        Remove every cached embedding.
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock, self._file_lock:
+            removed = len(self._index)
+            self._reset_files(self._read_meta())
+            return removed
+
+
+class CacheWriter:
+    """
+    Write-behind queue in front of an EmbeddingCache.
+
+    Embeddings are handed over as soon as each encoding batch finishes and a
+    background thread flushes them in larger batches, so model inference and
+    cache I/O overlap instead of alternating.
+    """
+
+    def __init__(self,
+                 cache: EmbeddingCache,
+                 flush_size: int = 256,
+                 flush_interval: float = 0.5):
+        """
+        Initialize the cache writer and start its background thread.
+
+        Args:
+            cache: Cache to write into
+            flush_size: Number of embeddings that triggers an immediate flush
+            flush_interval: Maximum seconds a submitted embedding waits before being flushed
+        """
+        self.cache = cache
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.written = 0
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run,
+                                        name="embedding-cache-writer",
+                                        daemon=True)
+        self._thread.start()
+
+    def submit(self, cache_keys: List[str], embeddings) -> None:
+        """
+        Queue embeddings for writing.
+
+        Args:
+            cache_keys: Hex digest cache keys
+            embeddings: Embedding vectors matching `cache_keys`
+        """
+        if self._closed:
+            raise RuntimeError("CacheWriter is closed")
+        if len(cache_keys) == 0:
+            return
+
+        self._queue.put((list(cache_keys), np.asarray(embeddings, dtype=np.float32)))
+
+    def flush(self) -> None:
+        """Block until every submitted embedding has been written."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Flush pending writes and stop the background thread."""
+        if self._closed:
+            return
+
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    @property
+    def pending(self) -> int:
+        """Number of submitted batches not yet written."""
+        return self._queue.qsize()
+
+    def _run(self) -> None:
+        """Collect submitted batches and write them to the cache in bulk."""
+        stop = False
+
+        while not stop:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+
+            pending = [item]
+            count = len(item[0])
+            deadline = time.monotonic() + self.flush_interval
+
+            while count < self.flush_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    self._queue.task_done()
+                    break
+                pending.append(item)
+                count += len(item[0])
+
+            try:
+                cache_keys = [key for keys, _ in pending for key in keys]
+                embeddings = np.vstack([batch for _, batch in pending])
+                self.written += self.cache.put_many(cache_keys, embeddings)
+            except Exception as e:
+                logger.warning("Failed to flush embeddings to cache",
+                              count=count,
+                              error=str(e))
+            finally:
+                for _ in pending:
+                    self._queue.task_done()
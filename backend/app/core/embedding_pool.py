@@ -0,0 +1,213 @@
+"""
+Embedding Worker Pool for PrivAI
+Shards embedding batches across worker processes for bulk ingestion
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import List, Dict, Any, Optional, Callable
+import numpy as np
+
+from .logging import get_logger
+
+logger = get_logger("embedding_pool")
+
+# Per-process state of a pool worker
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_worker(model_name: str, backend: str, use_quantization: bool,
+                 threads: int, onnx_export_dir: str) -> None:
+    """Load the model once per worker process with a pinned thread count."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from .embedding_backends import OnnxEmbeddingModel, quantize_dynamic_int8
+
+    torch.set_num_threads(threads)
+
+    model = SentenceTransformer(model_name, device="cpu")
+    if backend == "onnx":
+        model = OnnxEmbeddingModel.from_sentence_transformer(
+            model, onnx_export_dir, model_name, use_quantization=use_quantization)
+    elif use_quantization:
+        model = quantize_dynamic_int8(model)
+
+    _worker_state["model"] = model
+
+
+def _encode_shard(shm_name: str, rows: int, dim: int,
+                  positions: List[int], texts: List[str]) -> Dict[str, Any]:
+    """Encode one batch and write the vectors into shared memory at `positions`."""
+    start = time.perf_counter()
+
+    embeddings = _worker_state["model"].encode(
+        texts,
+        batch_size=len(texts),
+        convert_to_tensor=False,
+        show_progress_bar=False,
+        normalize_embeddings=True
+    )
+
+    # Spawned workers share the parent's resource tracker, and the parent unlinks the segment
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        output = np.ndarray((rows, dim), dtype=np.float32, buffer=shm.buf)
+        output[positions] = embeddings
+        del output
+    finally:
+        shm.close()
+
+    return {
+        "pid": os.getpid(),
+        "count": len(texts),
+        "seconds": time.perf_counter() - start
+    }
+
+
+class EmbeddingWorkerPool:
+    """
+    Pool of worker processes, each holding its own copy of the embedding model.
+
+    Batches are dispatched to whichever worker is free, and each worker writes
+    its vectors straight into a shared-memory matrix owned by the parent, so
+    only positions and timings travel back through pickling.
+    """
+
+    def __init__(self,
+                 model_name: str,
+                 embedding_dim: int,
+                 num_workers: int = 2,
+                 threads_per_worker: Optional[int] = None,
+                 backend: str = "torch",
+                 use_quantization: bool = False,
+                 onnx_export_dir: str = "data/onnx_models"):
+        """
+        Initialize the worker pool (workers start lazily on first use).
+
+        Args:
+            model_name: Sentence-transformer model name
+            embedding_dim: Output embedding dimension
+            num_workers: Number of worker processes
+            threads_per_worker: torch threads per worker (defaults to cpu_count // num_workers)
+            backend: Inference backend ('torch' or 'onnx')
+            use_quantization: Whether workers use int8 quantization
+            onnx_export_dir: Directory holding exported ONNX models
+        """
+        self.model_name = model_name
+        self.embedding_dim = embedding_dim
+        self.num_workers = max(1, num_workers)
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.num_workers)
+        self.backend = backend
+        self.use_quantization = use_quantization
+        self.onnx_export_dir = onnx_export_dir
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.worker_stats: Dict[int, Dict[str, float]] = {}
+
+        logger.info("EmbeddingWorkerPool initialized",
+                   model_name=model_name,
+                   num_workers=self.num_workers,
+                   threads_per_worker=self.threads_per_worker)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Start the worker processes on first use."""
+        if self._executor is None:
+            # spawn: workers must not inherit the parent's torch thread pools
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.backend, self.use_quantization,
+                          self.threads_per_worker, self.onnx_export_dir)
+            )
+        return self._executor
+
+    def encode(self, texts: List[str], batches: List[List[int]],
+               on_batch: Optional[Callable[[List[int], np.ndarray], None]] = None) -> np.ndarray:
+        """
+        Encode texts across the worker processes.
+
+        Args:
+            texts: Texts to encode
+            batches: Batches of positions into `texts` (e.g. from plan_length_buckets)
+            on_batch: Optional callback receiving (positions, embeddings) as batches finish
+
+        Returns:
+            Array of shape (len(texts), embedding_dim) in the order of `texts`
+        """
+        if not texts:
+            return np.empty((0, self.embedding_dim), dtype=np.float32)
+
+        rows = len(texts)
+        shm = shared_memory.SharedMemory(create=True, size=rows * self.embedding_dim * 4)
+        output = None
+
+        try:
+            output = np.ndarray((rows, self.embedding_dim), dtype=np.float32, buffer=shm.buf)
+
+            with self._lock:
+                executor = self._get_executor()
+                futures = {
+                    executor.submit(_encode_shard, shm.name, rows, self.embedding_dim,
+                                    positions, [texts[p] for p in positions]): positions
+                    for positions in batches
+                }
+
+            for future in as_completed(futures):
+                result = future.result()
+                self._record(result)
+
+                if on_batch is not None:
+                    positions = futures[future]
+                    on_batch(positions, output[positions].copy())
+
+            return output.copy()
+
+        finally:
+            # Release the view before closing, or the buffer cannot be unmapped
+            output = None
+            shm.close()
+            shm.unlink()
+
+    def _record(self, result: Dict[str, Any]) -> None:
+        """Accumulate per-worker throughput statistics."""
+        stats = self.worker_stats.setdefault(result["pid"], {"chunks": 0, "seconds": 0.0})
+        stats["chunks"] += result["count"]
+        stats["seconds"] += result["seconds"]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get per-worker throughput statistics.
+
+        Returns:
+            Dictionary with chunks/sec per worker
+        """
+        workers = {
+            str(pid): {
+                "chunks": stats["chunks"],
+                "seconds": stats["seconds"],
+                "chunks_per_second": stats["chunks"] / stats["seconds"] if stats["seconds"] else 0.0
+            }
+            for pid, stats in self.worker_stats.items()
+        }
+
+        return {
+            "num_workers": self.num_workers,
+            "threads_per_worker": self.threads_per_worker,
+            "started": self._executor is not None,
+            "total_chunks": sum(w["chunks"] for w in workers.values()),
+            "workers": workers
+        }
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+        logger.info("EmbeddingWorkerPool closed", model_name=self.model_name)
@@ -3,10 +3,10 @@ Embedding Generation Module for PrivAI
 Handles vector generation using sentence-transformers for text chunks
 """
 import os
-import pickle
 import hashlib
+import threading
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Union, Tuple
+from typing import List, Dict, Any, Optional, Union, Tuple, Callable
 import numpy as np
 
 # Optional imports for embedding generation
@@ -25,6 +25,14 @@ except ImportError:
 
 from .config import settings
 from .logging import get_logger
+from .embedding_cache import EmbeddingCache, CacheWriter
+from .embedding_pool import EmbeddingWorkerPool
+from .embedding_backends import (
+    SUPPORTED_BACKENDS,
+    OnnxEmbeddingModel,
+    quantize_dynamic_int8,
+    check_backend_parity
+)
 
 logger = get_logger("embeddings")
 
@@ -39,15 +47,19 @@ class EmbeddingGenerator:
                  model_name: str = "all-MiniLM-L6-v2",
                  device: str = "cpu",
                  use_quantization: bool = False,
-                 cache_dir: Optional[str] = None):
+                 cache_dir: Optional[str] = None,
+                 backend: str = "torch",
+                 num_workers: Optional[int] = None):
         """
         Initialize the embedding generator.
         
         Args:
             model_name: Name of the sentence-transformer model to use
             device: Device to run on ('cpu' or 'cuda')
-            use_quantization: Whether to use quantized embeddings for efficiency
+            use_quantization: Whether to use int8 dynamic quantization (CPU only)
             cache_dir: Directory to cache embeddings (optional)
+            backend: Inference backend ('torch' or 'onnx')
+            num_workers: Worker processes for bulk encoding (defaults to settings.embedding_workers, 0 disables)
         """
         if not SENTENCE_TRANSFORMERS_AVAILABLE:
             raise ImportError(
@@ -55,21 +67,43 @@ class EmbeddingGenerator:
                 "Install with: pip install sentence-transformers"
             )
         
+        if backend not in SUPPORTED_BACKENDS:
+            raise ValueError(f"Unsupported embedding backend: {backend}")
+        
         self.model_name = model_name
         self.device = device
         self.use_quantization = use_quantization
+        self.backend = backend
+        self.parity_report = None
+        self.num_workers = settings.embedding_workers if num_workers is None else num_workers
+        self.worker_pool = None
         self.cache_dir = Path(cache_dir) if cache_dir else Path("data/embeddings_cache")
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         
         # Initialize model
         self.model = None
         self.embedding_dim = None
+        # Serializes forward passes so one instance can be shared across threads
+        self._encode_lock = threading.RLock()
         self._load_model()
         
+        # Single-file embedding cache keyed by content hash
+        self.cache = EmbeddingCache(
+            cache_dir=str(self.cache_dir),
+            embedding_dim=self.embedding_dim,
+            max_entries=settings.embedding_cache_max_entries,
+            dtype=settings.embedding_cache_dtype
+        )
+        self.cache_writer = CacheWriter(self.cache)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.padding_stats = {"batches": 0, "real_tokens": 0, "padded_tokens": 0}
+        
         logger.info("EmbeddingGenerator initialized", 
                    model_name=model_name,
                    device=device,
-                   use_quantization=use_quantization,
+                   use_quantization=self.use_quantization,
+                   backend=self.backend,
                    cache_dir=str(self.cache_dir))
     
     def _load_model(self) -> None:
@@ -83,8 +117,8 @@ class EmbeddingGenerator:
             # Get embedding dimension
             self.embedding_dim = self.model.get_sentence_embedding_dimension()
             
-            # Apply quantization if requested
-            if self.use_quantization and TORCH_AVAILABLE:
+            # Switch to the optimized backend if requested
+            if self.backend == "onnx" or self.use_quantization:
                 self._apply_quantization()
             
             logger.info("Model loaded successfully", 
@@ -99,15 +133,62 @@ class EmbeddingGenerator:
             raise
     
     def _apply_quantization(self) -> None:
-        """Apply quantization to the model for efficiency."""
+        """
+        Replace the fp32 model with its int8-quantized or ONNX Runtime version.
+        
+        The optimized model is checked against the fp32 reference; if the
+        cosine similarity drops below settings.embedding_parity_threshold the
+        fp32 model is kept.
+        """
+        reference = self.model
+        
         try:
-            if TORCH_AVAILABLE and hasattr(self.model, 'encode'):
-                logger.info("Applying quantization to model")
-                # Note: Actual quantization would require more complex implementation
-                # This is a placeholder for future quantization features
-                logger.info("Quantization applied (placeholder)")
+            if self.backend == "onnx":
+                if self.device != "cpu":
+                    raise ValueError("The ONNX backend only supports device='cpu'")
+                
+                logger.info("Loading ONNX Runtime backend", quantized=self.use_quantization)
+                candidate = OnnxEmbeddingModel.from_sentence_transformer(
+                    reference,
+                    export_dir=str(Path(settings.faiss_index_path).parent / "onnx_models"),
+                    model_name=self.model_name,
+                    use_quantization=self.use_quantization
+                )
+            else:
+                if self.device != "cpu":
+                    raise ValueError("Dynamic int8 quantization only supports device='cpu'")
+                if not TORCH_AVAILABLE:
+                    raise ImportError("torch is required for int8 quantization")
+                
+                logger.info("Applying int8 dynamic quantization to model")
+                candidate = quantize_dynamic_int8(reference)
+            
+            self.parity_report = check_backend_parity(
+                reference, 
+                candidate, 
+                threshold=settings.embedding_parity_threshold
+            )
+            
+            if not self.parity_report["passed"]:
+                logger.warning("Optimized model failed parity check, keeping fp32 model",
+                              backend=self.backend,
+                              **self.parity_report)
+                self.backend = "torch"
+                self.use_quantization = False
+                return
+            
+            self.model = candidate
+            logger.info("Optimized model passed parity check",
+                       backend=self.backend,
+                       quantized=self.use_quantization,
+                       **self.parity_report)
+            
         except Exception as e:
-            logger.warning("Failed to apply quantization", error=str(e))
+            logger.warning("Failed to apply quantization, keeping fp32 model", 
+                          backend=self.backend,
+                          error=str(e))
+            self.backend = "torch"
+            self.use_quantization = False
     
     def generate_embeddings(self, chunks: List[Dict[str, Any]], 
                            batch_size: int = 32,
@@ -133,40 +214,40 @@ class EmbeddingGenerator:
                        batch_size=batch_size,
                        use_cache=use_cache)
             
-            # Extract texts and check cache
-            texts = []
+            # Compute every cache key once and probe the cache in one call
+            cache_keys = []
             cached_embeddings = {}
-            uncached_indices = []
             
             if use_cache:
-                for i, chunk in enumerate(chunks):
-                    cache_key = self._get_cache_key(chunk)
-                    cached_embedding = self._load_cached_embedding(cache_key)
-                    
-                    if cached_embedding is not None:
-                        cached_embeddings[i] = cached_embedding
-                        logger.debug("Using cached embedding", chunk_index=i)
-                    else:
-                        texts.append(chunk['text'])
-                        uncached_indices.append(i)
-            else:
-                texts = [chunk['text'] for chunk in chunks]
-                uncached_indices = list(range(len(chunks)))
+                cache_keys = [self._get_cache_key(chunk) for chunk in chunks]
+                hit_positions, hit_matrix = self._load_cached_embeddings(cache_keys)
+                cached_embeddings = dict(zip(hit_positions, hit_matrix))
+                
+                self.cache_hits += len(cached_embeddings)
+                self.cache_misses += len(chunks) - len(cached_embeddings)
+            
+            uncached_indices = [i for i in range(len(chunks)) if i not in cached_embeddings]
+            texts = [chunks[i]['text'] for i in uncached_indices]
             
             # Generate embeddings for uncached chunks
             new_embeddings = {}
             if texts:
                 logger.info("Generating new embeddings", count=len(texts))
-                embeddings = self._generate_batch_embeddings(texts, batch_size)
+                
+                # Hand each finished batch to the background writer so cache
+                # writes overlap with encoding of the next batch
+                on_batch = None
+                if use_cache:
+                    def on_batch(positions: List[int], batch_embeddings: np.ndarray) -> None:
+                        self.cache_writer.submit(
+                            [cache_keys[uncached_indices[p]] for p in positions],
+                            batch_embeddings
+                        )
+                
+                embeddings = self._generate_batch_embeddings(texts, batch_size, on_batch=on_batch)
                 
                 for i, embedding in enumerate(embeddings):
-                    chunk_index = uncached_indices[i]
-                    new_embeddings[chunk_index] = embedding
-                    
-                    # Cache the embedding
-                    if use_cache:
-                        cache_key = self._get_cache_key(chunks[chunk_index])
-                        self._save_cached_embedding(cache_key, embedding)
+                    new_embeddings[uncached_indices[i]] = embedding
             
             # Combine cached and new embeddings
             result_chunks = []
@@ -194,50 +275,133 @@ class EmbeddingGenerator:
             logger.error("Failed to generate embeddings", error=str(e))
             raise
     
-    def _generate_batch_embeddings(self, texts: List[str], batch_size: int) -> List[np.ndarray]:
+    def _generate_batch_embeddings(self, texts: List[str], batch_size: int,
+                                   on_batch: Optional[Callable[[List[int], np.ndarray], None]] = None) -> List[np.ndarray]:
         """
         Generate embeddings for a batch of texts.
         
+        Texts are bucketed by length so each forward pass pads to a similar
+        length; `batch_size` sets the token budget per pass (batch_size
+        full-length sequences) rather than a fixed item count.
+        
         Args:
             texts: List of texts to embed
             batch_size: Batch size for processing
+            on_batch: Optional callback receiving (positions in texts, embeddings) after each batch
             
         Returns:
-            List of normalized embedding vectors
+            List of normalized embedding vectors, in the order of `texts`
         """
         try:
+            max_seq_length = getattr(self.model, 'max_seq_length', None) or 256
+            lengths = [self._estimate_tokens(text, max_seq_length) for text in texts]
+            buckets = plan_length_buckets(
+                lengths,
+                max_tokens=batch_size * max_seq_length,
+                max_items=max(batch_size, settings.embedding_max_batch_items)
+            )
+            
             logger.info("Generating batch embeddings", 
                        text_count=len(texts),
-                       batch_size=batch_size)
+                       batch_size=batch_size,
+                       buckets=len(buckets))
+            
+            real_tokens = 0
+            padded_tokens = 0
+            for positions in buckets:
+                batch_lengths = [lengths[p] for p in positions]
+                real_tokens += sum(batch_lengths)
+                padded_tokens += max(batch_lengths) * len(batch_lengths)
+            
+            # Large jobs are sharded across the worker pool when one is configured
+            if self.num_workers > 0 and len(texts) >= settings.embedding_pool_min_texts:
+                logger.info("Dispatching batches to embedding worker pool", 
+                           workers=self.num_workers,
+                           batches=len(buckets))
+                all_embeddings = list(self._get_worker_pool().encode(texts, buckets, on_batch=on_batch))
+            else:
+                all_embeddings = self._encode_buckets(texts, buckets, on_batch)
             
-            # Generate embeddings in batches
-            all_embeddings = []
+            self.padding_stats["batches"] += len(buckets)
+            self.padding_stats["real_tokens"] += real_tokens
+            self.padding_stats["padded_tokens"] += padded_tokens
             
-            for i in range(0, len(texts), batch_size):
-                batch_texts = texts[i:i + batch_size]
-                
-                logger.debug("Processing batch", 
-                           batch_start=i,
-                           batch_size=len(batch_texts))
-                
-                # Generate embeddings for this batch
+            logger.info("Batch embedding generation completed", 
+                       total_embeddings=len(all_embeddings),
+                       padding_efficiency=real_tokens / padded_tokens if padded_tokens else 1.0)
+            
+            return all_embeddings
+            
+        except Exception as e:
+            logger.error("Failed to generate batch embeddings", error=str(e))
+            raise
+    
+    def _encode_buckets(self, texts: List[str], buckets: List[List[int]],
+                        on_batch: Optional[Callable[[List[int], np.ndarray], None]] = None) -> List[np.ndarray]:
+        """
+        Encode planned batches in this process.
+        
+        Args:
+            texts: List of texts to embed
+            buckets: Batches of positions into texts
+            on_batch: Optional callback receiving (positions in texts, embeddings) after each batch
+            
+        Returns:
+            List of embedding vectors in the order of `texts`
+        """
+        # Generate embeddings bucket by bucket, then restore the input order
+        all_embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+        
+        for positions in buckets:
+            batch_texts = [texts[p] for p in positions]
+            
+            logger.debug("Processing batch", batch_size=len(batch_texts))
+            
+            # Generate embeddings for this batch
+            with self._encode_lock:
                 batch_embeddings = self.model.encode(
                     batch_texts,
+                    batch_size=len(batch_texts),
                     convert_to_tensor=False,
                     show_progress_bar=False,
                     normalize_embeddings=True  # Normalize for cosine similarity
                 )
-                
-                all_embeddings.extend(batch_embeddings)
             
-            logger.info("Batch embedding generation completed", 
-                       total_embeddings=len(all_embeddings))
+            for p, embedding in zip(positions, batch_embeddings):
+                all_embeddings[p] = embedding
             
-            return all_embeddings
+            if on_batch is not None:
+                on_batch(positions, batch_embeddings)
+        
+        return all_embeddings
+    
+    def _get_worker_pool(self) -> EmbeddingWorkerPool:
+        """Create the embedding worker pool on first use."""
+        with self._encode_lock:
+            if self.worker_pool is None:
+                self.worker_pool = EmbeddingWorkerPool(
+                    model_name=self.model_name,
+                    embedding_dim=self.embedding_dim,
+                    num_workers=self.num_workers,
+                    threads_per_worker=settings.embedding_worker_threads or None,
+                    backend=self.backend,
+                    use_quantization=self.use_quantization,
+                    onnx_export_dir=str(Path(settings.faiss_index_path).parent / "onnx_models")
+                )
+            return self.worker_pool
+    
+    def _estimate_tokens(self, text: str, max_seq_length: int) -> int:
+        """
+        Estimate the padded sequence length of a text (roughly 4 characters per token).
+        
+        Args:
+            text: Text to estimate
+            max_seq_length: Model truncation length
             
-        except Exception as e:
-            logger.error("Failed to generate batch embeddings", error=str(e))
-            raise
+        Returns:
+            Estimated token count including special tokens, capped at max_seq_length
+        """
+        return min(len(text) // 4 + 2, max_seq_length)
     
     def _get_cache_key(self, chunk: Dict[str, Any]) -> str:
         """
@@ -261,58 +425,37 @@ class EmbeddingGenerator:
             'chunk_overlap': metadata.get('chunk_overlap', 50)
         }
         
+        # Optimized backends produce slightly different vectors; keep them apart
+        if self.backend != "torch" or self.use_quantization:
+            key_data['backend'] = f"{self.backend}:{'int8' if self.use_quantization else 'fp32'}"
+        
         # Generate hash
         key_string = str(sorted(key_data.items()))
         return hashlib.md5(key_string.encode()).hexdigest()
     
-    def _load_cached_embedding(self, cache_key: str) -> Optional[np.ndarray]:
+    def _load_cached_embeddings(self, cache_keys: List[str]) -> Tuple[List[int], np.ndarray]:
         """
-        Load a cached embedding.
+        Load cached embeddings for many keys in one lookup.
         
         Args:
-            cache_key: Cache key for the embedding
+            cache_keys: Cache keys for the embeddings
             
         Returns:
-            Cached embedding array or None if not found
+            Tuple of (positions in cache_keys that were cached, matrix of cached embeddings)
         """
         try:
-            cache_file = self.cache_dir / f"{cache_key}.pkl"
+            hit_positions, embeddings = self.cache.get_many(cache_keys)
             
-            if cache_file.exists():
-                with open(cache_file, 'rb') as f:
-                    embedding = pickle.load(f)
-                
-                logger.debug("Loaded cached embedding", cache_key=cache_key)
-                return embedding
-            
-            return None
+            logger.debug("Loaded cached embeddings", 
+                        requested=len(cache_keys),
+                        hits=len(hit_positions))
+            return hit_positions, embeddings
             
         except Exception as e:
-            logger.warning("Failed to load cached embedding", 
-                          cache_key=cache_key, 
-                          error=str(e))
-            return None
-    
-    def _save_cached_embedding(self, cache_key: str, embedding: np.ndarray) -> None:
-        """
-        Save an embedding to cache.
-        
-        Args:
-            cache_key: Cache key for the embedding
-            embedding: Embedding array to cache
-        """
-        try:
-            cache_file = self.cache_dir / f"{cache_key}.pkl"
-            
-            with open(cache_file, 'wb') as f:
-                pickle.dump(embedding, f)
-            
-            logger.debug("Saved embedding to cache", cache_key=cache_key)
-            
-        except Exception as e:
-            logger.warning("Failed to save embedding to cache", 
-                          cache_key=cache_key, 
+            logger.warning("Failed to load cached embeddings", 
+                          count=len(cache_keys), 
                           error=str(e))
+            return [], np.empty((0, self.embedding_dim), dtype=np.float32)
     
     def compute_similarity(self, embedding1: np.ndarray, embedding2: np.ndarray) -> float:
         """
@@ -344,44 +487,74 @@ class EmbeddingGenerator:
     
     def find_similar_chunks(self, query_embedding: np.ndarray, 
                            chunk_embeddings: List[Dict[str, Any]], 
-                           top_k: int = 5) -> List[Dict[str, Any]]:
+                           top_k: int = 5,
+                           embedding_matrix: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
         """
         Find the most similar chunks to a query embedding.
         
+        Scores all chunks with one matrix-vector product and selects the top-k
+        with a partial sort, so it stays fast as a fallback when FAISS is unavailable.
+        
         Args:
             query_embedding: Query embedding vector
             chunk_embeddings: List of chunks with embeddings
             top_k: Number of top similar chunks to return
+            embedding_matrix: Optional matrix from build_embedding_matrix(chunk_embeddings),
+                reused across queries to skip re-stacking
             
         Returns:
             List of similar chunks with similarity scores
         """
+        results = self.find_similar_chunks_batch(
+            np.asarray(query_embedding).reshape(1, -1),
+            chunk_embeddings,
+            top_k=top_k,
+            embedding_matrix=embedding_matrix
+        )
+        return results[0] if results else []
+    
+    def find_similar_chunks_batch(self, query_embeddings: np.ndarray, 
+                                  chunk_embeddings: List[Dict[str, Any]], 
+                                  top_k: int = 5,
+                                  embedding_matrix: Optional[np.ndarray] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Find the most similar chunks for many query embeddings at once.
+        
+        Args:
+            query_embeddings: Array of shape (num_queries, embedding_dim)
+            chunk_embeddings: List of chunks with embeddings
+            top_k: Number of top similar chunks per query
+            embedding_matrix: Optional matrix from build_embedding_matrix(chunk_embeddings)
+            
+        Returns:
+            One list of similar chunks with similarity scores per query
+        """
         try:
-            similarities = []
+            if embedding_matrix is None:
+                embedding_matrix = build_embedding_matrix(chunk_embeddings)
             
-            for chunk in chunk_embeddings:
-                if 'embedding' not in chunk:
-                    logger.warning("Chunk missing embedding", chunk_id=chunk.get('metadata', {}).get('chunk_index'))
-                    continue
-                
-                similarity = self.compute_similarity(query_embedding, chunk['embedding'])
-                similarities.append((chunk, similarity))
+            # Rows of the matrix map back to the chunks that have an embedding
+            if embedding_matrix.shape[0] == len(chunk_embeddings):
+                positions = range(len(chunk_embeddings))
+            else:
+                positions = [i for i, chunk in enumerate(chunk_embeddings) if 'embedding' in chunk]
+                logger.warning("Chunks missing embeddings", count=len(chunk_embeddings) - len(positions))
             
-            # Sort by similarity (descending)
-            similarities.sort(key=lambda x: x[1], reverse=True)
+            indices, scores = top_k_similar(query_embeddings, embedding_matrix, top_k)
             
-            # Return top-k results
             results = []
-            for chunk, similarity in similarities[:top_k]:
-                result_chunk = chunk.copy()
-                result_chunk['similarity_score'] = similarity
-                results.append(result_chunk)
+            for row_indices, row_scores in zip(indices, scores):
+                query_results = []
+                for index, similarity in zip(row_indices, row_scores):
+                    result_chunk = chunk_embeddings[positions[index]].copy()
+                    result_chunk['similarity_score'] = float(similarity)
+                    query_results.append(result_chunk)
+                results.append(query_results)
             
             logger.info("Found similar chunks", 
-                       query_embedding_shape=query_embedding.shape,
+                       num_queries=len(results),
                        total_chunks=len(chunk_embeddings),
-                       top_k=top_k,
-                       results_count=len(results))
+                       top_k=top_k)
             
             return results
             
@@ -389,6 +562,48 @@ class EmbeddingGenerator:
             logger.error("Failed to find similar chunks", error=str(e))
             return []
     
+    def get_memory_usage(self) -> int:
+        """
+        Get the memory held by the model parameters and buffers.
+        
+        Returns:
+            Memory usage in bytes (0 if the model is not loaded)
+        """
+        if self.model is None:
+            return 0
+        
+        if isinstance(self.model, OnnxEmbeddingModel):
+            return self.model.get_memory_usage()
+        
+        if not TORCH_AVAILABLE:
+            return 0
+        
+        try:
+            # state_dict also covers the packed weights of quantized layers,
+            # which are not registered as parameters
+            total = 0
+            for value in self.model.state_dict().values():
+                values = value if isinstance(value, (tuple, list)) else (value,)
+                for tensor in values:
+                    if torch.is_tensor(tensor):
+                        total += tensor.numel() * tensor.element_size()
+            return int(total)
+        except Exception as e:
+            logger.warning("Failed to compute model memory usage", error=str(e))
+            return 0
+    
+    def close(self) -> None:
+        """Flush pending cache writes and release the model so its memory can be reclaimed."""
+        self.cache_writer.close()
+        
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+        
+        with self._encode_lock:
+            self.model = None
+        
+        logger.info("EmbeddingGenerator closed", model_name=self.model_name)
+    
     def get_embedding_stats(self) -> Dict[str, Any]:
         """
         Get statistics about the embedding generator.
@@ -402,16 +617,30 @@ class EmbeddingGenerator:
                 "device": self.device,
                 "embedding_dimension": self.embedding_dim,
                 "use_quantization": self.use_quantization,
+                "backend": self.backend,
+                "parity": self.parity_report,
                 "cache_directory": str(self.cache_dir),
-                "cache_enabled": True
+                "cache_enabled": True,
+                "model_memory_bytes": self.get_memory_usage()
             }
             
-            # Count cached embeddings
-            if self.cache_dir.exists():
-                cache_files = list(self.cache_dir.glob("*.pkl"))
-                stats["cached_embeddings"] = len(cache_files)
-            else:
-                stats["cached_embeddings"] = 0
+            # Cache statistics are tracked in memory, no directory scan needed
+            cache_stats = self.cache.get_stats()
+            stats["cached_embeddings"] = cache_stats["entries"]
+            stats["cache"] = cache_stats
+            
+            lookups = self.cache_hits + self.cache_misses
+            stats["cache_hits"] = self.cache_hits
+            stats["cache_misses"] = self.cache_misses
+            stats["cache_hit_rate"] = self.cache_hits / lookups if lookups else 0.0
+            stats["pending_cache_writes"] = self.cache_writer.pending
+            
+            padded_tokens = self.padding_stats["padded_tokens"]
+            stats["worker_pool"] = self.worker_pool.get_stats() if self.worker_pool else None
+            stats["batching"] = {
+                **self.padding_stats,
+                "padding_efficiency": self.padding_stats["real_tokens"] / padded_tokens if padded_tokens else 1.0
+            }
             
             return stats
             
@@ -422,22 +651,137 @@ class EmbeddingGenerator:
     def clear_cache(self) -> None:
         """Clear the embedding cache."""
         try:
-            if self.cache_dir.exists():
-                cache_files = list(self.cache_dir.glob("*.pkl"))
-                for cache_file in cache_files:
-                    cache_file.unlink()
-                
-                logger.info("Embedding cache cleared", files_removed=len(cache_files))
-            else:
-                logger.info("No cache to clear")
+            self.cache_writer.flush()
+            entries_removed = self.cache.clear()
+            
+            # Remove per-chunk pickles left over from the previous cache format
+            legacy_files = list(self.cache_dir.glob("*.pkl"))
+            for cache_file in legacy_files:
+                cache_file.unlink()
+            
+            logger.info("Embedding cache cleared", 
+                       entries_removed=entries_removed,
+                       legacy_files_removed=len(legacy_files))
                 
         except Exception as e:
             logger.error("Failed to clear embedding cache", error=str(e))
 
 
+def plan_length_buckets(lengths: List[int], 
+                        max_tokens: int, 
+                        max_items: int) -> List[List[int]]:
+    """
+    Group items into batches of similar length under a padded-token budget.
+    
+    Items are sorted by length and packed greedily, so each batch pads to the
+    length of its own longest item instead of the longest item overall.
+    
+    Args:
+        lengths: Token length of each item
+        max_tokens: Budget for (longest item in batch) * (items in batch)
+        max_items: Maximum items per batch
+        
+    Returns:
+        List of batches, each a list of positions into `lengths`
+    """
+    order = np.argsort(np.asarray(lengths, dtype=np.int64), kind="stable")
+    
+    batches = []
+    current = []
+    
+    for position in order:
+        length = max(int(lengths[position]), 1)
+        
+        # Sorted ascending, so this item is the longest in the batch once added
+        if current and (len(current) >= max_items or length * (len(current) + 1) > max_tokens):
+            batches.append(current)
+            current = []
+        
+        current.append(int(position))
+    
+    if current:
+        batches.append(current)
+    
+    return batches
+
+
+def build_embedding_matrix(chunk_embeddings: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Stack chunk embeddings into one contiguous, L2-normalized float32 matrix.
+    
+    Chunks without an embedding are skipped.
+    
+    Args:
+        chunk_embeddings: List of chunks with embeddings
+        
+    Returns:
+        Array of shape (chunks with embeddings, embedding_dim)
+    """
+    vectors = [chunk['embedding'] for chunk in chunk_embeddings if 'embedding' in chunk]
+    if not vectors:
+        return np.empty((0, 0), dtype=np.float32)
+    
+    matrix = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+    matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+    return matrix
+
+
+def top_k_similar(query_embeddings: np.ndarray, 
+                  embedding_matrix: np.ndarray, 
+                  top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Select the top-k rows of a normalized matrix by cosine similarity.
+    
+    Args:
+        query_embeddings: Array of shape (num_queries, embedding_dim)
+        embedding_matrix: Normalized matrix from build_embedding_matrix
+        top_k: Number of rows to select per query
+        
+    Returns:
+        Tuple of (indices, scores), each of shape (num_queries, min(top_k, rows)),
+        ordered by descending similarity
+    """
+    queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+    rows = embedding_matrix.shape[0]
+    k = min(top_k, rows)
+    
+    if k <= 0:
+        empty = np.empty((queries.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    
+    queries = queries / np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+    scores = queries @ embedding_matrix.T
+    
+    # Partial selection of the k best, then sort only those k
+    if k < rows:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(rows), (queries.shape[0], rows))
+    
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    
+    return (np.take_along_axis(candidates, order, axis=1),
+            np.take_along_axis(candidate_scores, order, axis=1))
+
+
 # Convenience functions for easy integration
+def _get_registry_generator(model_name: Optional[str], device: str) -> EmbeddingGenerator:
+    """Shared generator for a model, configured like the default one (same quantization and backend)."""
+    from .model_registry import get_model_registry
+    
+    if (model_name or settings.embedding_model) == settings.embedding_model and device == "cpu":
+        return get_default_embedding_generator()
+    return get_model_registry().get_generator(
+        model_name=model_name,
+        device=device,
+        use_quantization=settings.embedding_quantization,
+        backend=settings.embedding_backend
+    )
+
+
 def generate_embeddings_for_chunks(chunks: List[Dict[str, Any]], 
-                                  model_name: str = "all-MiniLM-L6-v2",
+                                  model_name: Optional[str] = None,
                                   device: str = "cpu",
                                   batch_size: int = 32) -> List[Dict[str, Any]]:
     """
@@ -445,32 +789,32 @@ def generate_embeddings_for_chunks(chunks: List[Dict[str, Any]],
     
     Args:
         chunks: List of chunk dictionaries
-        model_name: Sentence-transformer model name
+        model_name: Sentence-transformer model name (defaults to settings.embedding_model)
         device: Device to run on
         batch_size: Batch size for processing
         
     Returns:
         List of chunks with embeddings
     """
-    generator = EmbeddingGenerator(model_name=model_name, device=device)
+    generator = _get_registry_generator(model_name, device)
     return generator.generate_embeddings(chunks, batch_size=batch_size)
 
 
 def generate_query_embedding(query: str, 
-                           model_name: str = "all-MiniLM-L6-v2",
+                           model_name: Optional[str] = None,
                            device: str = "cpu") -> np.ndarray:
     """
     Generate embedding for a single query string.
     
     Args:
         query: Query text
-        model_name: Sentence-transformer model name
+        model_name: Sentence-transformer model name (defaults to settings.embedding_model)
         device: Device to run on
         
     Returns:
         Query embedding vector
     """
-    generator = EmbeddingGenerator(model_name=model_name, device=device)
+    generator = _get_registry_generator(model_name, device)
     
     # Create a temporary chunk for the query
     query_chunk = {
@@ -490,19 +834,14 @@ def generate_query_embedding(query: str,
         raise ValueError("Failed to generate query embedding")
 
 
-# Global embedding generator instance
-default_embedding_generator = None
-
 def get_default_embedding_generator() -> EmbeddingGenerator:
-    """Get the default embedding generator instance."""
-    global default_embedding_generator
-    
-    if default_embedding_generator is None:
-        default_embedding_generator = EmbeddingGenerator(
-            model_name=settings.embedding_model,
-            device="cpu",
-            use_quantization=False,
-            cache_dir=str(Path(settings.faiss_index_path) / "embeddings_cache")
-        )
+    """Get the default embedding generator instance from the model registry."""
+    from .model_registry import get_model_registry
     
-    return default_embedding_generator
+    return get_model_registry().get_generator(
+        model_name=settings.embedding_model,
+        device="cpu",
+        use_quantization=settings.embedding_quantization,
+        cache_dir=str(Path(settings.faiss_index_path) / "embeddings_cache"),
+        backend=settings.embedding_backend
+    )
@@ -2,6 +2,7 @@
 File processing utilities for different file types
 """
 import io
+import json
 import uuid
 from pathlib import Path
 from typing import List, Dict, Any, Optional
@@ -51,6 +52,10 @@ class FileProcessor:
             with open(file_path, "wb") as f:
                 f.write(content)
             
+            # Keep the original name for the chunk metadata
+            with open(self.upload_dir / f"{file_id}.json", "w", encoding="utf-8") as f:
+                json.dump({"file_id": file_id, "filename": file.filename}, f)
+            
             logger.info(
                 "File saved successfully",
                 file_id=file_id,
@@ -70,6 +75,23 @@ class FileProcessor:
             logger.error("Failed to save uploaded file", error=str(e))
             raise
     
+    def get_file_info(self, file_id: str) -> Dict[str, Any]:
+        """Get the upload record of a file (empty for files uploaded before records existed)"""
+        info_file = self.upload_dir / f"{file_id}.json"
+        if not info_file.exists():
+            return {}
+        
+        try:
+            with open(info_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning("Failed to read upload record", file_id=file_id, error=str(e))
+            return {}
+    
+    def get_file_hash(self, file_path: str) -> str:
+        """Content hash of a file, the same one FileChunker stores as `file_hash`"""
+        return self.chunker._generate_file_hash(Path(file_path))
+    
     def extract_text_from_pdf(self, file_path: str) -> str:
         """Extract text from PDF file"""
         try:
@@ -190,5 +212,47 @@ class FileProcessor:
             raise
 
 
+class StreamingTextChunker:
+    """
+    Fixed-width chunking of text that arrives piece by piece.
+    
+    Produces the same chunks as `FileProcessor.chunk_text` on the joined and
+    stripped text, but only keeps the text not yet chunked in memory.
+    """
+    
+    def __init__(self, chunk_size: int = None, chunk_overlap: int = None):
+        self.chunk_size = chunk_size or settings.chunk_size
+        self.chunk_overlap = settings.chunk_overlap if chunk_overlap is None else chunk_overlap
+        if self.chunk_overlap >= self.chunk_size:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+        self._buffer = ""
+        self._started = False
+    
+    def feed(self, text: str) -> List[str]:
+        """Add text and return the chunks that are complete"""
+        if not self._started:
+            # Leading whitespace of the whole text is stripped
+            text = text.lstrip()
+            self._started = bool(text)
+        self._buffer += text
+        
+        chunks = []
+        # A chunk is final once non-whitespace text follows it (trailing whitespace is stripped)
+        while len(self._buffer.rstrip()) > self.chunk_size:
+            chunks.append(self._buffer[:self.chunk_size])
+            self._buffer = self._buffer[self.chunk_size - self.chunk_overlap:]
+        return chunks
+    
+    def finish(self) -> List[str]:
+        """Return the remaining chunks at the end of the text"""
+        text, self._buffer = self._buffer.rstrip(), ""
+        chunks = []
+        start = 0
+        while start < len(text):
+            chunks.append(text[start:start + self.chunk_size])
+            start += self.chunk_size - self.chunk_overlap
+        return chunks
+
+
 # Global file processor instance
 file_processor = FileProcessor()
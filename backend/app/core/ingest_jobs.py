@@ -0,0 +1,396 @@
+"""
+Ingestion Job Queue for PrivAI
+Runs ingestion requests in the background with per-stage progress, persisted across restarts
+"""
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import settings
+from .logging import get_logger
+from .segment_log import write_file_atomic
+
+logger = get_logger("ingest_jobs")
+
+# Progress counters, in pipeline order: documents are parsed, chunks are chunked, embedded and indexed
+STAGES = ("parsed", "chunked", "embedded", "indexed")
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+# Seconds between progress writes to the job file (status changes are always written)
+SAVE_INTERVAL = 1.0
+
+
+class IngestCancelled(Exception):
+    """Raised inside a job at its next checkpoint once it was cancelled."""
+
+
+class IngestInterrupted(Exception):
+    """Raised inside a job at its next checkpoint when the queue shuts down; the job resumes on restart."""
+
+
+class IngestJob:
+    """
+    State of one ingestion request.
+
+    The runner reports progress with `set_total` and `advance`, and calls
+    `checkpoint` between units of work (e.g. documents) so cancellation and
+    shutdown take effect there. Every change is persisted to the job file.
+    """
+
+    def __init__(self, job_id: str, request: Dict[str, Any], path: Path, restart_error: Optional[str] = None):
+        """
+        Initialize a queued job.
+
+        Args:
+            job_id: Job identifier
+            request: Ingestion request parameters
+            path: JSON file the job is persisted to
+            restart_error: If set, the job is not resumed after a restart but
+                fails with this error (e.g. it needs state that does not survive one)
+        """
+        self.job_id = job_id
+        self.request = request
+        self.path = path
+        self.restart_error = restart_error
+        self.status = QUEUED
+        self.stage: Optional[str] = None
+        self.progress: Dict[str, int] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._shutdown: Optional[threading.Event] = None
+        self._saved_at = 0.0
+        self._reset_progress()
+
+    @classmethod
+    def load(cls, path: Path) -> "IngestJob":
+        """Load a job from its file."""
+        data = json.loads(path.read_text(encoding="utf-8"))
+        job = cls(data["job_id"], data["request"], path, data.get("restart_error"))
+        for key in ("status", "stage", "progress", "result", "error", "created_at", "started_at", "finished_at"):
+            setattr(job, key, data.get(key, getattr(job, key)))
+        return job
+
+    def _reset_progress(self) -> None:
+        self.stage = None
+        self.progress = {"documents": 0, "skipped": 0}
+        self.progress.update({stage: 0 for stage in STAGES})
+
+    def set_total(self, documents: int) -> None:
+        """Set the number of source documents the job will go through."""
+        with self._lock:
+            self.progress["documents"] = documents
+        self.save(force=True)
+
+    def advance(self, stage: str, count: int = 1) -> None:
+        """
+        Record progress in a stage.
+
+        Args:
+            stage: One of `STAGES`, or "skipped" for unchanged documents
+            count: Documents ("parsed", "skipped") or chunks (other stages) completed
+        """
+        with self._lock:
+            self.progress[stage] = self.progress.get(stage, 0) + count
+            if stage in STAGES:
+                self.stage = stage
+        self.save()
+
+    def checkpoint(self) -> None:
+        """Stop the job here if it was cancelled or the queue is shutting down."""
+        if self._cancel.is_set():
+            raise IngestCancelled(f"Job {self.job_id} was cancelled")
+        if self._shutdown is not None and self._shutdown.is_set():
+            raise IngestInterrupted(f"Job {self.job_id} was interrupted by shutdown")
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Job state as a JSON-serializable dictionary."""
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": dict(self.progress),
+                "result": self.result,
+                "error": self.error,
+                "request": self.request,
+                "restart_error": self.restart_error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at
+            }
+
+    def save(self, force: bool = False) -> None:
+        """Write the job file (progress-only updates at most every `SAVE_INTERVAL` seconds)."""
+        now = time.monotonic()
+        if not force and now - self._saved_at < SAVE_INTERVAL:
+            return
+        self._saved_at = now
+
+        try:
+            write_file_atomic(self.path, json.dumps(self.to_dict(), default=str).encode("utf-8"))
+        except Exception as e:
+            logger.warning("Failed to persist ingestion job", job_id=self.job_id, error=str(e))
+
+
+class IngestJobQueue:
+    """
+    Bounded pool of worker threads running ingestion jobs.
+
+    Jobs are persisted as JSON files under `jobs_dir`. On `start`, jobs that
+    were queued or running when the process stopped are queued again; the
+    runner skips documents that were already indexed (their content hash
+    matches), so a resumed job continues where it left off. Jobs submitted
+    with a `restart_error` fail with it instead.
+    """
+
+    def __init__(self,
+                 runner: Callable[[IngestJob], Dict[str, Any]],
+                 jobs_dir: Optional[str] = None,
+                 max_workers: Optional[int] = None,
+                 max_finished: Optional[int] = None):
+        """
+        Initialize the queue (workers start on the first job).
+
+        Args:
+            runner: Function running a job and returning its result
+            jobs_dir: Directory holding the job files
+            max_workers: Jobs running at the same time
+            max_finished: Finished jobs kept (oldest are deleted first)
+        """
+        self.runner = runner
+        self.jobs_dir = Path(jobs_dir or settings.ingest_jobs_dir)
+        self.max_workers = max(1, max_workers or settings.ingest_workers)
+        self.max_finished = settings.ingest_jobs_keep if max_finished is None else max_finished
+
+        self._jobs: Dict[str, IngestJob] = {}
+        self._futures: Dict[str, Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._shutdown = threading.Event()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Start the worker threads on first use (caller holds the lock)."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ingest-job")
+        return self._executor
+
+    def start(self) -> int:
+        """
+        Load persisted jobs and resume the unfinished ones, except those that
+        cannot be resumed, which fail with their `restart_error`.
+
+        Returns:
+            Number of jobs resumed
+        """
+        with self._lock:
+            if self._started:
+                return 0
+            self._started = True
+            self._shutdown.clear()
+            self.jobs_dir.mkdir(parents=True, exist_ok=True)
+
+            resumed = []
+            for path in sorted(self.jobs_dir.glob("*.json")):
+                try:
+                    job = IngestJob.load(path)
+                except Exception as e:
+                    logger.warning("Unreadable ingestion job file", path=str(path), error=str(e))
+                    continue
+                self._jobs.setdefault(job.job_id, job)
+                if job.finished:
+                    continue
+                if job.restart_error:
+                    job.status = FAILED
+                    job.error = job.restart_error
+                    job.finished_at = datetime.now().isoformat()
+                    job.save(force=True)
+                    logger.warning("Ingestion job not resumable after restart",
+                                   job_id=job.job_id, error=job.error)
+                else:
+                    resumed.append(job)
+
+            for job in sorted(resumed, key=lambda job: job.created_at):
+                job.status = QUEUED
+                job.save(force=True)
+                self._submit(job)
+
+        self._prune()
+        logger.info("Ingestion job queue started",
+                   jobs=len(self._jobs),
+                   resumed=len(resumed),
+                   max_workers=self.max_workers)
+        return len(resumed)
+
+    def submit(self, request: Dict[str, Any], restart_error: Optional[str] = None) -> IngestJob:
+        """
+        Queue an ingestion request.
+
+        Args:
+            request: Ingestion request parameters, passed to the runner
+            restart_error: Error the job fails with if it is unfinished at a
+                restart, instead of being resumed
+
+        Returns:
+            The queued job
+        """
+        job_id = uuid.uuid4().hex
+        job = IngestJob(job_id, request, self.jobs_dir / f"{job_id}.json", restart_error)
+
+        with self._lock:
+            self.jobs_dir.mkdir(parents=True, exist_ok=True)
+            job.save(force=True)
+            self._jobs[job_id] = job
+            self._submit(job)
+
+        logger.info("Ingestion job queued", job_id=job_id, source_type=request.get("source_type"))
+        return job
+
+    def _submit(self, job: IngestJob) -> None:
+        """Hand a job to the worker pool (caller holds the lock)."""
+        job._shutdown = self._shutdown
+        self._futures[job.job_id] = self._get_executor().submit(self._run, job)
+
+    def _run(self, job: IngestJob) -> None:
+        """Run a job on a worker thread and record its outcome."""
+        try:
+            job.checkpoint()
+            with job._lock:
+                job.status = RUNNING
+                job.started_at = datetime.now().isoformat()
+                job.error = None
+                job._reset_progress()
+            job.save(force=True)
+            logger.info("Ingestion job started", job_id=job.job_id)
+
+            result = self.runner(job)
+
+            with job._lock:
+                job.status = COMPLETED
+                job.result = result
+
+        except IngestInterrupted:
+            # Left unfinished on disk, so the next start resumes it
+            with job._lock:
+                job.status = QUEUED
+            job.save(force=True)
+            logger.info("Ingestion job interrupted, will resume on restart", job_id=job.job_id)
+            return
+
+        except IngestCancelled:
+            with job._lock:
+                job.status = CANCELLED
+
+        except Exception as e:
+            logger.error("Ingestion job failed", job_id=job.job_id, error=str(e))
+            with job._lock:
+                job.status = FAILED
+                job.error = str(e)
+
+        finally:
+            with self._lock:
+                self._futures.pop(job.job_id, None)
+
+        with job._lock:
+            job.finished_at = datetime.now().isoformat()
+        job.save(force=True)
+        logger.info("Ingestion job finished", job_id=job.job_id, status=job.status, progress=job.progress)
+        self._prune()
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        """Job by id, or None."""
+        return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[IngestJob]:
+        """All known jobs, newest first."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> Optional[IngestJob]:
+        """
+        Cancel a job.
+
+        Queued jobs are cancelled at once. Running jobs stop at their next
+        checkpoint.
+
+        Args:
+            job_id: Job identifier
+
+        Returns:
+            The job, or None if unknown
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+
+        job._cancel.set()
+        with self._lock:
+            future = self._futures.get(job_id)
+            if future is not None and future.cancel():
+                self._futures.pop(job_id, None)
+                with job._lock:
+                    job.status = CANCELLED
+                    job.finished_at = datetime.now().isoformat()
+                job.save(force=True)
+
+        logger.info("Ingestion job cancellation requested", job_id=job_id, status=job.status)
+        return job
+
+    def _prune(self) -> None:
+        """Delete the oldest finished jobs beyond `max_finished`."""
+        with self._lock:
+            finished = sorted((job for job in self._jobs.values() if job.finished),
+                              key=lambda job: job.finished_at or job.created_at)
+            for job in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[job.job_id]
+                job.path.unlink(missing_ok=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get job counts by status.
+
+        Returns:
+            Dictionary with the number of jobs in each status and the pool size
+        """
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts: Dict[str, int] = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"max_workers": self.max_workers, "jobs": counts}
+
+    def close(self) -> None:
+        """Stop the workers; running jobs stop at their next checkpoint and resume on restart."""
+        self._shutdown.set()
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._started = False
+
+        if executor is not None:
+            # Queued jobs stay queued on disk
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        logger.info("Ingestion job queue closed")
@@ -0,0 +1,263 @@
+"""
+Streaming Ingestion Pipeline for PrivAI
+Overlaps parsing, chunking, embedding and indexing with bounded buffers between stages
+"""
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .config import settings
+from .file_processor import StreamingTextChunker
+from .logging import get_logger
+
+logger = get_logger("ingest_pipeline")
+
+# Marks the end of a stage's output in its queue
+_DONE = object()
+
+
+class _StageFailure:
+    """An exception raised in a stage thread, re-raised by the consumer."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def run_stages(source: Iterable,
+               stages: List[Callable[[Iterable], Iterable]],
+               buffer_size: int) -> Iterator:
+    """
+    Chain generator stages, each running on its own thread.
+
+    Every stage consumes the previous stage's output through a queue holding
+    at most `buffer_size` items, so a slow stage blocks the ones before it
+    instead of letting their output pile up. The first stage reads `source`.
+    An exception in any stage is re-raised to the consumer; when the consumer
+    stops early, the stage threads stop too.
+
+    Args:
+        source: Input of the first stage (consumed on the first stage's thread)
+        stages: Functions turning an iterable of items into an iterable of items
+        buffer_size: Items buffered between two stages
+
+    Yields:
+        Output items of the last stage
+    """
+    stop = threading.Event()
+    threads = []
+
+    def put(output: queue.Queue, item) -> bool:
+        # Time out now and then to notice that the consumer is gone
+        while not stop.is_set():
+            try:
+                output.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def drain(input_queue: queue.Queue) -> Iterator:
+        while not stop.is_set():
+            try:
+                item = input_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, _StageFailure):
+                raise item.error
+            yield item
+
+    def run(stage, items, output):
+        try:
+            for item in stage(items):
+                if not put(output, item):
+                    return
+            put(output, _DONE)
+        except BaseException as e:
+            put(output, _StageFailure(e))
+
+    items: Iterable = source
+    for stage in stages:
+        output = queue.Queue(maxsize=max(1, buffer_size))
+        thread = threading.Thread(target=run, args=(stage, items, output),
+                                  name=f"ingest-{getattr(stage, '__name__', 'stage')}", daemon=True)
+        threads.append(thread)
+        items = drain(output)
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        yield from items
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+class IngestPipeline:
+    """
+    Streams source documents into the vector store.
+
+    Each source is a dictionary with a `document_id`, a `content_hash`, the
+    base chunk `metadata`, and either a `pages` callable returning the
+    document's text piece by piece or a `chunks` callable returning lists of
+    ready chunk dictionaries (e.g. `FileChunker.iter_chunks`); sources with
+    `unchanged: True` are skipped. Stages run concurrently:
+
+    1. parse: reads pages from each source
+    2. chunk: cuts text pages into fixed-width chunks as they arrive, and adds
+       the base metadata to ready chunks
+    3. embed: encodes chunks in batches of `batch_size`
+    4. index: appends each batch to the vector store (on the calling thread)
+
+    A document is committed, replacing its previous version, once its last
+    batch is indexed. Memory holds at most `buffer_size` items per stage, not
+    the upload.
+    """
+
+    def __init__(self,
+                 vector_store,
+                 chunk_size: Optional[int] = None,
+                 chunk_overlap: Optional[int] = None,
+                 batch_size: Optional[int] = None,
+                 buffer_size: Optional[int] = None):
+        """
+        Initialize the pipeline.
+
+        Args:
+            vector_store: VectorStore receiving the chunks
+            chunk_size: Characters per chunk
+            chunk_overlap: Characters shared by consecutive chunks
+            batch_size: Chunks per embedding batch and index append
+            buffer_size: Items buffered between two stages
+        """
+        self.vector_store = vector_store
+        self.chunk_size = chunk_size or settings.chunk_size
+        self.chunk_overlap = settings.chunk_overlap if chunk_overlap is None else chunk_overlap
+        self.batch_size = max(1, batch_size or settings.ingest_batch_chunks)
+        self.buffer_size = buffer_size or settings.ingest_pipeline_buffer
+
+    def run(self,
+            sources: Iterable[Dict[str, Any]],
+            on_progress: Optional[Callable[[str, int], None]] = None,
+            checkpoint: Optional[Callable[[], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Ingest source documents.
+
+        Args:
+            sources: Source documents, consumed lazily on the parse thread
+            on_progress: Optional callback receiving (stage, count) as work completes
+            checkpoint: Optional callable run before each index append, raising to stop
+
+        Returns:
+            One result per source, with its status ("added", "replaced" or "unchanged") and chunk counts
+        """
+        progress = on_progress or (lambda stage, count: None)
+        results = []
+        appended: Dict[str, List[int]] = {}
+
+        def parse(items):
+            return self._parse(items, progress)
+
+        def chunk(items):
+            return self._chunk(items, progress)
+
+        def embed(items):
+            return self._embed(items, progress)
+
+        try:
+            for source, batch in run_stages(sources, [parse, chunk, embed], self.buffer_size):
+                if checkpoint is not None:
+                    checkpoint()
+
+                document_id = source["document_id"]
+                if batch is None:
+                    results.append(self._finish(source, appended.pop(document_id, None)))
+                    continue
+
+                chunks, embeddings = batch
+                chunk_ids = self.vector_store.append_document_chunks(document_id, source["content_hash"],
+                                                                     chunks, embeddings)
+                appended.setdefault(document_id, []).extend(chunk_ids)
+                progress("indexed", len(chunk_ids))
+
+        finally:
+            # Staged chunks of documents that did not finish would otherwise stay until the next start
+            for document_id, chunk_ids in appended.items():
+                logger.warning("Removing chunks of unfinished document", document_id=document_id,
+                               chunks=len(chunk_ids))
+                self.vector_store.abort_document(chunk_ids)
+
+        return results
+
+    def _finish(self, source: Dict[str, Any], chunk_ids: Optional[List[int]]) -> Dict[str, Any]:
+        """Commit a document whose last batch was indexed."""
+        if source.get("unchanged"):
+            return {"document_id": source["document_id"], "status": "unchanged",
+                    "chunks_added": 0, "chunks_removed": 0}
+        return self.vector_store.commit_document(source["document_id"], source["content_hash"], chunk_ids or [])
+
+    def _parse(self, sources: Iterable[Dict[str, Any]], progress) -> Iterator[Tuple[Dict[str, Any], Any]]:
+        """Yield (source, page) for each page (text or chunk list), then (source, None)."""
+        for source in sources:
+            if source.get("unchanged"):
+                progress("skipped", 1)
+            else:
+                pages = source["chunks"]() if "chunks" in source else source["pages"]()
+                for page in pages:
+                    yield source, page
+                progress("parsed", 1)
+            yield source, None
+
+    def _chunk(self, items: Iterable[Tuple[Dict[str, Any], Any]], progress) -> Iterator[Tuple[Dict[str, Any], Any]]:
+        """Yield (source, chunks) as pages fill chunks, then (source, None)."""
+        chunker = None
+        chunk_index = 0
+
+        for source, page in items:
+            if "chunks" in source:
+                # Chunked by the source; its metadata wins over the chunk's own
+                chunks = [{"text": chunk["text"], "metadata": dict(chunk["metadata"], **source["metadata"])}
+                          for chunk in page or []]
+            else:
+                if chunker is None:
+                    chunker = StreamingTextChunker(self.chunk_size, self.chunk_overlap)
+                    chunk_index = 0
+
+                chunks = []
+                for text in chunker.feed(page) if page is not None else chunker.finish():
+                    metadata = dict(source["metadata"], chunk_index=chunk_index)
+                    chunks.append({"text": text, "metadata": metadata})
+                    chunk_index += 1
+
+            if chunks:
+                progress("chunked", len(chunks))
+                yield source, chunks
+
+            if page is None:
+                chunker = None
+                yield source, None
+
+    def _embed(self, items: Iterable[Tuple[Dict[str, Any], Any]], progress) -> Iterator[Tuple[Dict[str, Any], Any]]:
+        """Yield (source, (chunks, embeddings)) per batch, then (source, None); batches never span documents."""
+        pending: List[Dict[str, Any]] = []
+
+        def encode(source, batch):
+            chunks, embeddings = self.vector_store.embed_documents(batch)
+            progress("embedded", len(chunks))
+            return source, (chunks, embeddings)
+
+        for source, chunks in items:
+            if chunks is None:
+                if pending:
+                    yield encode(source, pending)
+                    pending = []
+                yield source, None
+                continue
+
+            pending.extend(chunks)
+            while len(pending) >= self.batch_size:
+                yield encode(source, pending[:self.batch_size])
+                pending = pending[self.batch_size:]
@@ -0,0 +1,176 @@
+"""
+IVF Index Tuning for PrivAI
+List count, probe and PQ sizing, training samples and centroid drift tracking
+"""
+import math
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+from .config import settings
+
+# k-means needs this many training points per centroid (FAISS warns below it)
+MIN_POINTS_PER_LIST = 39
+
+# Share of the training sample size that must be added before drift is judged
+DRIFT_MIN_FRACTION = 0.1
+
+# Bits per PQ sub-quantizer code, i.e. 256 centroids per sub-quantizer
+PQ_NBITS = 8
+
+# Vectors needed to train the PQ codebooks with enough points per centroid
+PQ_MIN_TRAINING_VECTORS = MIN_POINTS_PER_LIST << PQ_NBITS
+
+
+def choose_nlist(num_vectors: int) -> int:
+    """
+    Number of IVF lists for a corpus: 4·√N, limited so the training sample
+    has enough points per list. `VECTOR_IVF_NLIST` overrides the heuristic.
+
+    Args:
+        num_vectors: Number of vectors in the corpus
+
+    Returns:
+        Number of inverted lists
+    """
+    if settings.vector_ivf_nlist:
+        return settings.vector_ivf_nlist
+
+    trainable = min(num_vectors, settings.vector_ivf_train_sample) // MIN_POINTS_PER_LIST
+    return max(1, min(int(4 * math.sqrt(num_vectors)), trainable))
+
+
+def choose_nprobe(nlist: int) -> int:
+    """
+    Number of lists searched per query: `VECTOR_IVF_NPROBE`, or nlist / 16.
+
+    Args:
+        nlist: Number of inverted lists
+
+    Returns:
+        Default nprobe for the index
+    """
+    nprobe = settings.vector_ivf_nprobe or math.ceil(nlist / 16)
+    return max(1, min(nprobe, nlist))
+
+
+def choose_pq_m(embedding_dim: int) -> int:
+    """
+    Number of PQ sub-quantizers, i.e. bytes per vector code: `VECTOR_IVFPQ_M`,
+    or one per 4 dimensions, lowered until it divides the dimension.
+
+    Args:
+        embedding_dim: Embedding dimension
+
+    Returns:
+        Number of sub-quantizers
+    """
+    m = min(settings.vector_ivfpq_m or embedding_dim // 4, embedding_dim)
+    m = max(1, m)
+    # Vectors are split into m equal sub-vectors
+    while embedding_dim % m:
+        m -= 1
+    return m
+
+
+def uniform_training_sample(vector_ids: np.ndarray, seed: Optional[int] = None) -> np.ndarray:
+    """
+    Draw a uniform sample of vector ids to train k-means on.
+
+    This is not a streaming reservoir: the ids are sampled without
+    replacement from the complete list of live vectors when an index is
+    (re)built, which reads every live vector anyway and leaves deleted
+    chunks out.
+
+    Args:
+        vector_ids: Ids of all live vectors
+        seed: Random seed
+
+    Returns:
+        Up to `VECTOR_IVF_TRAIN_SAMPLE` ids, ascending
+    """
+    size = settings.vector_ivf_train_sample
+    if len(vector_ids) <= size:
+        return vector_ids
+    rng = np.random.default_rng(seed)
+    return np.sort(rng.choice(vector_ids, size=size, replace=False))
+
+
+class CentroidDrift:
+    """
+    Tracks how well the IVF centroids fit the vectors added after training.
+
+    The mean squared distance from training vectors to their nearest centroid
+    is the baseline. When vectors added later sit much further from their
+    centroids, the data has moved away from what the lists were trained on,
+    and lists get unbalanced and slow or miss neighbours.
+    """
+
+    def __init__(self, centroids: np.ndarray, baseline: float, added: int = 0, added_error: float = 0.0):
+        """
+        Initialize the tracker.
+
+        Args:
+            centroids: IVF centroids, one row per list
+            baseline: Mean squared distance of the training sample to its centroids
+            added: Vectors observed since training
+            added_error: Sum of their squared distances to the nearest centroid
+        """
+        self.centroids = faiss.IndexFlatL2(centroids.shape[1])
+        self.centroids.add(np.ascontiguousarray(centroids, dtype=np.float32))
+        self.baseline = baseline
+        self.added = added
+        self.added_error = added_error
+
+    @classmethod
+    def from_index(cls, index, state: Optional[Dict[str, Any]] = None) -> "CentroidDrift":
+        """
+        Build the tracker for a trained IVF index.
+
+        Args:
+            index: Trained IVF index
+            state: Saved `get_state()` of the tracker, if any
+
+        Returns:
+            CentroidDrift for the index's centroids
+        """
+        centroids = index.quantizer.reconstruct_n(0, index.nlist)
+        state = state or {}
+        return cls(centroids,
+                   baseline=state.get('baseline', 0.0),
+                   added=state.get('added', 0),
+                   added_error=state.get('added_error', 0.0))
+
+    def error(self, vectors: np.ndarray) -> float:
+        """Mean squared distance from vectors to their nearest centroid."""
+        if not len(vectors):
+            return 0.0
+        distances, _ = self.centroids.search(np.ascontiguousarray(vectors, dtype=np.float32), 1)
+        return float(distances.mean())
+
+    def observe(self, vectors: np.ndarray) -> None:
+        """Record vectors added to the index."""
+        if len(vectors):
+            self.added += len(vectors)
+            self.added_error += self.error(vectors) * len(vectors)
+
+    def ratio(self) -> float:
+        """How much further new vectors are from their centroids than the training vectors (1.0 = same)."""
+        if not self.added or self.baseline <= 0:
+            return 1.0
+        return (self.added_error / self.added) / self.baseline
+
+    def has_drifted(self) -> bool:
+        """Whether enough vectors were added, far enough from the centroids, to retrain."""
+        min_added = max(1, int(settings.vector_ivf_train_sample * DRIFT_MIN_FRACTION))
+        return self.added >= min_added and self.ratio() >= settings.vector_ivf_drift_ratio
+
+    def get_state(self) -> Dict[str, Any]:
+        """Baseline and running error, for saving with the snapshot."""
+        return {'baseline': self.baseline, 'added': self.added, 'added_error': self.added_error}
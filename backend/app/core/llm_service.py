@@ -147,6 +147,7 @@ Answer:"""
             sources = []
             for chunk in context_chunks:
                 source = {
+                    "chunk_id": chunk.get("chunk_id"),
                     "text": chunk["text"][:200] + "..." if len(chunk["text"]) > 200 else chunk["text"],
                     "score": chunk.get("score", 0.0),
                     "metadata": chunk.get("metadata", {})
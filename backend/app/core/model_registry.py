@@ -0,0 +1,249 @@
+"""
+Embedding Model Registry for PrivAI
+Keeps one shared EmbeddingGenerator per (model_name, device, quantization, backend) per process
+"""
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+from .config import settings
+from .logging import get_logger
+from .embeddings import EmbeddingGenerator
+from .query_batcher import close_query_batcher
+from .query_cache import get_query_cache, model_signature
+
+logger = get_logger("model_registry")
+
+RegistryKey = Tuple[str, str, bool, str]
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of loaded embedding models.
+    Hands out shared, thread-safe EmbeddingGenerator instances so that a model
+    is loaded at most once per process, with explicit preload/unload and
+    memory accounting.
+    """
+
+    def __init__(self, default_cache_dir: Optional[str] = None):
+        """
+        Initialize the model registry.
+
+        Args:
+            default_cache_dir: Root of the embedding caches of new generators
+        """
+        self.default_cache_dir = (
+            Path(default_cache_dir) if default_cache_dir
+            else Path(settings.faiss_index_path) / "embeddings_cache"
+        )
+        self._generators: Dict[RegistryKey, EmbeddingGenerator] = {}
+        self._key_locks: Dict[RegistryKey, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _make_key(self, model_name: Optional[str], device: str,
+                  use_quantization: bool, backend: str) -> RegistryKey:
+        """Build the registry key for a model configuration."""
+        return (model_name or settings.embedding_model, device, bool(use_quantization), backend)
+
+    @staticmethod
+    def _cache_subdir(key: RegistryKey) -> str:
+        """Cache directory name of a model configuration (its vectors differ from other configurations')."""
+        model_name, device, use_quantization, backend = key
+        name = f"{model_name}-{device}-{backend}" + ("-int8" if use_quantization else "")
+        return re.sub(r"[^\w.-]", "_", name)
+
+    def _get_key_lock(self, key: RegistryKey) -> threading.Lock:
+        """Get the per-key lock that serializes loading of one model."""
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def get_generator(self,
+                      model_name: Optional[str] = None,
+                      device: str = "cpu",
+                      use_quantization: bool = False,
+                      cache_dir: Optional[str] = None,
+                      backend: str = "torch") -> EmbeddingGenerator:
+        """
+        Get the shared generator for a model configuration, loading it on first use.
+
+        Args:
+            model_name: Sentence-transformer model name (defaults to settings.embedding_model)
+            device: Device to run on
+            use_quantization: Whether the model is quantized
+            cache_dir: Root of the embedding cache, only used when the model is first loaded;
+                each model configuration gets its own subdirectory
+            backend: Inference backend ('torch' or 'onnx')
+
+        Returns:
+            Shared EmbeddingGenerator instance
+        """
+        key = self._make_key(model_name, device, use_quantization, backend)
+
+        generator = self._generators.get(key)
+        if generator is not None:
+            return generator
+
+        # Only one thread loads a given model; others wait for it instead of loading a copy
+        with self._get_key_lock(key):
+            generator = self._generators.get(key)
+            if generator is not None:
+                return generator
+
+            logger.info("Loading embedding model into registry",
+                       model_name=key[0],
+                       device=key[1],
+                       use_quantization=key[2],
+                       backend=key[3])
+
+            generator = EmbeddingGenerator(
+                model_name=key[0],
+                device=key[1],
+                use_quantization=key[2],
+                cache_dir=str(Path(cache_dir or self.default_cache_dir) / self._cache_subdir(key)),
+                backend=key[3]
+            )
+
+            with self._lock:
+                self._generators[key] = generator
+
+        return generator
+
+    def preload(self,
+                model_name: Optional[str] = None,
+                device: str = "cpu",
+                use_quantization: bool = False,
+                cache_dir: Optional[str] = None,
+                backend: str = "torch") -> EmbeddingGenerator:
+        """
+        Load a model ahead of the first request (e.g. at application startup).
+
+        Args:
+            model_name: Sentence-transformer model name
+            device: Device to run on
+            use_quantization: Whether the model is quantized
+            cache_dir: Root of the embedding cache
+            backend: Inference backend ('torch' or 'onnx')
+
+        Returns:
+            Shared EmbeddingGenerator instance
+        """
+        generator = self.get_generator(model_name, device, use_quantization, cache_dir, backend)
+        logger.info("Embedding model preloaded",
+                   model_name=generator.model_name,
+                   memory_bytes=generator.get_memory_usage())
+        return generator
+
+    def unload(self,
+               model_name: Optional[str] = None,
+               device: str = "cpu",
+               use_quantization: bool = False,
+               backend: str = "torch") -> bool:
+        """
+        Drop a model from the registry so its memory can be reclaimed.
+
+        VectorStore and RAGPipeline resolve their generator through the
+        registry on each use, so their next query loads the model again
+        instead of hitting the closed generator.
+
+        Args:
+            model_name: Sentence-transformer model name
+            device: Device the model runs on
+            use_quantization: Whether the model is quantized
+            backend: Inference backend ('torch' or 'onnx')
+
+        Returns:
+            True if the model was loaded and has been unloaded, False otherwise
+        """
+        key = self._make_key(model_name, device, use_quantization, backend)
+
+        with self._get_key_lock(key):
+            with self._lock:
+                generator = self._generators.pop(key, None)
+
+        if generator is None:
+            return False
+
+        # Queries embedded with this model must not be served after a reload
+        close_query_batcher(generator)
+        get_query_cache().invalidate(model_signature(generator))
+
+        generator.close()
+        logger.info("Embedding model unloaded",
+                   model_name=key[0],
+                   device=key[1],
+                   use_quantization=key[2],
+                   backend=key[3])
+        return True
+
+    def unload_all(self) -> int:
+        """
+        Unload every registered model.
+
+        Returns:
+            Number of models unloaded
+        """
+        with self._lock:
+            keys = list(self._generators.keys())
+
+        return sum(1 for key in keys if self.unload(*key))
+
+    def is_loaded(self,
+                  model_name: Optional[str] = None,
+                  device: str = "cpu",
+                  use_quantization: bool = False,
+                  backend: str = "torch") -> bool:
+        """Check whether a model configuration is currently loaded."""
+        return self._make_key(model_name, device, use_quantization, backend) in self._generators
+
+    def get_memory_usage(self) -> Dict[str, Any]:
+        """
+        Get memory accounting for all loaded models.
+
+        Returns:
+            Dictionary with per-model and total parameter memory in bytes
+        """
+        with self._lock:
+            items = list(self._generators.items())
+
+        models = {}
+        for (model_name, device, use_quantization, backend), generator in items:
+            label = f"{model_name}@{device}/{backend}" + (":int8" if use_quantization else "")
+            models[label] = generator.get_memory_usage()
+
+        return {
+            "models": models,
+            "total_bytes": sum(models.values())
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about the registry.
+
+        Returns:
+            Dictionary with registry statistics
+        """
+        memory = self.get_memory_usage()
+        return {
+            "loaded_models": len(memory["models"]),
+            "default_cache_dir": str(self.default_cache_dir),
+            "memory": memory
+        }
+
+
+# Global model registry instance
+_model_registry = None
+_model_registry_lock = threading.Lock()
+
+def get_model_registry() -> ModelRegistry:
+    """Get the process-wide model registry instance."""
+    global _model_registry
+
+    if _model_registry is None:
+        with _model_registry_lock:
+            if _model_registry is None:
+                _model_registry = ModelRegistry()
+
+    return _model_registry
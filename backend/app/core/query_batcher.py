@@ -0,0 +1,284 @@
+"""
+Query Embedding Micro-Batcher for PrivAI
+Coalesces concurrent query embeddings into single forward passes
+"""
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+
+from .config import settings
+from .logging import get_logger
+from .query_cache import ModelSignature, QueryEmbeddingCache, get_query_cache, model_signature, normalize_query
+
+logger = get_logger("query_batcher")
+
+
+class QueryEmbeddingBatcher:
+    """
+    asyncio micro-batcher in front of an embedding generator.
+
+    Queries are collected for up to `max_wait_ms` (or until `max_batch_size`
+    queries are waiting) and encoded with one call. The batcher runs its own
+    event loop on a background thread, so it serves both async callers
+    (`await embed(...)`) and sync callers (`embed_sync(...)`) from the same batches.
+    """
+
+    def __init__(self,
+                 embedding_generator,
+                 max_wait_ms: Optional[float] = None,
+                 max_batch_size: Optional[int] = None,
+                 query_cache: Optional[QueryEmbeddingCache] = None):
+        """
+        Initialize the micro-batcher.
+
+        Args:
+            embedding_generator: EmbeddingGenerator used to encode batches
+            max_wait_ms: Maximum time the first query of a batch waits for company
+            max_batch_size: Maximum queries encoded in one call
+            query_cache: Query embedding cache consulted before batching (defaults to the shared cache)
+        """
+        self.embedding_generator = embedding_generator
+        self.query_cache = query_cache if query_cache is not None else get_query_cache()
+        self.signature = model_signature(embedding_generator)
+        self.max_wait = (settings.query_batch_max_wait_ms if max_wait_ms is None else max_wait_ms) / 1000.0
+        self.max_batch_size = max_batch_size or settings.query_batch_max_size
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._encoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-encoder")
+        self._start_lock = threading.Lock()
+
+        # Updated from the loop thread and from embed_many callers
+        self.stats = {"batches": 0, "queries": 0, "max_batch": 0}
+        self._stats_lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        """Start the batcher event loop thread on first use."""
+        if self._loop is not None:
+            return self._loop
+
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run_loop():
+                    asyncio.set_event_loop(loop)
+                    self._queue = asyncio.Queue()
+                    self._collector = loop.create_task(self._collect())
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                    # Let the collector observe its cancellation before the loop goes away
+                    try:
+                        loop.run_until_complete(self._collector)
+                    except asyncio.CancelledError:
+                        pass
+                    loop.close()
+
+                self._thread = threading.Thread(target=run_loop, name="query-batcher", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+
+                logger.info("Query batcher started",
+                           max_wait_ms=self.max_wait * 1000,
+                           max_batch_size=self.max_batch_size)
+
+        return self._loop
+
+    def submit(self, query: str) -> Future:
+        """
+        Queue a query for embedding.
+
+        Args:
+            query: Query text
+
+        Returns:
+            Future resolving to the query embedding when its batch completes
+        """
+        future: Future = Future()
+
+        cached = self.query_cache.get(self.signature, query)
+        if cached is not None:
+            future.set_result(cached)
+            return future
+
+        loop = self._ensure_started()
+        loop.call_soon_threadsafe(self._queue.put_nowait, (query, future))
+        return future
+
+    async def embed(self, query: str) -> np.ndarray:
+        """
+        Embed a query from async code.
+
+        Args:
+            query: Query text
+
+        Returns:
+            Query embedding vector
+        """
+        return await asyncio.wrap_future(self.submit(query))
+
+    def embed_sync(self, query: str, timeout: Optional[float] = None) -> np.ndarray:
+        """
+        Embed a query from sync code, blocking until its batch completes.
+
+        Args:
+            query: Query text
+            timeout: Optional timeout in seconds
+
+        Returns:
+            Query embedding vector
+        """
+        return self.submit(query).result(timeout=timeout)
+
+    def embed_many(self, queries: List[str]) -> np.ndarray:
+        """
+        Embed a list of queries (e.g. an evaluation set) in one forward pass.
+
+        Cached queries are skipped; the rest are encoded together on the
+        encoder thread, bypassing the micro-batching wait.
+
+        Args:
+            queries: Query texts
+
+        Returns:
+            Matrix of query embeddings, one row per query
+        """
+        embeddings: List[Optional[np.ndarray]] = [self.query_cache.get(self.signature, query) for query in queries]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+        if missing:
+            encoded = self._encoder.submit(self._encode, [queries[i] for i in missing]).result()
+            for i, embedding in zip(missing, encoded):
+                self.query_cache.put(self.signature, queries[i], embedding)
+                embeddings[i] = embedding
+
+            self._record_batch(len(missing))
+
+        if not embeddings:
+            return np.zeros((0, self.embedding_generator.embedding_dim), dtype=np.float32)
+        return np.vstack(embeddings).astype(np.float32, copy=False)
+
+    async def _collect(self) -> None:
+        """Form batches from the queue and encode them."""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch: List[Tuple[str, Future]] = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Skip requests whose callers already gave up
+            batch = [(query, future) for query, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                # Encode off the loop thread; queries arriving meanwhile form the next batch
+                embeddings = await loop.run_in_executor(self._encoder, self._encode, [q for q, _ in batch])
+                for (query, future), embedding in zip(batch, embeddings):
+                    self.query_cache.put(self.signature, query, embedding)
+                    future.set_result(embedding)
+            except Exception as e:
+                logger.error("Query batch encoding failed", batch_size=len(batch), error=str(e))
+                for _, future in batch:
+                    future.set_exception(e)
+
+            self._record_batch(len(batch))
+
+    def _record_batch(self, size: int) -> None:
+        """Count one encoded batch of `size` queries in the stats."""
+        with self._stats_lock:
+            self.stats["batches"] += 1
+            self.stats["queries"] += size
+            self.stats["max_batch"] = max(self.stats["max_batch"], size)
+
+    def _encode(self, queries: List[str]) -> List[np.ndarray]:
+        """Encode one batch of queries, embedding repeated queries once."""
+        unique = list(dict.fromkeys(normalize_query(query) for query in queries))
+        query_chunks = [{"text": query, "metadata": {"chunk_type": "query"}} for query in unique]
+        results = self.embedding_generator.generate_embeddings(
+            query_chunks,
+            batch_size=len(query_chunks),
+            use_cache=False
+        )
+        embeddings = {query: chunk["embedding"] for query, chunk in zip(unique, results)}
+        return [embeddings[normalize_query(query)] for query in queries]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get batching statistics.
+
+        Returns:
+            Dictionary with batch counts and average batch size
+        """
+        with self._stats_lock:
+            stats = dict(self.stats)
+        batches = stats["batches"]
+        return {
+            **stats,
+            "avg_batch_size": stats["queries"] / batches if batches else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_batch_size": self.max_batch_size,
+            "query_cache": self.query_cache.get_stats()
+        }
+
+    def close(self) -> None:
+        """Stop the batcher event loop."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._collector.cancel)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
+        self._encoder.shutdown(wait=False)
+
+
+# One batcher per embedding model; keyed by model signature rather than object
+# id, which Python reuses once a generator is garbage collected
+_batchers: Dict[ModelSignature, QueryEmbeddingBatcher] = {}
+_batchers_lock = threading.Lock()
+
+def get_query_batcher(embedding_generator=None) -> QueryEmbeddingBatcher:
+    """Get the shared micro-batcher for an embedding generator's model (default generator if None)."""
+    if embedding_generator is None:
+        from .embeddings import get_default_embedding_generator
+        embedding_generator = get_default_embedding_generator()
+
+    key = model_signature(embedding_generator)
+    with _batchers_lock:
+        if key not in _batchers:
+            _batchers[key] = QueryEmbeddingBatcher(embedding_generator)
+        return _batchers[key]
+
+
+def close_query_batcher(embedding_generator) -> None:
+    """Stop and forget the batcher of one embedding generator (e.g. when its model is unloaded)."""
+    with _batchers_lock:
+        batcher = _batchers.pop(model_signature(embedding_generator), None)
+
+    if batcher is not None:
+        batcher.close()
+
+
+def close_query_batchers() -> None:
+    """Stop all query batchers (application shutdown)."""
+    with _batchers_lock:
+        batchers = list(_batchers.values())
+        _batchers.clear()
+
+    for batcher in batchers:
+        batcher.close()
@@ -0,0 +1,176 @@
+"""
+Query Embedding Cache for PrivAI
+Bounded in-memory LRU + TTL cache of query embeddings
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import numpy as np
+
+from .config import settings
+from .logging import get_logger
+
+logger = get_logger("query_cache")
+
+ModelSignature = Tuple[str, str, bool]
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query string for cache lookup (trim and collapse whitespace)."""
+    return re.sub(r"\s+", " ", query).strip()
+
+
+def model_signature(embedding_generator) -> ModelSignature:
+    """Identify the model an embedding was produced with."""
+    return (
+        embedding_generator.model_name,
+        getattr(embedding_generator, "backend", "torch"),
+        bool(getattr(embedding_generator, "use_quantization", False))
+    )
+
+
+class QueryEmbeddingCache:
+    """
+    Thread-safe LRU cache mapping normalized query strings to embeddings.
+
+    Entries expire after `ttl_seconds`, and the least recently used entry is
+    dropped once `max_entries` is reached. Entries are keyed by model signature
+    as well as query, so a model change never serves stale vectors.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        """
+        Initialize the query embedding cache.
+
+        Args:
+            max_entries: Maximum number of cached queries
+            ttl_seconds: Time-to-live of an entry in seconds
+        """
+        self.max_entries = max_entries or settings.query_cache_max_entries
+        self.ttl_seconds = settings.query_cache_ttl_seconds if ttl_seconds is None else ttl_seconds
+
+        self._entries: "OrderedDict[Tuple[ModelSignature, str], Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, signature: ModelSignature, query: str) -> Optional[np.ndarray]:
+        """
+        Look up a query embedding.
+
+        Args:
+            signature: Model signature (see model_signature)
+            query: Query text
+
+        Returns:
+            Cached embedding, or None on a miss
+        """
+        key = (signature, normalize_query(query))
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[0] < now:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, signature: ModelSignature, query: str, embedding: np.ndarray) -> None:
+        """
+        Store a query embedding.
+
+        Args:
+            signature: Model signature (see model_signature)
+            query: Query text
+            embedding: Query embedding
+        """
+        key = (signature, normalize_query(query))
+        embedding = np.asarray(embedding, dtype=np.float32)
+        # Callers share the cached array, so keep it immutable
+        embedding.flags.writeable = False
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, embedding)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, signature: Optional[ModelSignature] = None) -> int:
+        """
+        Drop cached embeddings.
+
+        Args:
+            signature: Only drop entries of this model (all entries if None)
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            if signature is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                keys = [key for key in self._entries if key[0] == signature]
+                for key in keys:
+                    del self._entries[key]
+                removed = len(keys)
+
+        if removed:
+            logger.info("Query embedding cache invalidated",
+                       removed=removed,
+                       model=signature[0] if signature else "all")
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with size, hit rate and eviction counts
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Global query embedding cache instance
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+def get_query_cache() -> QueryEmbeddingCache:
+    """Get the process-wide query embedding cache."""
+    global _query_cache
+
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = QueryEmbeddingCache()
+
+    return _query_cache
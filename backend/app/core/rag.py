@@ -30,6 +30,7 @@ from .config import settings
 from .logging import get_logger
 from .embeddings import get_default_embedding_generator
 from .vector_db import get_default_vector_database
+from .query_batcher import get_query_batcher
 
 logger = get_logger("rag")
 
@@ -56,7 +57,8 @@ class RAGPipeline:
             openai_api_key: OpenAI API key for fallback
             cache_dir: Directory for caching responses
         """
-        self.embedding_generator = embedding_generator or get_default_embedding_generator()
+        # None: resolve the registry's default generator on each use
+        self._embedding_generator = embedding_generator
         self.vector_database = vector_database or get_default_vector_database()
         self.local_model_name = local_model_name
         self.openai_api_key = openai_api_key or settings.openai_api_key
@@ -76,6 +78,16 @@ class RAGPipeline:
                    openai_available=OPENAI_AVAILABLE,
                    cache_dir=str(self.cache_dir))
     
+    @property
+    def embedding_generator(self):
+        """Embedding generator, resolved from the model registry per use unless one was given."""
+        return self._embedding_generator or get_default_embedding_generator()
+    
+    @property
+    def query_batcher(self):
+        """Query micro-batcher of the current embedding generator."""
+        return get_query_batcher(self.embedding_generator)
+    
     def _initialize_llm(self) -> None:
         """Initialize local LLM and OpenAI client."""
         try:
@@ -225,19 +237,13 @@ Answer:"""
     def _generate_query_embedding(self, query: str) -> np.ndarray:
         """Generate embedding for the user query."""
         try:
-            # Create query chunk
-            query_chunk = {
-                "text": query,
-                "metadata": {"chunk_type": "query"}
-            }
-            
-            # Generate embedding
-            query_chunks = self.embedding_generator.generate_embeddings([query_chunk], use_cache=False)
+            # Concurrent queries share one forward pass through the micro-batcher
+            query_embedding = self.query_batcher.embed_sync(query)
             
-            if not query_chunks or 'embedding' not in query_chunks[0]:
+            if query_embedding is None:
                 raise ValueError("Failed to generate query embedding")
             
-            return query_chunks[0]['embedding']
+            return query_embedding
             
         except Exception as e:
             logger.error("Failed to generate query embedding", error=str(e))
@@ -252,6 +258,7 @@ Answer:"""
             chunks = []
             for result in results:
                 chunk = {
+                    "chunk_id": result["chunk_id"],
                     "text": result["text"],
                     "metadata": result["metadata"],
                     "similarity_score": result["similarity_score"],
@@ -381,6 +388,7 @@ Answer:"""
             sources = []
             for chunk in retrieved_chunks:
                 source = {
+                    "chunk_id": chunk["chunk_id"],
                     "text": chunk["text"][:200] + "..." if len(chunk["text"]) > 200 else chunk["text"],
                     "metadata": chunk["metadata"],
                     "similarity_score": chunk["similarity_score"],
@@ -459,6 +467,7 @@ Answer:"""
                 "local_model_name": self.local_model_name,
                 "cache_directory": str(self.cache_dir),
                 "embedding_generator": self.embedding_generator.get_embedding_stats(),
+                "query_batcher": self.query_batcher.get_stats(),
                 "vector_database": self.vector_database.get_stats()
             }
             
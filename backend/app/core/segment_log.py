@@ -0,0 +1,383 @@
+"""
+Append-only Segment Log for PrivAI
+Write-ahead log of vector database mutations with crash-safe snapshot files
+"""
+import json
+import os
+import pickle
+import re
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Iterator, Tuple
+
+from .logging import get_logger
+
+logger = get_logger("segment_log")
+
+SEGMENT_PATTERN = re.compile(r"^segment_(\d{10})\.seg$")
+
+# Snapshot files carry their generation in the name; the manifest names the current ones
+MANIFEST_FILE = "manifest.json"
+VERSIONED_PATTERN = re.compile(r"^[\w-]+\.(\d{10})\.\w+$")
+
+# Files of an interrupted multi-file replace by releases before the manifest
+NEXT_SUFFIX = ".next"
+COMMIT_MARKER = "commit.marker"
+
+
+def fsync_directory(directory: Path) -> None:
+    """Persist renames in a directory (no-op where directories cannot be opened)."""
+    try:
+        fd = os.open(str(directory), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class FileLock:
+    """
+    Exclusive lock shared by processes, held on a lock file.
+
+    Uses flock on POSIX and msvcrt byte locking on Windows. Each instance
+    opens its own handle, so two instances conflict even within one process;
+    one instance may re-enter its own lock (e.g. compaction during an append).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = None
+        self._depth = 0
+        self._lock = threading.RLock()
+
+    def acquire(self) -> None:
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "a+b")
+                self._lock_file(self._file)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._lock.release()
+                raise
+        self._depth += 1
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                self._unlock_file(self._file)
+            finally:
+                self._file.close()
+                self._file = None
+        self._lock.release()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+    @staticmethod
+    def _lock_file(f) -> None:
+        if os.name == "nt":
+            import msvcrt
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    return
+                except OSError:
+                    time.sleep(0.01)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    @staticmethod
+    def _unlock_file(f) -> None:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def write_file_atomic(path: Path, data: bytes) -> None:
+    """
+    Write a file so readers see either the old or the new content, never a torn write.
+
+    Args:
+        path: Destination file
+        data: File content
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_directory(path.parent)
+
+
+def versioned_name(name: str, generation: int) -> str:
+    """File name of a snapshot file in one generation, e.g. faiss_index.0000000003.bin."""
+    path = Path(name)
+    return f"{path.stem}.{generation:010d}{path.suffix}"
+
+
+def read_manifest(directory: Path) -> Dict[str, Any]:
+    """
+    Read the manifest naming the files of the current snapshot.
+
+    Args:
+        directory: Snapshot directory
+
+    Returns:
+        Manifest with "generation" and "files" (file name by logical name);
+        empty for directories written before manifests, whose files carry
+        their logical names
+    """
+    path = Path(directory) / MANIFEST_FILE
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def write_snapshot(directory: Path, files: Dict[str, bytes]) -> Dict[str, str]:
+    """
+    Write a new snapshot generation and switch the manifest to it.
+
+    Files are never replaced in place: readers may still map the previous
+    generation (and on Windows a mapped file cannot be overwritten). The new
+    files take names no snapshot has used, then the manifest is replaced, so
+    a crash before that leaves the previous snapshot current. Files of older
+    generations are removed afterwards by `remove_unreferenced_files`.
+
+    Args:
+        directory: Snapshot directory
+        files: New content by logical file name
+
+    Returns:
+        File name by logical name, as recorded in the manifest
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    generation = max([read_manifest(directory).get("generation", 0)] +
+                     [generation for generation, _ in _versioned_files(directory)]) + 1
+
+    names = {name: versioned_name(name, generation) for name in files}
+    for name, data in files.items():
+        write_file_atomic(directory / names[name], data)
+
+    manifest = {"generation": generation, "files": names}
+    write_file_atomic(directory / MANIFEST_FILE, json.dumps(manifest).encode("utf-8"))
+    remove_unreferenced_files(directory)
+    return names
+
+
+def _versioned_files(directory: Path) -> List[Tuple[int, Path]]:
+    """List generation-numbered snapshot files with their generation."""
+    versioned = []
+    for path in directory.iterdir():
+        match = VERSIONED_PATTERN.match(path.name)
+        if match:
+            versioned.append((int(match.group(1)), path))
+    return versioned
+
+
+def remove_unreferenced_files(directory: Path) -> int:
+    """
+    Delete snapshot files the manifest no longer references.
+
+    The previous generation is kept for readers that read the manifest just
+    before it was switched. Files that cannot be deleted yet (on Windows,
+    while a reader still maps them) are left for a later call.
+
+    Args:
+        directory: Snapshot directory
+
+    Returns:
+        Number of files deleted
+    """
+    manifest = read_manifest(directory)
+    if not manifest:
+        return 0
+
+    # Files named after their logical names predate the manifest
+    stale = [directory / name for name in manifest["files"] if (directory / name).exists()]
+    stale += [path for generation, path in _versioned_files(directory)
+              if generation < manifest["generation"] - 1]
+
+    deleted = 0
+    for path in stale:
+        try:
+            path.unlink()
+            deleted += 1
+        except OSError as e:
+            logger.debug("Snapshot file still in use, removing later", file=path.name, error=str(e))
+    return deleted
+
+
+def recover_replaced_files(directory: Path) -> None:
+    """
+    Clean up after snapshot writes interrupted by a crash.
+
+    Temporary files are discarded, and a multi-file swap by releases before
+    the manifest is finished if its commit marker exists and rolled back
+    otherwise.
+
+    Args:
+        directory: Snapshot directory
+    """
+    marker = directory / COMMIT_MARKER
+
+    if marker.exists():
+        for name in json.loads(marker.read_text(encoding="utf-8")):
+            next_path = directory / (name + NEXT_SUFFIX)
+            if next_path.exists():
+                os.replace(next_path, directory / name)
+        fsync_directory(directory)
+        marker.unlink()
+        fsync_directory(directory)
+
+    for stale in list(directory.glob("*" + NEXT_SUFFIX)) + list(directory.glob("*.tmp")):
+        stale.unlink()
+
+    remove_unreferenced_files(directory)
+
+
+class SegmentLog:
+    """
+    Directory of numbered segment files, each holding one batch of operations.
+
+    A segment is written to a temporary file, fsynced and renamed into place,
+    so a crash mid-write leaves at most a stray temporary file, never a
+    partial segment. Segments are replayed in order on startup and deleted
+    once a merged base snapshot covers them.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Initialize the segment log.
+
+        Args:
+            directory: Directory holding the segment files (created on the first append)
+        """
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+
+        # Leftovers of interrupted writes were never committed
+        if self.directory.exists():
+            for tmp_file in self.directory.glob("*.tmp"):
+                tmp_file.unlink()
+
+        segments = self._list_segments()
+        self.last_seq = segments[-1][0] if segments else 0
+
+    def _list_segments(self) -> List[Tuple[int, Path]]:
+        """List committed segments ordered by sequence number."""
+        segments = []
+        if not self.directory.exists():
+            return segments
+        for path in self.directory.iterdir():
+            match = SEGMENT_PATTERN.match(path.name)
+            if match:
+                segments.append((int(match.group(1)), path))
+        return sorted(segments)
+
+    def append(self, ops: List[Tuple]) -> int:
+        """
+        Durably append one batch of operations.
+
+        Args:
+            ops: Operations to log (replayed together, in order)
+
+        Returns:
+            Sequence number of the new segment
+        """
+        with self._lock:
+            seq = self.last_seq + 1
+            data = pickle.dumps({"seq": seq, "ops": ops}, protocol=pickle.HIGHEST_PROTOCOL)
+            self.directory.mkdir(parents=True, exist_ok=True)
+            write_file_atomic(self.directory / f"segment_{seq:010d}.seg", data)
+            self.last_seq = seq
+
+        return seq
+
+    def skip_to(self, seq: int) -> None:
+        """
+        Continue numbering after `seq`, e.g. after loading a base snapshot that covers it.
+
+        Args:
+            seq: Sequence number already used
+        """
+        with self._lock:
+            self.last_seq = max(self.last_seq, seq)
+
+    def replay(self, after_seq: int = 0) -> Iterator[Tuple[int, List[Tuple]]]:
+        """
+        Read committed segments newer than `after_seq`, in order.
+
+        Args:
+            after_seq: Sequence number already covered by the base snapshot
+
+        Yields:
+            (sequence number, operations) pairs
+        """
+        for seq, path in self._list_segments():
+            if seq <= after_seq:
+                continue
+
+            try:
+                with open(path, "rb") as f:
+                    segment = pickle.load(f)
+            except Exception as e:
+                # Later segments may depend on this one, so stop here
+                logger.error("Unreadable segment, stopping replay", segment=path.name, error=str(e))
+                return
+
+            yield seq, segment["ops"]
+
+    def truncate(self, upto_seq: int) -> int:
+        """
+        Delete segments covered by a base snapshot.
+
+        Args:
+            upto_seq: Highest sequence number included in the snapshot
+
+        Returns:
+            Number of segments deleted
+        """
+        deleted = 0
+        for seq, path in self._list_segments():
+            if seq <= upto_seq:
+                path.unlink()
+                deleted += 1
+        return deleted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get segment log statistics.
+
+        Returns:
+            Dictionary with segment count, size and last sequence number
+        """
+        segments = self._list_segments()
+        return {
+            "segments": len(segments),
+            "bytes": sum(path.stat().st_size for _, path in segments),
+            "last_seq": self.last_seq
+        }
+
+    def __len__(self) -> int:
+        return len(self._list_segments())
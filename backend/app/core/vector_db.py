@@ -2,11 +2,14 @@
 FAISS Vector Database Integration for PrivAI
 Handles local storage, indexing, and querying of embeddings using FAISS
 """
+import math
 import os
 import pickle
-import uuid
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple, Union
+from typing import List, Dict, Any, Callable, NamedTuple, Optional, Tuple, Union
 import numpy as np
 
 # Optional imports for FAISS
@@ -18,9 +21,57 @@ except ImportError:
 
 from .config import settings
 from .logging import get_logger
+from .segment_log import SegmentLog, write_snapshot, read_manifest, recover_replaced_files
+from .chunk_table import (ChunkTable, ChunkStore, ChunkView, derive_chunk_id, matches_condition,
+                          next_derived_chunk_id)
+from .delta_vectors import DeltaVectors, DeltaView, merge_results
+from .ivf_tuning import (CentroidDrift, PQ_NBITS, PQ_MIN_TRAINING_VECTORS, choose_nlist, choose_nprobe,
+                         choose_pq_m, uniform_training_sample)
 
 logger = get_logger("vector_db")
 
+# Base snapshot files; changes made since the snapshot live in the segment log
+INDEX_FILE = "faiss_index.bin"
+METADATA_FILE = "metadata.pkl"
+SEGMENTS_DIR = "segments"
+
+# Storage precisions for index vectors, mapped to FAISS scalar quantizer types
+INDEX_PRECISIONS = {"float32": None, "float16": "QT_fp16", "int8": "QT_8bit"}
+
+# Margin added around the per-dimension value range learned by the int8 quantizer,
+# so vectors added after training are not clipped as hard
+SQ_RANGE_MARGIN = 0.1
+
+# Vectors copied per lock hold when rebuilding an index in the background
+REBUILD_BATCH = 16384
+
+# Index types whose vectors are clustered into inverted lists once trained
+IVF_INDEX_TYPES = ("ivf", "ivfpq")
+
+# OpenMP threads FAISS starts with (OMP_NUM_THREADS or all cores)
+DEFAULT_FAISS_THREADS = faiss.omp_get_max_threads() if FAISS_AVAILABLE else 1
+
+
+def _use_faiss_threads(count: int) -> None:
+    """
+    Set the OpenMP threads of FAISS calls made from the current thread.
+    
+    OpenMP keeps the setting per calling thread, so it is applied by each
+    search or build rather than once per process.
+    
+    Args:
+        count: Number of threads, 0 for the default
+    """
+    faiss.omp_set_num_threads(count or DEFAULT_FAISS_THREADS)
+
+
+class _Snapshot(NamedTuple):
+    """Immutable state searches read: replaced as a whole when writers publish, never modified."""
+    index: Any
+    delta: DeltaView
+    chunks: ChunkView
+    dead: int  # Tombstoned and staged vectors among index and delta, which searches skip
+
 
 class VectorDatabase:
     """
@@ -32,15 +83,23 @@ class VectorDatabase:
                  index_path: Optional[str] = None,
                  embedding_dim: int = 384,
                  index_type: str = "flat",
-                 metric: str = "cosine"):
+                 metric: str = "cosine",
+                 precision: Optional[str] = None,
+                 mmap: Optional[bool] = None):
         """
         Initialize the vector database.
         
         Args:
-            index_path: Path to store the FAISS index and metadata
+            index_path: Directory of the FAISS index, metadata and segment log;
+                without one the database lives in memory until `save_index` or
+                `load_index` is given a path
             embedding_dim: Dimension of the embedding vectors
-            index_type: Type of FAISS index ("flat", "ivf", "hnsw")
+            index_type: Type of FAISS index ("flat", "ivf", "ivfpq", "hnsw")
             metric: Distance metric ("cosine", "l2", "ip")
+            precision: Vector storage precision ("float32", "float16", "int8");
+                defaults to settings.vector_index_precision
+            mmap: Memory-map the saved index and chunk table read-only instead of
+                reading them into memory; defaults to settings.vector_index_mmap
         """
         if not FAISS_AVAILABLE:
             raise ImportError(
@@ -48,35 +107,91 @@ class VectorDatabase:
                 "Install with: pip install faiss-cpu"
             )
         
-        self.index_path = Path(index_path) if index_path else Path(settings.faiss_index_path)
+        self.index_path: Optional[Path] = None
         self.embedding_dim = embedding_dim
         self.index_type = index_type
         self.metric = metric
+        self.precision = precision or settings.vector_index_precision
+        self.mmap = settings.vector_index_mmap if mmap is None else mmap
         
-        # Create index directory
-        self.index_path.mkdir(parents=True, exist_ok=True)
+        if self.precision not in INDEX_PRECISIONS:
+            raise ValueError(f"Unsupported index precision: {self.precision}. Use one of {list(INDEX_PRECISIONS)}")
         
         # Initialize FAISS index
         self.index = self._create_index()
-        self.chunk_metadata = {}  # Maps chunk_id to metadata
-        self.chunk_id_to_index = {}  # Maps chunk_id to FAISS index position
-        self.index_to_chunk_id = {}  # Maps FAISS index position to chunk_id
+        self._index_mapped = False  # Index pages are mapped read-only from the snapshot file
+        
+        # Vectors added since the index was last folded, searched exactly next to it
+        self.delta = DeltaVectors(embedding_dim)
+        self._fold_thread: Optional[threading.Thread] = None
+        
+        # Chunk text and metadata in columns keyed by FAISS vector id
+        self.chunks = ChunkStore(embedding_dim)
         self.next_index = 0
         
+        # Maps document_id to its content hash and chunk IDs, for document-level replace
+        self.documents = {}
+        
+        # Ids of removed chunks whose vectors are still in the index until compaction
+        self.tombstones = set()
+        self.compaction_threshold = settings.vector_compaction_threshold
+        self._compaction_thread: Optional[threading.Thread] = None
+        self._rebuild_thread: Optional[threading.Thread] = None
+        self._generation = 0  # Bumped when the index is replaced wholesale
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()  # One background index rebuild at a time
+        
+        # IVF lists are trained once enough vectors are staged, and retrained on drift
+        self._ivf_drift: Optional[CentroidDrift] = None
+        self._ivf_thread: Optional[threading.Thread] = None
+        
+        # Mutations are appended to a segment log and folded into the base snapshot
+        # by a background merge, instead of rewriting the whole index on every change
+        self.segment_log: Optional[SegmentLog] = None
+        self.segment_seq = 0  # Last segment included in the base snapshot
+        self._pending_ops: List[Tuple] = []
+        self._batch_depth = 0
+        self._merge_thread: Optional[threading.Thread] = None
+        self._merge_lock = threading.Lock()
+        
+        # Searches read the last published snapshot without taking the lock
+        self._publish()
+        
         # Load existing index if available
-        self._load_index()
+        if index_path:
+            self._attach(Path(index_path))
+            self._load_index()
         
         logger.info("VectorDatabase initialized", 
-                   index_path=str(self.index_path),
+                   index_path=str(self.index_path) if self.index_path else None,
                    embedding_dim=embedding_dim,
                    index_type=index_type,
-                   metric=metric)
+                   metric=metric,
+                   precision=self.precision)
     
-    def _create_index(self):
-        """Create a new FAISS index based on configuration."""
+    def _faiss_metric(self) -> int:
+        """FAISS metric of the configured similarity (cosine is inner product on normalized vectors)."""
+        return faiss.METRIC_L2 if self.metric == "l2" else faiss.METRIC_INNER_PRODUCT
+    
+    def _create_index(self, nlist: Optional[int] = None):
+        """
+        Create a new FAISS index based on configuration.
+        
+        Args:
+            nlist: Number of lists of an IVF index. Without it, "ivf" and "ivfpq"
+                databases get an exact flat staging index until there is enough
+                data to train the lists (see `train_ivf`).
+        """
         try:
+            faiss_metric = self._faiss_metric()
+            sq_type = INDEX_PRECISIONS[self.precision]
+            qtype = getattr(faiss.ScalarQuantizer, sq_type) if sq_type else None
+            
             if self.index_type == "flat":
-                if self.metric == "cosine":
+                if qtype is not None:
+                    # Scalar-quantized flat index: 2 (fp16) or 1 (int8) bytes per dimension
+                    index = faiss.IndexScalarQuantizer(self.embedding_dim, qtype, faiss_metric)
+                elif self.metric == "cosine":
                     # Use inner product for cosine similarity (vectors must be normalized)
                     index = faiss.IndexFlatIP(self.embedding_dim)
                 elif self.metric == "l2":
@@ -84,23 +199,62 @@ class VectorDatabase:
                 else:
                     raise ValueError(f"Unsupported metric for flat index: {self.metric}")
             
+            elif self.index_type in IVF_INDEX_TYPES and nlist is None:
+                # Staging: vectors are buffered in an exact index that also serves searches
+                index = faiss.IndexFlat(self.embedding_dim, faiss_metric)
+            
             elif self.index_type == "ivf":
                 # IVF (Inverted File) index for larger datasets
-                quantizer = faiss.IndexFlatIP(self.embedding_dim) if self.metric == "cosine" else faiss.IndexFlatL2(self.embedding_dim)
-                index = faiss.IndexIVFFlat(quantizer, self.embedding_dim, 100)  # 100 clusters
+                quantizer = faiss.IndexFlat(self.embedding_dim, faiss_metric)
+                if qtype is not None:
+                    index = faiss.IndexIVFScalarQuantizer(quantizer, self.embedding_dim, nlist, qtype, faiss_metric)
+                else:
+                    index = faiss.IndexIVFFlat(quantizer, self.embedding_dim, nlist, faiss_metric)
+                index.nprobe = choose_nprobe(nlist)
+                # Look vectors up by id, for rebuilds and exact filtered search
+                index.set_direct_map_type(faiss.DirectMap.Hashtable)
+            
+            elif self.index_type == "ivfpq":
+                # PQ codes in memory find k x rerank candidates, which are re-ranked
+                # exactly against the full vectors of the refine index; loading
+                # memory-maps those, so only the codes take up RAM
+                quantizer = faiss.IndexFlat(self.embedding_dim, faiss_metric)
+                ivf = faiss.IndexIVFPQ(quantizer, self.embedding_dim, nlist,
+                                       choose_pq_m(self.embedding_dim), PQ_NBITS, faiss_metric)
+                ivf.nprobe = choose_nprobe(nlist)
+                if qtype is not None:
+                    index = faiss.IndexRefine(ivf, faiss.IndexScalarQuantizer(self.embedding_dim, qtype, faiss_metric))
+                else:
+                    index = faiss.IndexRefineFlat(ivf)
+                index.k_factor = settings.vector_ivfpq_rerank
             
             elif self.index_type == "hnsw":
-                # HNSW (Hierarchical Navigable Small World) index
-                index = faiss.IndexHNSWFlat(self.embedding_dim, 32)  # 32 connections per node
-                index.hnsw.efConstruction = 200  # Construction parameter
-                index.hnsw.efSearch = 50  # Search parameter
+                # HNSW (Hierarchical Navigable Small World) index; cosine and ip
+                # databases link and search the graph by inner product
+                if qtype is not None:
+                    index = faiss.IndexHNSWSQ(self.embedding_dim, qtype, settings.vector_hnsw_m, faiss_metric)
+                else:
+                    index = faiss.IndexHNSWFlat(self.embedding_dim, settings.vector_hnsw_m, faiss_metric)
+                index.hnsw.efConstruction = settings.vector_hnsw_ef_construction
+                index.hnsw.efSearch = settings.vector_hnsw_ef_search
             
             else:
                 raise ValueError(f"Unsupported index type: {self.index_type}")
             
+            sq = self._get_scalar_quantizer(index)
+            if sq is not None:
+                sq.rangestat_arg = SQ_RANGE_MARGIN
+            
+            # Vectors are addressed by stable ids so they can be removed;
+            # IVF indexes store ids natively, others go through an id map
+            if not isinstance(index, faiss.IndexIVF):
+                index = faiss.IndexIDMap2(index)
+            
             logger.info("FAISS index created", 
                        index_type=self.index_type,
+                       nlist=nlist,
                        metric=self.metric,
+                       precision=self.precision,
                        embedding_dim=self.embedding_dim)
             
             return index
@@ -109,13 +263,92 @@ class VectorDatabase:
             logger.error("Failed to create FAISS index", error=str(e))
             raise
     
-    def add_chunks(self, chunks: List[Dict[str, Any]], embeddings: List[np.ndarray]) -> List[str]:
+    @staticmethod
+    def _get_storage_index(index):
+        """Unwrap id maps, HNSW graphs and re-rankers down to the index holding the vector codes."""
+        index = faiss.downcast_index(index)
+        if isinstance(index, faiss.IndexIDMap):
+            index = faiss.downcast_index(index.index)
+        if isinstance(index, faiss.IndexHNSW):
+            index = faiss.downcast_index(index.storage)
+        if isinstance(index, faiss.IndexRefine):
+            index = faiss.downcast_index(index.refine_index)
+        return index
+    
+    @classmethod
+    def _get_scalar_quantizer(cls, index):
+        """Get the scalar quantizer of an index, or None for full-precision indexes."""
+        return getattr(cls._get_storage_index(index), "sq", None)
+    
+    def _ivf_index(self, index=None):
+        """The trained IVF index (under the re-ranker for "ivfpq") of `index` or the current index, or None while staging."""
+        return self._find_ivf(self.index if index is None else index)
+    
+    @staticmethod
+    def _find_ivf(index):
+        """Unwrap id maps and re-rankers down to an IVF index, or None if there is none."""
+        index = faiss.downcast_index(index)
+        if isinstance(index, faiss.IndexIDMap):
+            index = faiss.downcast_index(index.index)
+        if isinstance(index, faiss.IndexRefine):
+            index = faiss.downcast_index(index.base_index)
+        return index if isinstance(index, faiss.IndexIVF) else None
+    
+    def _hnsw_index(self, index=None):
+        """The HNSW graph index under the id map of `index` or the current index, or None for other index types."""
+        index = faiss.downcast_index(self.index if index is None else index)
+        if isinstance(index, faiss.IndexIDMap):
+            index = faiss.downcast_index(index.index)
+        return index if isinstance(index, faiss.IndexHNSW) else None
+    
+    def _is_refined(self, index=None) -> bool:
+        """Whether searches go through an IVF-PQ re-ranker (trained "ivfpq" databases)."""
+        return self.index_type == "ivfpq" and self._ivf_index(index) is not None
+    
+    def _refine_params(self, ivf_params):
+        """Wrap IVF search parameters for the re-ranker, which only passes on `base_index_params`."""
+        params = faiss.IndexRefineSearchParameters(k_factor=settings.vector_ivfpq_rerank,
+                                                   base_index_params=ivf_params)
+        params.referenced_objects = [ivf_params]  # Only a pointer is kept on the C++ side
+        return params
+    
+    def _search_params(self, index, nprobe: Optional[int], ef_search: Optional[int]):
+        """Search parameters probing `nprobe` IVF lists or `ef_search` HNSW candidates of an index, or None for its defaults."""
+        if self._hnsw_index(index) is not None:
+            return faiss.SearchParametersHNSW(efSearch=max(1, ef_search)) if ef_search else None
+        
+        ivf = self._ivf_index(index)
+        if nprobe is None or ivf is None:
+            return None
+        params = faiss.SearchParametersIVF(nprobe=max(1, min(nprobe, ivf.nlist)))
+        return self._refine_params(params) if self._is_refined(index) else params
+    
+    def _supports_remove(self) -> bool:
+        """Whether the index can drop vectors in place (HNSW graphs and IVF-PQ re-rankers cannot)."""
+        return self.index_type != "hnsw" and not self._is_refined()
+    
+    def add_chunks(self,
+                   chunks: List[Dict[str, Any]],
+                   embeddings: List[np.ndarray],
+                   content_hash: Optional[str] = None,
+                   staged: bool = False) -> List[int]:
         """
         Add chunks with their embeddings to the vector database.
         
+        Chunk IDs are int64. Chunks with a 'chunk_index' and a content hash
+        (`content_hash`, or their 'file_hash' metadata) get a stable ID derived
+        from the two, so re-ingesting the same content yields the same IDs;
+        other chunks take their FAISS vector ID.
+        
+        Staged chunks are stored and logged, but searches and reads do not see
+        them until `commit_document` publishes them. Streaming ingestion stages
+        a document batch by batch, so its new version replaces the old one at once.
+        
         Args:
             chunks: List of chunk dictionaries with 'text' and 'metadata' keys
             embeddings: List of corresponding embedding vectors
+            content_hash: Hash of the document the chunks come from
+            staged: Keep the chunks hidden until `commit_document`
             
         Returns:
             List of chunk IDs assigned to the added chunks
@@ -144,36 +377,29 @@ class VectorDatabase:
             if self.metric == "cosine":
                 faiss.normalize_L2(embeddings_array)
             
-            # Generate chunk IDs
-            chunk_ids = []
-            for i, chunk in enumerate(chunks):
-                chunk_id = str(uuid.uuid4())
-                chunk_ids.append(chunk_id)
-                
-                # Store metadata
-                self.chunk_metadata[chunk_id] = {
+            entries = [
+                {
                     'text': chunk['text'],
                     'metadata': chunk['metadata'],
                     'embedding_dim': self.embedding_dim,
                     'added_at': self._get_timestamp()
                 }
-                
-                # Map chunk ID to index position
-                self.chunk_id_to_index[chunk_id] = self.next_index + i
-                self.index_to_chunk_id[self.next_index + i] = chunk_id
-            
-            # Add embeddings to FAISS index
-            if self.index_type == "ivf" and not self.index.is_trained:
-                # Train IVF index if not already trained
-                logger.info("Training IVF index")
-                self.index.train(embeddings_array)
-            
-            self.index.add(embeddings_array)
-            self.next_index += len(chunks)
-            
-            logger.info("Chunks added successfully", 
+                for chunk in chunks
+            ]
+                    
+            with self._log_batch():
+                ids = np.arange(self.next_index, self.next_index + len(chunks), dtype=np.int64)
+                chunk_ids = self._assign_chunk_ids(chunks, ids, content_hash)
+                self._apply_add(chunk_ids, entries, ids, embeddings_array, staged)
+                self._log(("stage" if staged else "add", chunk_ids, entries, ids, embeddings_array))
+                    
+            logger.info("Chunks added successfully",
                        chunk_count=len(chunks),
-                       total_chunks=self.index.ntotal)
+                       staged=staged,
+                       total_chunks=len(self.chunks))
+            
+            self._schedule_fold()
+            self._schedule_ivf_training()
             
             return chunk_ids
             
@@ -181,59 +407,82 @@ class VectorDatabase:
             logger.error("Failed to add chunks", error=str(e))
             raise
     
-    def query_top_k(self, query_vector: np.ndarray, k: int = 5) -> List[Dict[str, Any]]:
+    def _assign_chunk_ids(self,
+                          chunks: List[Dict[str, Any]],
+                          ids: np.ndarray,
+                          content_hash: Optional[str]) -> List[int]:
+        """Chunk IDs for new chunks: derived from content where possible, else the vector IDs (caller holds the lock)."""
+        chunk_ids = []
+        taken = set()
+        
+        for chunk, vector_id in zip(chunks, ids.tolist()):
+            metadata = chunk.get('metadata') or {}
+            key = content_hash or metadata.get('file_hash')
+            chunk_index = metadata.get('chunk_index')
+            
+            if key and isinstance(chunk_index, int):
+                chunk_id = derive_chunk_id(key, chunk_index)
+                # Another live chunk hashed to the same ID (or the content was added twice)
+                while chunk_id in taken or chunk_id in self.chunks:
+                    chunk_id = next_derived_chunk_id(chunk_id)
+            else:
+                chunk_id = vector_id
+            
+            taken.add(chunk_id)
+            chunk_ids.append(chunk_id)
+        
+        return chunk_ids
+    
+    def _apply_add(self,
+                   chunk_ids: List[int],
+                   entries: List[Dict[str, Any]],
+                   ids: np.ndarray,
+                   vectors: np.ndarray,
+                   staged: bool = False) -> None:
+        """Store chunk metadata and buffer their vectors under the given ids (caller holds the lock)."""
+        # The index searches are reading is left alone; a fold adds the
+        # buffered vectors to a copy of it (see `fold_delta`)
+        self.delta.add(vectors, ids)
+        self.next_index = max(self.next_index, int(ids[-1]) + 1)
+        
+        if self._ivf_drift is not None:
+            self._ivf_drift.observe(vectors)
+        
+        # Only after the vectors went in; vectors without a chunk are never returned
+        self.chunks.add(chunk_ids, entries, ids.tolist(), staged)
+    
+    def query_top_k(self,
+                    query_vector: np.ndarray,
+                    k: int = 5,
+                    nprobe: Optional[int] = None,
+                    ef_search: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Query the vector database for the top-k most similar chunks.
         
         Args:
             query_vector: Query embedding vector
             k: Number of top results to return
+            nprobe: IVF lists to search, trading speed for recall; defaults to
+                the index's nprobe (ignored by other index types)
+            ef_search: HNSW candidate list size, trading speed for recall;
+                defaults to `vector_hnsw_ef_search` (ignored by other index types)
             
         Returns:
             List of dictionaries containing chunk data and similarity scores
         """
         try:
-            if self.index.ntotal == 0:
+            snapshot = self._snapshot
+            if not len(snapshot.chunks):
                 logger.warning("Vector database is empty")
                 return []
             
-            if query_vector.shape[0] != self.embedding_dim:
-                raise ValueError(f"Query vector has dimension {query_vector.shape[0]}, expected {self.embedding_dim}")
+            query_vector = self._prepare_query(query_vector)
             
-            # Prepare query vector
-            query_vector = query_vector.reshape(1, -1).astype('float32')
-            
-            # Normalize query vector for cosine similarity if using cosine metric
-            if self.metric == "cosine":
-                faiss.normalize_L2(query_vector)
-            
-            # Search the index
-            scores, indices = self.index.search(query_vector, min(k, self.index.ntotal))
+            # Search the index, skipping vectors of removed chunks
+            hits = self._search_live(snapshot, query_vector, k, nprobe, ef_search)[0]
             
             # Prepare results
-            results = []
-            for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
-                if idx == -1:  # Invalid index
-                    continue
-                
-                chunk_id = self.index_to_chunk_id.get(idx)
-                if chunk_id is None:
-                    logger.warning("No chunk ID found for index", index=idx)
-                    continue
-                
-                chunk_data = self.chunk_metadata.get(chunk_id)
-                if chunk_data is None:
-                    logger.warning("No metadata found for chunk", chunk_id=chunk_id)
-                    continue
-                
-                result = {
-                    'chunk_id': chunk_id,
-                    'text': chunk_data['text'],
-                    'metadata': chunk_data['metadata'],
-                    'similarity_score': float(score),
-                    'rank': i + 1
-                }
-                results.append(result)
+            results = self._format_results(hits)
             
             logger.info("Query completed", 
                        query_vector_shape=query_vector.shape,
@@ -246,38 +495,1003 @@ class VectorDatabase:
             logger.error("Failed to query vector database", error=str(e))
             return []
     
+    def query_top_k_batch(self,
+                          query_vectors: np.ndarray,
+                          k: int = 5,
+                          nprobe: Optional[int] = None,
+                          ef_search: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Query the vector database with many vectors in one FAISS search.
+        
+        Args:
+            query_vectors: Query embeddings as an (n, embedding_dim) matrix
+            k: Number of top results to return per query
+            nprobe: IVF lists to search, as in `query_top_k`
+            ef_search: HNSW candidate list size, as in `query_top_k`
+            
+        Returns:
+            For each query, the same result dictionaries as `query_top_k`
+        """
+        try:
+            query_vectors = np.asarray(query_vectors, dtype=np.float32)
+            if query_vectors.ndim != 2 or query_vectors.shape[1] != self.embedding_dim:
+                raise ValueError(f"Query matrix has shape {query_vectors.shape}, expected (n, {self.embedding_dim})")
+            
+            snapshot = self._snapshot
+            if not len(snapshot.chunks):
+                logger.warning("Vector database is empty")
+                return [[] for _ in range(len(query_vectors))]
+            
+            query_vectors = np.ascontiguousarray(query_vectors)
+            if self.metric == "cosine":
+                query_vectors = query_vectors.copy()
+                faiss.normalize_L2(query_vectors)
+            
+            results = [self._format_results(hits)
+                       for hits in self._search_live(snapshot, query_vectors, k, nprobe, ef_search)]
+            
+            logger.info("Batch query completed", 
+                       queries=len(query_vectors),
+                       k=k,
+                       results_count=sum(len(r) for r in results))
+            
+            return results
+            
+        except Exception as e:
+            logger.error("Failed to batch query vector database", error=str(e))
+            raise
+    
+    def _prepare_query(self, query_vector: np.ndarray) -> np.ndarray:
+        """Check a query vector and shape it as a (1, dim) float32 batch, normalized for cosine."""
+        if query_vector.shape[0] != self.embedding_dim:
+            raise ValueError(f"Query vector has dimension {query_vector.shape[0]}, expected {self.embedding_dim}")
+        
+        # Prepare query vector
+        query_vector = query_vector.reshape(1, -1).astype('float32')
+        
+        # Normalize query vector for cosine similarity if using cosine metric
+        if self.metric == "cosine":
+            faiss.normalize_L2(query_vector)
+        
+        return query_vector
+    
+    @staticmethod
+    def _format_results(hits: List[Tuple[float, int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Turn (score, chunk_id, entry) hits into ranked result dictionaries."""
+        results = []
+        for score, chunk_id, chunk_data in hits:
+            result = {
+                'chunk_id': chunk_id,
+                'text': chunk_data['text'],
+                'metadata': chunk_data['metadata'],
+                'similarity_score': float(score),
+                'rank': len(results) + 1
+            }
+            results.append(result)
+        return results
+    
+    def _search_live(self,
+                     snapshot: _Snapshot,
+                     query_vectors: np.ndarray,
+                     k: int,
+                     nprobe: Optional[int] = None,
+                     ef_search: Optional[int] = None) -> List[List[Tuple[float, int, Dict[str, Any]]]]:
+        """
+        Search a snapshot for a batch of queries and drop tombstoned vectors.
+        
+        Over-fetches in proportion to the deleted fraction, and retries the
+        queries that came up short with the worst-case fetch size. Result ids
+        are mapped to chunks with one vectorized lookup, and only the returned
+        chunks have their text and metadata decoded (once per batch).
+        
+        Returns:
+            For each query, up to k (score, chunk_id, chunk entry) tuples, best first
+        """
+        ntotal = snapshot.index.ntotal + len(snapshot.delta)
+        dead = snapshot.dead
+            
+        # Every tombstone ranking ahead of live vectors is the worst case
+        max_fetch = min(k + dead, ntotal)
+        live_fraction = max(1.0 - dead / ntotal, 1e-3) if ntotal else 1.0
+        fetch = min(max_fetch, int(math.ceil(k * settings.vector_delete_overfetch / live_fraction)))
+        fetch = max(fetch, min(k, ntotal))
+            
+        results: List[List[Tuple[float, int, Dict[str, Any]]]] = [[] for _ in range(len(query_vectors))]
+        if not fetch:
+            return results
+                
+        pending = np.arange(len(query_vectors))
+        decoded: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+        params = self._search_params(snapshot.index, nprobe, ef_search)
+        _use_faiss_threads(settings.vector_search_threads)
+                
+        while len(pending):
+            scores, indices = self._search_index(snapshot, query_vectors[pending], fetch, params)
+            rows = snapshot.chunks.lookup_vectors(indices)
+                
+            short = []
+            for query, query_scores, query_rows in zip(pending, scores, rows):
+                columns = np.flatnonzero(query_rows >= 0)[:k]
+                if len(columns) < k and fetch < max_fetch:
+                    short.append(query)
+                    continue
+                    
+                hits = results[query]
+                for column in columns.tolist():
+                    row = int(query_rows[column])
+                    chunk = decoded.get(row)
+                    if chunk is None:
+                        chunk = decoded[row] = snapshot.chunks.chunk_at(row)
+                    hits.append((float(query_scores[column]), chunk[0], chunk[1]))
+                
+            pending = np.array(short, dtype=np.int64)
+            fetch = max_fetch
+            
+        return results
+    
+    def _search_index(self, snapshot: _Snapshot, query_vectors: np.ndarray, k: int, params) -> Tuple[np.ndarray, np.ndarray]:
+        """Search the index and the delta vectors of a snapshot and merge them into the best k (scores, ids)."""
+        if not len(snapshot.delta):
+            return snapshot.index.search(query_vectors, k, params=params)
+        
+        metric = snapshot.index.metric_type
+        parts = [snapshot.delta.search(query_vectors, k, metric)]
+        if snapshot.index.ntotal:
+            parts.append(snapshot.index.search(query_vectors, k, params=params))
+        return merge_results(parts, k, metric)
+    
+    def remove_chunks(self, chunk_ids: List[int]) -> int:
+        """
+        Remove chunks from the database.
+        
+        Metadata is dropped immediately and the vectors become tombstones that
+        searches skip; the index is compacted in the background once the
+        deleted fraction reaches `compaction_threshold`.
+        
+        Args:
+            chunk_ids: Chunk IDs to remove
+            
+        Returns:
+            Number of chunks removed
+        """
+        with self._log_batch():
+            removed_ids = self._apply_remove(chunk_ids)
+            if removed_ids:
+                self._log(("remove", removed_ids))
+            
+            deleted_fraction = self._deleted_fraction()
+        
+        removed = len(removed_ids)
+        if removed:
+            logger.info("Chunks removed", 
+                       removed=removed,
+                       dead_vectors=len(self.tombstones),
+                       deleted_fraction=deleted_fraction)
+            
+            if deleted_fraction >= self.compaction_threshold:
+                self._schedule_compaction()
+        
+        return removed
+    
+    def _apply_remove(self, chunk_ids: List[int]) -> List[int]:
+        """Drop chunk metadata and tombstone their vectors (caller holds the lock)."""
+        removed = self.chunks.remove(chunk_ids)
+        self.tombstones.update(vector_id for _, vector_id in removed)
+        return [chunk_id for chunk_id, _ in removed]
+    
+    def _deleted_fraction(self) -> float:
+        """Fraction of vectors in the index and delta that belong to removed chunks."""
+        total = self.index.ntotal + len(self.delta)
+        return len(self.tombstones) / total if total else 0.0
+    
+    def _schedule_compaction(self) -> None:
+        """Start a background compaction unless one is already running."""
+        with self._lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+            
+            self._compaction_thread = threading.Thread(
+                target=self.compact,
+                name="vector-db-compaction",
+                daemon=True
+            )
+            self._compaction_thread.start()
+    
+    def fold_delta(self) -> int:
+        """
+        Add the buffered delta vectors to the index.
+        
+        The vectors are added to a copy of the index outside the lock, and the
+        copy is swapped in, so searches keep reading the current index and
+        ingestion keeps buffering meanwhile. Runs in the background once the
+        delta reaches the fold threshold (see `_fold_threshold`).
+        
+        Returns:
+            Number of delta vectors folded (including those of removed chunks, which are dropped)
+        """
+        try:
+            with self._rebuild_lock:
+                return self._fold_delta() or 0
+            
+        except Exception as e:
+            logger.error("Failed to fold delta vectors", error=str(e))
+            return 0
+    
+    def _fold_delta(self) -> Optional[int]:
+        """
+        Fold the delta vectors into a copy of the index and swap it in (caller holds `_rebuild_lock`).
+        
+        Returns:
+            Number of delta vectors folded, or None if the database was cleared
+            or reloaded meanwhile
+        """
+        start_time = time.perf_counter()
+        _use_faiss_threads(settings.vector_build_threads)
+        
+        with self._lock:
+            index, delta = self.index, self.delta.view()
+            mapped = self._index_mapped
+            generation = self._generation
+            if not len(delta):
+                return 0
+            live = self.chunks.lookup_vectors(delta.ids) >= 0
+        
+        new_index = self._copy_index(index, mapped) if live.any() else index
+        if live.any():
+            vectors = delta.vectors[live]
+            if not new_index.is_trained:
+                # Scalar quantizer ranges are learned from the first vectors
+                new_index.train(vectors)
+            new_index.add_with_ids(vectors, delta.ids[live])
+        
+        with self._lock:
+            if generation != self._generation:
+                return None
+            
+            self.index = new_index
+            self._index_mapped = False
+            self.delta = self.delta.drop(len(delta))
+            # Vectors of chunks removed before the fold were left out
+            self.tombstones.difference_update(delta.ids[~live].tolist())
+            self._publish()
+        
+        logger.info("Delta vectors folded into index",
+                   folded=int(live.sum()),
+                   dropped=int(len(live) - live.sum()),
+                   total_vectors=new_index.ntotal,
+                   seconds=round(time.perf_counter() - start_time, 3))
+        
+        return len(delta)
+    
+    def _background_fold(self) -> None:
+        """Fold until the delta is below the fold threshold, as ingestion goes on while folding."""
+        while self.fold_delta():
+            with self._lock:
+                if len(self.delta) < self._fold_threshold():
+                    return
+    
+    def _fold_threshold(self, committed: bool = False) -> int:
+        """
+        Delta size that triggers a fold (caller holds the lock).
+        
+        A fold copies the index, so the threshold grows with the index
+        (`vector_delta_fold_ratio`) to keep the copying cost per added vector
+        constant, up to `vector_delta_fold_size`. Small indexes are cheap to
+        copy: once an ingest commits, the `vector_delta_fold_min` floor is
+        dropped, so small deployments search their configured index type
+        rather than the exact delta.
+        """
+        floor = 1 if committed else settings.vector_delta_fold_min
+        relative = int(settings.vector_delta_fold_ratio * self.index.ntotal)
+        return min(settings.vector_delta_fold_size, max(floor, relative))
+    
+    def _schedule_fold(self, committed: bool = False) -> None:
+        """Start a background fold once enough delta vectors are buffered, unless one is already running."""
+        with self._lock:
+            if not len(self.delta) or len(self.delta) < self._fold_threshold(committed):
+                return
+            
+            if self._fold_thread is not None and self._fold_thread.is_alive():
+                return
+            
+            self._fold_thread = threading.Thread(
+                target=self._background_fold,
+                name="vector-db-fold",
+                daemon=True
+            )
+            self._fold_thread.start()
+    
+    def compact(self) -> int:
+        """
+        Physically drop tombstoned vectors from the index.
+        
+        Flat and IVF indexes remove the vectors from a copy of the index, which
+        is swapped in. HNSW graphs cannot delete nodes, so the live vectors are
+        rebuilt into a new graph outside the lock and swapped in, catching up
+        with chunks added meanwhile. Trained IVF-PQ indexes are retrained and
+        rebuilt the same way. Tombstoned delta vectors are dropped by the next
+        fold instead.
+        
+        Returns:
+            Number of vectors reclaimed
+        """
+        try:
+            with self._lock:
+                if not self.tombstones:
+                    return 0
+                supports_remove = self._supports_remove()
+                
+            if supports_remove:
+                with self._rebuild_lock:
+                    reclaimed = self._remove_dead()
+            else:
+                reclaimed = self._rebuild("compaction")
+                    
+            if reclaimed is None:
+                # The database was cleared or reloaded meanwhile
+                return 0
+            
+            logger.info("Index compacted" if supports_remove else "Index rebuilt during compaction",
+                       reclaimed=reclaimed, total_vectors=self.index.ntotal)
+            return reclaimed
+            
+        except Exception as e:
+            logger.error("Failed to compact index", error=str(e))
+            return 0
+    
+    def _remove_dead(self) -> Optional[int]:
+        """
+        Remove tombstoned vectors from a copy of the index and swap it in (caller holds `_rebuild_lock`).
+        
+        Returns:
+            Number of vectors reclaimed, or None if the database was cleared or
+            reloaded meanwhile
+        """
+        with self._lock:
+            index = self.index
+            mapped = self._index_mapped
+            generation = self._generation
+            dead = np.array(sorted(self.tombstones), dtype=np.int64)
+            dead = dead[~self.delta.view().contains(dead)]
+        
+        if not len(dead):
+            return 0
+        
+        new_index = self._copy_index(index, mapped)
+        reclaimed = int(new_index.remove_ids(dead))
+        
+        with self._lock:
+            if generation != self._generation:
+                return None
+            self.index = new_index
+            self._index_mapped = False
+            self.tombstones.difference_update(dead.tolist())
+            self._publish()
+        
+        return reclaimed
+    
+    def rebuild_index(self, reason: str = "manual") -> int:
+        """
+        Rebuild the index from the live vectors with the configured parameters.
+        
+        Applies changed HNSW settings (`vector_hnsw_m`,
+        `vector_hnsw_ef_construction`) or precision to a saved index, and drops
+        deleted vectors. IVF indexes are retrained. Like compaction, the new
+        index is built outside the lock and swapped in.
+        
+        Args:
+            reason: Why the index is rebuilt, for logging
+            
+        Returns:
+            Number of vectors reclaimed
+        """
+        try:
+            reclaimed = self._rebuild(reason)
+            if reclaimed is None:
+                return 0
+            
+            logger.info("Index rebuilt", reason=reason, reclaimed=reclaimed, total_vectors=self.index.ntotal)
+            return reclaimed
+            
+        except Exception as e:
+            logger.error("Failed to rebuild index", reason=reason, error=str(e))
+            return 0
+    
+    def _schedule_rebuild(self, reason: str) -> None:
+        """Start a background rebuild unless one is already running."""
+        with self._lock:
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                return
+            
+            self._rebuild_thread = threading.Thread(
+                target=self.rebuild_index,
+                kwargs={'reason': reason},
+                name="vector-db-rebuild",
+                daemon=True
+            )
+            self._rebuild_thread.start()
+    
+    def _rebuild(self, reason: str) -> Optional[int]:
+        """
+        Build a new index of the configured type from the live vectors and swap it in.
+        
+        Returns:
+            Number of vectors reclaimed, or None if the database was cleared or
+            reloaded while rebuilding
+        """
+        with self._rebuild_lock:
+            if self._ivf_index() is not None and len(self.chunks):
+                # IVF lists are retrained on the live vectors, which are re-encoded anyway
+                return self._train_ivf(None, reason)
+            
+            _use_faiss_threads(settings.vector_build_threads)
+            new_index = self._create_index()
+            if not new_index.is_trained:
+                # Scalar quantizer ranges are learned from a sample of the live vectors
+                with self._lock:
+                    sample_ids = uniform_training_sample(self.chunks.live_vector_ids())
+                    index, delta = self.index, self.delta.view()
+                if len(sample_ids):
+                    new_index.train(self._reconstruct(index, delta, sample_ids))
+            
+            return self._rebuild_index(new_index)
+    
+    def _rebuild_index(self, new_index, on_swap: Optional[Callable[[], None]] = None) -> Optional[int]:
+        """
+        Copy the live vectors into a new index and swap it in (caller holds `_rebuild_lock`).
+        
+        Vectors are read from the index and delta vectors as they were when the
+        rebuild started, which stay untouched while searches and ingestion go
+        on, and copied in batches of `REBUILD_BATCH`. Chunks added while copying
+        stay in the delta vectors at the swap; chunks removed after their batch
+        was copied stay tombstoned in the new index.
+        
+        Args:
+            new_index: Empty index to fill, trained unless it can train on the vectors
+            on_swap: Called under the lock right after the new index is swapped in
+            
+        Returns:
+            Number of vectors reclaimed, or None if the database was cleared or
+            reloaded while rebuilding
+        """
+        _use_faiss_threads(settings.vector_build_threads)
+        
+        with self._lock:
+            live_ids = self.chunks.live_vector_ids()
+            snapshot_next = self.next_index
+            generation = self._generation
+            index, delta = self.index, self.delta.view()
+        
+        copied = [np.empty(0, dtype=np.int64)]
+        for start in range(0, len(live_ids), REBUILD_BATCH):
+            with self._lock:
+                if generation != self._generation:
+                    return None
+                # Chunks removed since the snapshot are not copied
+                batch = live_ids[start:start + REBUILD_BATCH]
+                batch = batch[self.chunks.lookup_vectors(batch) >= 0]
+            
+            if len(batch):
+                vectors = self._reconstruct(index, delta, batch)
+                if not new_index.is_trained:
+                    new_index.train(vectors)
+                new_index.add_with_ids(vectors, batch)
+                copied.append(batch)
+        
+        with self._lock:
+            if generation != self._generation:
+                return None
+            
+            # Vectors added while rebuilding stay buffered for the next fold
+            new_delta = self.delta.drop(int(np.searchsorted(self.delta.view().ids, snapshot_next)))
+            kept_ids = new_delta.view().ids
+            live_ids = self.chunks.live_vector_ids()
+            
+            reclaimed = self.index.ntotal + len(self.delta) - new_index.ntotal - len(new_delta)
+            self.index = new_index
+            self._index_mapped = False
+            self.delta = new_delta
+            self.tombstones = set(np.setdiff1d(np.concatenate(copied + [kept_ids]), live_ids).tolist())
+            
+            if on_swap is not None:
+                on_swap()
+            self._publish()
+        
+        return reclaimed
+    
+    def _reconstruct(self, index, delta: DeltaView, vector_ids: np.ndarray) -> np.ndarray:
+        """Vectors of ids held by an index or delta vectors."""
+        vectors = np.empty((len(vector_ids), self.embedding_dim), dtype=np.float32)
+        buffered = delta.contains(vector_ids)
+        if buffered.any():
+            vectors[buffered] = delta.reconstruct(vector_ids[buffered])
+        if not buffered.all():
+            vectors[~buffered] = index.reconstruct_batch(vector_ids[~buffered])
+        return vectors
+    
+    def train_ivf(self, nlist: Optional[int] = None, reason: str = "manual") -> bool:
+        """
+        Train IVF lists on a sample of the live vectors and rebuild the index on them.
+        
+        Runs in the background when an "ivf" or "ivfpq" database has staged
+        `vector_ivf_train_min` vectors, when the corpus outgrows its list count,
+        or when new vectors drift away from the centroids. Searches keep using
+        the current index until the retrained one is swapped in.
+        
+        Args:
+            nlist: Number of lists; defaults to `choose_nlist` for the corpus size
+            reason: Why the index is trained, for logging
+            
+        Returns:
+            True if a trained index was swapped in
+        """
+        if self.index_type not in IVF_INDEX_TYPES:
+            return False
+        
+        try:
+            with self._rebuild_lock:
+                return self._train_ivf(nlist, reason) is not None
+            
+        except Exception as e:
+            logger.error("Failed to train IVF index", reason=reason, error=str(e))
+            return False
+    
+    def _train_ivf(self, nlist: Optional[int], reason: str) -> Optional[int]:
+        """
+        Train and swap in a new IVF index (caller holds `_rebuild_lock`).
+        
+        Returns:
+            Number of vectors reclaimed, or None if no index was swapped in
+        """
+        start_time = time.perf_counter()
+        _use_faiss_threads(settings.vector_build_threads)
+        
+        with self._lock:
+            live_ids = self.chunks.live_vector_ids()
+            if not len(live_ids):
+                return None
+            index, delta = self.index, self.delta.view()
+        
+        sample = self._reconstruct(index, delta, uniform_training_sample(live_ids))
+        
+        nlist = min(nlist or choose_nlist(len(live_ids)), len(sample))
+        new_index = self._create_index(nlist)
+        new_index.train(sample)
+        
+        ivf = self._find_ivf(new_index)
+        drift = CentroidDrift.from_index(ivf)
+        drift.baseline = drift.error(sample)
+        
+        def on_swap():
+            self._ivf_drift = drift
+        
+        reclaimed = self._rebuild_index(new_index, on_swap)
+        if reclaimed is None:
+            return None
+        
+        logger.info("IVF index trained", 
+                   reason=reason,
+                   index_type=self.index_type,
+                   nlist=nlist,
+                   nprobe=ivf.nprobe,
+                   code_size=ivf.code_size,
+                   training_vectors=len(sample),
+                   total_vectors=new_index.ntotal,
+                   reclaimed=reclaimed,
+                   seconds=round(time.perf_counter() - start_time, 3))
+        
+        if self.segment_log is not None:
+            # Save the trained index so reopening does not train again
+            self._schedule_merge()
+        
+        return reclaimed
+    
+    def _background_train_ivf(self) -> None:
+        """Train until no trigger is left, as chunks added while training may call for another round."""
+        while True:
+            with self._lock:
+                reason = self._ivf_training_reason()
+            if reason is None or not self.train_ivf(reason=reason):
+                return
+    
+    def _ivf_training_reason(self) -> Optional[str]:
+        """Why the IVF index should be (re)trained now, or None (caller holds the lock)."""
+        if self.index_type not in IVF_INDEX_TYPES:
+            return None
+        
+        ivf = self._ivf_index()
+        live = len(self.chunks)
+        if ivf is None:
+            train_min = settings.vector_ivf_train_min
+            if self.index_type == "ivfpq":
+                train_min = max(train_min, PQ_MIN_TRAINING_VECTORS)
+            return "initial" if live >= train_min else None
+        if ivf.metric_type != self._faiss_metric():
+            # Saved before the IVF quantizer honoured the configured metric
+            return "metric"
+        if settings.vector_ivf_nlist and ivf.nlist != settings.vector_ivf_nlist:
+            return "nlist"
+        if not settings.vector_ivf_nlist and choose_nlist(live) >= 2 * ivf.nlist:
+            return "growth"
+        if self._ivf_drift is not None and self._ivf_drift.has_drifted():
+            return "drift"
+        return None
+    
+    def _schedule_ivf_training(self) -> None:
+        """Start background IVF training if it is due and not already running."""
+        with self._lock:
+            if self._ivf_thread is not None and self._ivf_thread.is_alive():
+                return
+            
+            if self._ivf_training_reason() is None:
+                return
+            
+            self._ivf_thread = threading.Thread(
+                target=self._background_train_ivf,
+                name="vector-db-ivf-training",
+                daemon=True
+            )
+            self._ivf_thread.start()
+    
+    def replace_document(self, 
+                         document_id: str, 
+                         content_hash: str,
+                         chunks: List[Dict[str, Any]], 
+                         embeddings: List[np.ndarray]) -> Dict[str, Any]:
+        """
+        Add a document, atomically swapping out the chunks of its previous version.
+        
+        Searches never observe a mix of old and new chunks: the old chunks are
+        removed and the new ones added under the database lock.
+        
+        Args:
+            document_id: Stable document identifier (e.g. original file name)
+            content_hash: Hash of the document content
+            chunks: New chunks of the document
+            embeddings: Embeddings of the new chunks
+            
+        Returns:
+            Dictionary with the status ("added" or "replaced") and chunk counts
+        """
+        # One lock hold and one log segment for the whole swap
+        with self._log_batch():
+            chunk_ids = self.add_chunks(chunks, embeddings, content_hash) if chunks else []
+            return self.commit_document(document_id, content_hash, chunk_ids)
+    
+    def commit_document(self, document_id: str, content_hash: str, chunk_ids: List[int]) -> Dict[str, Any]:
+        """
+        Register chunks already added with `add_chunks` as the current version of a document.
+        
+        Streaming ingestion stages a document's chunks batch by batch and
+        commits them at the end. The staged chunks are published and the
+        previous version removed in one batch, so searches see either version
+        but never both. Visible chunks tagged with this `document_id` that
+        belong to no version are removed too.
+        
+        Args:
+            document_id: Stable document identifier (e.g. original file name)
+            content_hash: Hash of the document content
+            chunk_ids: Chunk IDs of the new version
+            
+        Returns:
+            Dictionary with the status ("added" or "replaced") and chunk counts
+        """
+        with self._log_batch():
+            previous = self.documents.get(document_id)
+            stale = set(previous['chunk_ids']) if previous else set()
+            # Other ingestions of the document may be staging chunks meanwhile
+            stale.update(self.chunks.chunk_ids_of(self.chunks.snapshot().select({'document_id': document_id})))
+            stale.difference_update(chunk_ids)
+            removed = self.remove_chunks(sorted(stale)) if stale else 0
+            
+            if self.chunks.publish(chunk_ids):
+                self._log(("publish", list(chunk_ids)))
+            
+            self.documents[document_id] = {
+                'content_hash': content_hash,
+                'chunk_ids': list(chunk_ids),
+                'updated_at': self._get_timestamp()
+            }
+            self._log(("document", document_id, self.documents[document_id]))
+        
+        self._schedule_fold(committed=True)
+        
+        status = "replaced" if previous else "added"
+        logger.info("Document stored", 
+                   document_id=document_id,
+                   status=status,
+                   chunks_added=len(chunk_ids),
+                   chunks_removed=removed)
+        
+        return {
+            'document_id': document_id,
+            'status': status,
+            'chunks_added': len(chunk_ids),
+            'chunks_removed': removed
+        }
+    
+    def remove_document(self, document_id: str) -> int:
+        """
+        Remove a document and all of its chunks.
+        
+        Args:
+            document_id: Document identifier
+            
+        Returns:
+            Number of chunks removed
+        """
+        with self._log_batch():
+            document = self.documents.pop(document_id, None)
+            if document is None:
+                return 0
+            self._log(("document", document_id, None))
+            return self.remove_chunks(document['chunk_ids'])
+    
+    def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Get the registry entry (content hash, chunk IDs) of a document."""
+        return self.documents.get(document_id)
+    
+    def is_document_current(self, document_id: str, content_hash: str) -> bool:
+        """
+        Check whether a document is stored with this content.
+        
+        Only the document's own registry entry counts: identical content under
+        another ID does not make it current, so it is still registered (and a
+        changed document's old chunks are still replaced).
+        
+        Args:
+            document_id: Document identifier
+            content_hash: Hash of the document content
+            
+        Returns:
+            True if ingesting the document again would change nothing
+        """
+        document = self.documents.get(document_id)
+        return document is not None and document['content_hash'] == content_hash
+    
+    @contextmanager
+    def _log_batch(self):
+        """
+        Hold the lock and collect the operations logged inside into one segment.
+        
+        Batches nest; the segment is written when the outermost batch exits,
+        before the lock is released, so segments are in apply order. Only then
+        are the changes published to searches, all at once.
+        """
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    try:
+                        self._flush_log()
+                    finally:
+                        self._publish()
+    
+    def _publish(self) -> None:
+        """
+        Publish the current index, delta vectors and chunks as the snapshot searches read (caller holds the lock).
+        
+        Writers never modify a published index: new vectors are buffered in
+        the delta, and folds, compactions and rebuilds swap in new indexes.
+        Delta and chunk views stop at the rows written so far, so searches
+        holding an older snapshot keep seeing exactly its contents.
+        """
+        self._snapshot = _Snapshot(self.index, self.delta.view(), self.chunks.snapshot(),
+                                   len(self.tombstones) + self.chunks.staged_count())
+    
+    def _log(self, op: Tuple) -> None:
+        """Queue an applied operation for the current segment (no-op without a segment log)."""
+        if self.segment_log is not None:
+            self._pending_ops.append(op)
+    
+    def _flush_log(self) -> None:
+        """Write queued operations as one segment and merge if enough segments piled up."""
+        if not self._pending_ops:
+            return
+        
+        ops, self._pending_ops = self._pending_ops, []
+        seq = self.segment_log.append(ops)
+        
+        if seq - self.segment_seq >= settings.vector_segment_merge_threshold:
+            self._schedule_merge()
+    
+    def _apply_ops(self, ops: List[Tuple]) -> None:
+        """Re-apply logged operations during replay (caller holds the lock)."""
+        for op in ops:
+            kind = op[0]
+            if kind in ("add", "stage"):
+                _, chunk_ids, entries, ids, vectors = op
+                if chunk_ids and isinstance(chunk_ids[0], str):
+                    # Logged before int64 chunk IDs; chunks take their vector IDs
+                    self.chunks.map_legacy_ids(chunk_ids, ids.tolist())
+                    chunk_ids = ids.tolist()
+                self._apply_add(chunk_ids, entries, ids, vectors, kind == "stage")
+            elif kind == "publish":
+                self.chunks.publish(op[1])
+            elif kind == "remove":
+                self._apply_remove(self._migrate_chunk_ids(op[1]))
+            elif kind == "document":
+                _, document_id, entry = op
+                if entry is None:
+                    self.documents.pop(document_id, None)
+                else:
+                    self.documents[document_id] = dict(entry, chunk_ids=self._migrate_chunk_ids(entry['chunk_ids']))
+            elif kind == "clear":
+                self._apply_clear()
+            else:
+                raise ValueError(f"Unknown segment operation: {kind}")
+    
+    def _migrate_chunk_ids(self, chunk_ids: List[Union[int, str]]) -> List[int]:
+        """Translate UUID string chunk IDs of older snapshots and segments to the int64 IDs that replaced them."""
+        migrated = []
+        for chunk_id in chunk_ids:
+            if isinstance(chunk_id, str):
+                chunk_id = self.chunks.legacy_chunk_id(chunk_id)
+                if chunk_id is None:
+                    continue  # Chunk is gone already
+            migrated.append(chunk_id)
+        return migrated
+    
+    def _schedule_merge(self) -> None:
+        """Start a background segment merge unless one is already running."""
+        with self._lock:
+            if self._merge_thread is not None and self._merge_thread.is_alive():
+                return
+            
+            self._merge_thread = threading.Thread(
+                target=self._background_merge,
+                name="vector-db-merge",
+                daemon=True
+            )
+            self._merge_thread.start()
+    
+    def _background_merge(self) -> None:
+        """Run a merge from the background thread, where errors can only be logged."""
+        try:
+            self.merge_segments()
+        except Exception:
+            pass  # Already logged; segments stay and are replayed or merged later
+    
+    def merge_segments(self) -> int:
+        """
+        Fold the logged segments into a new base snapshot and delete them.
+        
+        The index and metadata are serialized under the lock, then written and
+        swapped in without blocking searches or ingestion. Segments logged while
+        writing stay for the next merge. Staged chunks are left out of the base
+        and logged again in a segment after it, so ingestion never holds off
+        a merge.
+        
+        Returns:
+            Number of segments merged
+        """
+        if self.segment_log is None:
+            return 0
+        
+        try:
+            with self._merge_lock:
+                with self._lock:
+                    seq = self.segment_log.last_seq
+                    files = self._serialize_base(seq)
+                    self._carry_staged_chunks()
+                
+                names = write_snapshot(self.index_path, files)
+                merged = self.segment_log.truncate(seq)
+                
+                with self._lock:
+                    self.segment_seq = seq
+                    if self.mmap and self.segment_log.last_seq == seq and not self._pending_ops:
+                        # Nothing changed while writing: serve chunks from the new
+                        # mapped table instead of the rows held in memory
+                        self.chunks = ChunkStore(self.embedding_dim,
+                                                 ChunkTable.load(self.index_path, mmap=True, files=names))
+                        self._publish()
+            
+            logger.info("Segments merged into base snapshot", 
+                       merged_segments=merged,
+                       segment_seq=seq,
+                       total_chunks=len(self.chunks))
+            
+            return merged
+            
+        except Exception as e:
+            logger.error("Failed to merge segments", error=str(e))
+            raise
+    
+    def _carry_staged_chunks(self) -> None:
+        """
+        Log the staged chunks again after the base being merged (caller holds the lock).
+        
+        The base leaves staged chunks out, and the segments that staged them
+        are about to be deleted, so their commit could not find them after a
+        restart. They are logged again under fresh vector ids, which the base
+        has never seen; the removal first drops the originals if the merge
+        does not complete and the old segments are replayed instead.
+        """
+        staged = self.chunks.staged_chunks()
+        if not staged:
+            return
+        
+        chunk_ids = [chunk_id for chunk_id, _, _ in staged]
+        entries = [entry for _, _, entry in staged]
+        vectors = self._reconstruct(self.index, self.delta.view(),
+                                    np.array([vector_id for _, vector_id, _ in staged], dtype=np.int64))
+        ids = np.arange(self.next_index, self.next_index + len(staged), dtype=np.int64)
+        self.next_index += len(staged)
+        
+        self.segment_log.append([("remove", chunk_ids), ("stage", chunk_ids, entries, ids, vectors)])
+        logger.info("Staged chunks carried past the merge", staged_chunks=len(staged))
+    
+    def _serialize_base(self, segment_seq: int) -> Dict[str, bytes]:
+        """Serialize the index and metadata as base snapshot files (caller holds the lock)."""
+        # Chunks go to the columnar table; the pickle only holds small state
+        metadata_data = {
+            'next_index': self.next_index,
+            # Staged chunks are not serialized, so their vectors count as removed
+            'tombstones': sorted(self.tombstones.union(self.chunks.staged_vector_ids().tolist())),
+            'documents': self.documents,
+            'segment_seq': segment_seq,
+            'embedding_dim': self.embedding_dim,
+            'index_type': self.index_type,
+            'metric': self.metric,
+            'precision': self.precision,
+            'ivf_drift': self._ivf_drift.get_state() if self._ivf_drift is not None else None
+        }
+        
+        files = self.chunks.serialize()
+        files.update(self.delta.serialize())
+        files[INDEX_FILE] = faiss.serialize_index(self.index).tobytes()
+        files[METADATA_FILE] = pickle.dumps(metadata_data, protocol=pickle.HIGHEST_PROTOCOL)
+        return files
+    
+    def _attach(self, path: Path) -> None:
+        """Make a directory this database's home: later changes are logged there."""
+        self.index_path = path
+        if settings.vector_segment_log:
+            self.segment_log = SegmentLog(str(path / SEGMENTS_DIR))
+    
+    def _is_own_path(self, path: Path) -> bool:
+        """Whether a path is this database's index directory."""
+        return self.index_path is not None and path.resolve() == self.index_path.resolve()
+    
     def save_index(self, path: Optional[str] = None) -> None:
         """
         Save the FAISS index and metadata to disk.
         
+        With the segment log enabled, saving to the database's own path merges
+        pending segments into the base snapshot; changes are already durable
+        without it. A snapshot is written as a new generation of files and
+        switched to by its manifest, so a crash mid-save keeps the previous
+        snapshot. An in-memory database adopts `path` as its own.
+        
         Args:
             path: Optional custom path to save the index
         """
         try:
+            if path is None and self.index_path is None:
+                raise ValueError("In-memory database: pass a path to save_index")
             save_path = Path(path) if path else self.index_path
+            if self.index_path is None:
+                self._attach(save_path)
             
-            # Save FAISS index
-            index_file = save_path / "faiss_index.bin"
-            faiss.write_index(self.index, str(index_file))
-            
-            # Save metadata
-            metadata_file = save_path / "metadata.pkl"
-            metadata_data = {
-                'chunk_metadata': self.chunk_metadata,
-                'chunk_id_to_index': self.chunk_id_to_index,
-                'index_to_chunk_id': self.index_to_chunk_id,
-                'next_index': self.next_index,
-                'embedding_dim': self.embedding_dim,
-                'index_type': self.index_type,
-                'metric': self.metric
-            }
+            if self.segment_log is not None and self._is_own_path(save_path):
+                self.merge_segments()
+                return
             
-            with open(metadata_file, 'wb') as f:
-                pickle.dump(metadata_data, f)
+            save_path.mkdir(parents=True, exist_ok=True)
+            
+            with self._lock:
+                # Exports carry no segments, so they start a fresh sequence
+                files = self._serialize_base(0)
+                
+            names = write_snapshot(save_path, files)
             
             logger.info("Index saved successfully", 
-                       index_file=str(index_file),
-                       metadata_file=str(metadata_file),
+                       index_file=str(save_path / names[INDEX_FILE]),
+                       metadata_file=str(save_path / names[METADATA_FILE]),
                        total_chunks=self.index.ntotal)
             
         except Exception as e:
@@ -288,6 +1502,11 @@ class VectorDatabase:
         """
         Load the FAISS index and metadata from disk.
         
+        Loading from the database's own path replays segments logged after the
+        base snapshot. Loading from another path replaces this database's
+        contents, which are then saved as its new base snapshot. An in-memory
+        database adopts `path` as its own.
+        
         Args:
             path: Optional custom path to load the index from
             
@@ -295,26 +1514,105 @@ class VectorDatabase:
             True if index was loaded successfully, False otherwise
         """
         try:
+            if path is None and self.index_path is None:
+                logger.info("In-memory database has no index to load")
+                return False
             load_path = Path(path) if path else self.index_path
+            if self.index_path is None:
+                self._attach(load_path)
+            own_path = self._is_own_path(load_path)
+            replay = self.segment_log is not None and own_path
+            
+            names = {}
+            if load_path.exists():
+                # Clean up after a snapshot write interrupted by a crash
+                recover_replaced_files(load_path)
+                names = read_manifest(load_path).get("files", {})
             
-            index_file = load_path / "faiss_index.bin"
-            metadata_file = load_path / "metadata.pkl"
+            index_file = load_path / names.get(INDEX_FILE, INDEX_FILE)
+            metadata_file = load_path / names.get(METADATA_FILE, METADATA_FILE)
             
-            if not index_file.exists() or not metadata_file.exists():
+            has_base = index_file.exists() and metadata_file.exists()
+            
+            if not has_base and not (replay and len(self.segment_log)):
                 logger.info("No existing index found to load")
                 return False
             
-            # Load FAISS index
-            self.index = faiss.read_index(str(index_file))
+            table = None
+            mapped = False
+            
+            if has_base:
+                # Load FAISS index
+                index, mapped = self._read_index(index_file)
+                
+                # Load metadata
+                with open(metadata_file, 'rb') as f:
+                    metadata_data = pickle.load(f)
+                
+                if isinstance(metadata_data, list):
+                    metadata_data = self._convert_store_metadata(metadata_data)
+                
+                if 'chunk_metadata' not in metadata_data:
+                    table = ChunkTable.load(load_path, mmap=self.mmap, files=names)
+                delta = DeltaVectors.load(load_path, self.embedding_dim, files=names)
+            else:
+                # Nothing merged yet, everything is in the segments
+                index = self._create_index()
+                delta = DeltaVectors(self.embedding_dim)
+                metadata_data = {'embedding_dim': self.embedding_dim, 'precision': self.precision}
             
-            # Load metadata
-            with open(metadata_file, 'rb') as f:
-                metadata_data = pickle.load(f)
+            # Snapshots written before the chunk table kept pickled dicts
+            legacy_maps = 'chunk_metadata' in metadata_data
             
-            self.chunk_metadata = metadata_data.get('chunk_metadata', {})
-            self.chunk_id_to_index = metadata_data.get('chunk_id_to_index', {})
-            self.index_to_chunk_id = metadata_data.get('index_to_chunk_id', {})
-            self.next_index = metadata_data.get('next_index', 0)
+            with self._lock:
+                self.index = self._ensure_id_mapped(index)
+                self._index_mapped = mapped and self.index is index
+                self.delta = delta
+                self._prepare_ivf(metadata_data.get('ivf_drift'))
+                hnsw = self._hnsw_index()
+                if hnsw is not None:
+                    # M and efConstruction are part of the saved graph; the
+                    # default query depth follows the settings
+                    hnsw.hnsw.efSearch = settings.vector_hnsw_ef_search
+                if legacy_maps:
+                    self.chunks = ChunkStore.from_dicts(self.embedding_dim, metadata_data['chunk_metadata'],
+                                                        metadata_data.get('chunk_id_to_index', {}))
+                else:
+                    self.chunks = ChunkStore(self.embedding_dim, table)
+                self.next_index = metadata_data.get('next_index', 0)
+                self.tombstones = set(metadata_data.get('tombstones', []))
+                self.documents = {
+                    document_id: dict(entry, chunk_ids=self._migrate_chunk_ids(entry['chunk_ids']))
+                    for document_id, entry in metadata_data.get('documents', {}).items()
+                }
+                self.precision = metadata_data.get('precision', 'float32')
+                self._generation += 1
+                
+                replayed = 0
+                if replay:
+                    self.segment_seq = metadata_data.get('segment_seq', 0)
+                    for seq, ops in self.segment_log.replay(after_seq=self.segment_seq):
+                        self._apply_ops(ops)
+                        replayed += 1
+                    self.segment_log.skip_to(self.segment_seq)
+                
+                # Staged by an ingestion that stopped before committing
+                uncommitted = self.chunks.staged_chunk_ids()
+            
+                self._publish()
+            
+            if uncommitted:
+                self.remove_chunks(uncommitted)
+            
+            if self.segment_log is not None and not own_path:
+                # Segments of the previous contents no longer apply
+                self.merge_segments()
+            
+            # Chunks flagged by the old soft-delete become real removals
+            flagged = [chunk_id for chunk_id, data in metadata_data['chunk_metadata'].items()
+                       if data.get('removed')] if legacy_maps else []
+            if flagged:
+                self.remove_chunks(self._migrate_chunk_ids(flagged))
             
             # Validate loaded data
             if metadata_data.get('embedding_dim') != self.embedding_dim:
@@ -325,8 +1623,19 @@ class VectorDatabase:
             logger.info("Index loaded successfully", 
                        index_file=str(index_file),
                        metadata_file=str(metadata_file),
-                       total_chunks=self.index.ntotal,
-                       metadata_count=len(self.chunk_metadata))
+                       replayed_segments=replayed,
+                       mmap=self._index_mapped,
+                       total_chunks=len(self.chunks),
+                       dead_vectors=len(self.tombstones),
+                       metadata_count=len(self.chunks))
+            
+            self._schedule_fold()
+            self._schedule_ivf_training()
+            
+            hnsw = self._hnsw_index()
+            if hnsw is not None and hnsw.metric_type != self._faiss_metric():
+                # Saved before HNSW graphs honoured the configured metric
+                self._schedule_rebuild("metric")
             
             return True
             
@@ -338,7 +1647,114 @@ class VectorDatabase:
         """Load existing index during initialization."""
         self.load_index()
     
-    def get_chunk_by_id(self, chunk_id: str) -> Optional[Dict[str, Any]]:
+    def _read_index(self, index_file: Path) -> Tuple[Any, bool]:
+        """
+        Read a FAISS index file, memory-mapped read-only when mmap is enabled.
+        
+        Mapped vectors stay in the page cache, shared by every process that maps
+        the same file. Falls back to a regular read if the index cannot be mapped.
+        
+        Returns:
+            (index, whether it is mapped)
+        """
+        if self.mmap:
+            try:
+                # IFC maps flat code arrays in place; plain MMAP only covers IVF lists
+                flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+                return faiss.read_index(str(index_file), flags), True
+            except Exception as e:
+                logger.warning("Memory-mapped index load failed, reading into memory", error=str(e))
+        
+        return faiss.read_index(str(index_file)), False
+    
+    def _prepare_ivf(self, drift_state: Optional[Dict[str, Any]]) -> None:
+        """Set up a loaded IVF index for id lookups, the configured nprobe and drift tracking (caller holds the lock)."""
+        ivf = self._ivf_index()
+        if ivf is None:
+            self._ivf_drift = None
+            return
+        
+        if self._is_refined():
+            # Vectors are looked up in the re-ranker, which takes the configured depth
+            refine = faiss.downcast_index(faiss.downcast_index(self.index).index)
+            refine.k_factor = settings.vector_ivfpq_rerank
+        elif ivf.direct_map.type == faiss.DirectMap.NoMap:
+            # Saved before IVF indexes kept an id lookup table
+            self._ensure_index_writable()
+            ivf = self._ivf_index()
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        
+        ivf.nprobe = choose_nprobe(ivf.nlist)
+        self._ivf_drift = CentroidDrift.from_index(ivf, drift_state)
+    
+    @staticmethod
+    def _copy_index(index: Any, mapped: bool) -> Any:
+        """Copy an index for modification; clones of a memory-mapped index would still view its read-only file."""
+        if mapped:
+            return faiss.deserialize_index(faiss.serialize_index(index))
+        return faiss.clone_index(index)
+    
+    def _ensure_index_writable(self) -> None:
+        """Copy a memory-mapped index into memory before its first modification (caller holds the lock)."""
+        if not self._index_mapped:
+            return
+        
+        logger.info("Copying memory-mapped index into memory for writing", total_vectors=self.index.ntotal)
+        self.index = faiss.deserialize_index(faiss.serialize_index(self.index))
+        self._index_mapped = False
+    
+    def _convert_store_metadata(self, metadata_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Convert metadata saved by the old standalone VectorStore.
+        
+        That format was a plain list of chunk metadata dicts, one per vector
+        position; each chunk takes its position as chunk ID.
+        """
+        logger.info("Migrating vector store metadata", chunk_count=len(metadata_list))
+        
+        chunk_metadata = {}
+        chunk_id_to_index = {}
+        index_to_chunk_id = {}
+        
+        for position, metadata in enumerate(metadata_list):
+            chunk_metadata[position] = {
+                'text': metadata.get('text', ''),
+                'metadata': metadata,
+                'embedding_dim': self.embedding_dim,
+                'added_at': self._get_timestamp()
+            }
+            chunk_id_to_index[position] = position
+            index_to_chunk_id[position] = position
+        
+        return {
+            'chunk_metadata': chunk_metadata,
+            'chunk_id_to_index': chunk_id_to_index,
+            'index_to_chunk_id': index_to_chunk_id,
+            'next_index': len(metadata_list),
+            'embedding_dim': self.embedding_dim
+        }
+    
+    def _ensure_id_mapped(self, index):
+        """
+        Wrap an index saved before vectors had ids in an id map.
+        
+        Older flat/HNSW indexes addressed vectors by position, so their vectors
+        are re-added under ids 0..ntotal-1 (IVF indexes already carry those ids).
+        """
+        if isinstance(faiss.downcast_index(index), (faiss.IndexIDMap, faiss.IndexIVF)):
+            return index
+        
+        logger.info("Migrating index to id-mapped storage", total_vectors=index.ntotal)
+        
+        vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else None
+        mapped = self._create_index()
+        if vectors is not None:
+            if not mapped.is_trained:
+                mapped.train(vectors)
+            mapped.add_with_ids(vectors, np.arange(index.ntotal, dtype=np.int64))
+        return mapped
+    
+    def get_chunk_by_id(self, chunk_id: int) -> Optional[Dict[str, Any]]:
         """
         Get a chunk by its ID.
         
@@ -348,15 +1764,15 @@ class VectorDatabase:
         Returns:
             Chunk data if found, None otherwise
         """
-        return self.chunk_metadata.get(chunk_id)
+        return self._snapshot.chunks.get(chunk_id)
     
     def get_chunk_count(self) -> int:
         """Get the total number of chunks in the database."""
-        return self.index.ntotal
+        return len(self.chunks)
     
     def get_metadata_count(self) -> int:
         """Get the number of metadata entries."""
-        return len(self.chunk_metadata)
+        return len(self.chunks)
     
     def get_stats(self) -> Dict[str, Any]:
         """
@@ -366,26 +1782,74 @@ class VectorDatabase:
             Dictionary with database statistics
         """
         return {
-            'total_chunks': self.index.ntotal,
-            'metadata_count': len(self.chunk_metadata),
+            'total_chunks': len(self.chunks),
+            'metadata_count': len(self.chunks),
+            'document_count': len(self.documents),
+            'live_vectors': len(self.chunks),
+            'dead_vectors': len(self.tombstones),
+            'deleted_fraction': self._deleted_fraction(),
+            'compaction_running': self._compaction_thread is not None and self._compaction_thread.is_alive(),
+            'delta_vectors': len(self.delta),
+            'folding': self._fold_thread is not None and self._fold_thread.is_alive(),
+            'segment_log': self.segment_log.get_stats() if self.segment_log is not None else None,
+            'segment_seq': self.segment_seq,
             'embedding_dim': self.embedding_dim,
             'index_type': self.index_type,
             'metric': self.metric,
-            'index_path': str(self.index_path),
+            'precision': self.precision,
+            'vector_bytes': self.index.ntotal * self._bytes_per_vector() + self.delta.nbytes(),
+            'mmap': self._index_mapped,
+            'chunk_store': self.chunks.get_stats(),
+            'ivf': self._get_ivf_stats(),
+            'hnsw': self._get_hnsw_stats(),
+            'index_path': str(self.index_path) if self.index_path else None,
             'is_trained': getattr(self.index, 'is_trained', True)
         }
     
+    def _get_ivf_stats(self) -> Optional[Dict[str, Any]]:
+        """List count, probe depth and drift of an IVF database, None for other index types."""
+        if self.index_type not in IVF_INDEX_TYPES:
+            return None
+        
+        ivf = self._ivf_index()
+        return {
+            'trained': ivf is not None,
+            'nlist': ivf.nlist if ivf is not None else 0,
+            'nprobe': ivf.nprobe if ivf is not None else 0,
+            'code_size': ivf.code_size if ivf is not None else 0,  # Bytes per vector in the lists
+            'rerank': settings.vector_ivfpq_rerank if self.index_type == "ivfpq" else None,
+            'drift_ratio': self._ivf_drift.ratio() if self._ivf_drift is not None else None,
+            'training': self._ivf_thread is not None and self._ivf_thread.is_alive()
+        }
+    
+    def _get_hnsw_stats(self) -> Optional[Dict[str, Any]]:
+        """Graph parameters of an "hnsw" database, None for other index types."""
+        hnsw = self._hnsw_index()
+        if hnsw is None:
+            return None
+        
+        return {
+            'M': hnsw.hnsw.nb_neighbors(1),
+            'ef_construction': hnsw.hnsw.efConstruction,
+            'ef_search': hnsw.hnsw.efSearch,
+            'max_level': hnsw.hnsw.max_level,
+            'metric': "l2" if hnsw.metric_type == faiss.METRIC_L2 else "ip",
+            'rebuilding': self._rebuild_thread is not None and self._rebuild_thread.is_alive()
+        }
+    
+    def _bytes_per_vector(self) -> int:
+        """Bytes used to store one vector in the index (excluding graph/list overhead)."""
+        return int(getattr(self._get_storage_index(self.index), 'code_size', self.embedding_dim * 4))
+    
     def clear(self) -> None:
         """Clear all data from the vector database."""
         try:
-            # Reset index
-            self.index = self._create_index()
-            
-            # Clear metadata
-            self.chunk_metadata.clear()
-            self.chunk_id_to_index.clear()
-            self.index_to_chunk_id.clear()
-            self.next_index = 0
+            with self._log_batch():
+                self._apply_clear()
+                self._log(("clear",))
+                
+            # An empty snapshot makes every existing segment obsolete
+            self.merge_segments()
             
             logger.info("Vector database cleared")
             
@@ -393,72 +1857,229 @@ class VectorDatabase:
             logger.error("Failed to clear vector database", error=str(e))
             raise
     
-    def remove_chunk(self, chunk_id: str) -> bool:
+    def _apply_clear(self) -> None:
+        """Reset the index and all metadata (caller holds the lock)."""
+        # Fresh objects rather than cleared ones, which published snapshots still reference
+        self.index = self._create_index()
+        self._index_mapped = False
+        self.delta = DeltaVectors(self.embedding_dim)
+        
+        # Clear metadata
+        self.chunks = ChunkStore(self.embedding_dim)
+        self.next_index = 0
+        self.tombstones = set()
+        self.documents.clear()
+        self._ivf_drift = None
+        self._generation += 1
+    
+    def remove_chunk(self, chunk_id: int) -> bool:
         """
-        Remove a chunk from the database.
-        Note: FAISS doesn't support direct removal, so this is a placeholder.
+        Remove a chunk from the database (see remove_chunks).
         
         Args:
             chunk_id: The chunk ID to remove
             
         Returns:
-            True if chunk was found and marked for removal, False otherwise
+            True if chunk was found and removed, False otherwise
         """
-        if chunk_id not in self.chunk_metadata:
-            return False
-        
-        # Mark as removed (FAISS doesn't support direct removal)
-        self.chunk_metadata[chunk_id]['removed'] = True
-        logger.info("Chunk marked for removal", chunk_id=chunk_id)
-        return True
+        return self.remove_chunks([chunk_id]) == 1
     
     def search_by_metadata(self, 
                           metadata_filter: Dict[str, Any], 
                           query_vector: np.ndarray, 
-                          k: int = 5) -> List[Dict[str, Any]]:
+                          k: int = 5,
+                          nprobe: Optional[int] = None,
+                          ef_search: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Search chunks with metadata filtering.
         
+        Conditions on indexed fields (source_file, file_type, chunk_type,
+        table_name, document_id, page_number, ...) are resolved through the
+        chunk store's inverted indexes, and the search is restricted to the
+        matching vectors, so selective filters still return k results. Small
+        candidate sets are scored exactly. Other conditions are checked on the
+        hits, fetching deeper until k results match.
+        
         Args:
-            metadata_filter: Dictionary of metadata fields to filter by
+            metadata_filter: Condition by metadata field: a value, a list of
+                accepted values, or a range such as {"gte": 3, "lte": 7}
             query_vector: Query embedding vector
             k: Number of top results to return
+            nprobe: IVF lists to search, as in `query_top_k`
+            ef_search: HNSW candidate list size, as in `query_top_k`
             
         Returns:
             List of filtered results
         """
         try:
-            # Get all results first
-            all_results = self.query_top_k(query_vector, k * 2)  # Get more to account for filtering
+            snapshot = self._snapshot
+            if not len(snapshot.chunks):
+                logger.warning("Vector database is empty")
+                return []
             
-            # Filter by metadata
-            filtered_results = []
-            for result in all_results:
-                metadata = result.get('metadata', {})
+            query_vector = self._prepare_query(query_vector)
+                
+            indexed = {field: condition for field, condition in metadata_filter.items()
+                       if snapshot.chunks.can_select(field, condition)}
+            residual = {field: condition for field, condition in metadata_filter.items()
+                        if field not in indexed}
                 
-                # Check if all filter conditions are met
-                match = True
-                for key, value in metadata_filter.items():
-                    if key not in metadata or metadata[key] != value:
-                        match = False
-                        break
+            allowed = snapshot.chunks.select(indexed) if indexed else None
+            _use_faiss_threads(settings.vector_search_threads)
                 
-                if match:
-                    filtered_results.append(result)
-                    if len(filtered_results) >= k:
-                        break
+            if allowed is not None and not len(allowed):
+                hits = []
+            elif residual:
+                hits = self._search_with_residual(snapshot, query_vector, k, allowed, residual, nprobe, ef_search)
+            else:
+                hits = self._search_allowed(snapshot, query_vector, k, allowed, nprobe, ef_search)
+            
+            results = self._format_results(hits)
             
             logger.info("Metadata filtered search completed", 
                        filter=metadata_filter,
-                       total_results=len(all_results),
-                       filtered_results=len(filtered_results))
+                       candidates=len(allowed) if allowed is not None else len(snapshot.chunks),
+                       exact=allowed is not None and len(allowed) <= settings.vector_filter_exact_max,
+                       filtered_results=len(results))
             
-            return filtered_results
+            return results
             
         except Exception as e:
             logger.error("Failed to search with metadata filter", error=str(e))
             return []
     
+    def _search_with_residual(self,
+                              snapshot: _Snapshot,
+                              query_vector: np.ndarray,
+                              k: int,
+                              allowed: Optional[np.ndarray],
+                              residual: Dict[str, Any],
+                              nprobe: Optional[int] = None,
+                              ef_search: Optional[int] = None) -> List[Tuple[float, int, Dict[str, Any]]]:
+        """Search, keeping hits that meet the non-indexed conditions, doubling the depth until k match."""
+        candidates = len(allowed) if allowed is not None else len(snapshot.chunks)
+        fetch = min(k * 2, candidates)
+        
+        while True:
+            hits = self._search_allowed(snapshot, query_vector, fetch, allowed, nprobe, ef_search)
+            matched = [hit for hit in hits
+                       if all(matches_condition(hit[2]['metadata'].get(field), condition)
+                              for field, condition in residual.items())]
+            
+            if len(matched) >= k or fetch >= candidates:
+                return matched[:k]
+            fetch = min(fetch * 2, candidates)
+    
+    def _search_allowed(self,
+                        snapshot: _Snapshot,
+                        query_vector: np.ndarray,
+                        k: int,
+                        allowed: Optional[np.ndarray],
+                        nprobe: Optional[int] = None,
+                        ef_search: Optional[int] = None) -> List[Tuple[float, int, Dict[str, Any]]]:
+        """
+        Search only the vectors in `allowed` (all live vectors if None).
+        
+        Sets of up to `vector_filter_exact_max` vectors are scored exactly, since
+        approximate indexes can miss most of a tiny set; larger sets are passed
+        to FAISS as an ID selector.
+        """
+        if allowed is None:
+            return self._search_live(snapshot, query_vector, k, nprobe, ef_search)[0]
+        
+        k = min(k, len(allowed))
+        if len(allowed) <= settings.vector_filter_exact_max:
+            scores, indices = self._search_exact(snapshot, query_vector, k, allowed)
+        else:
+            scores, indices = self._search_selected(snapshot, query_vector, k, allowed, nprobe, ef_search)
+        
+        hits = []
+        for score, idx in zip(scores, indices):
+            chunk = snapshot.chunks.get_by_vector(int(idx)) if idx >= 0 else None
+            if chunk is not None:
+                hits.append((float(score), chunk[0], chunk[1]))
+        return hits
+    
+    def _search_exact(self,
+                      snapshot: _Snapshot,
+                      query_vector: np.ndarray,
+                      k: int,
+                      allowed: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Score every allowed vector against the query and return the best k (scores, ids)."""
+        vectors = self._reconstruct(snapshot.index, snapshot.delta, allowed)
+        if snapshot.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            scores = vectors @ query_vector[0]
+            order = np.argsort(-scores, kind="stable")[:k]
+        else:
+            scores = ((vectors - query_vector[0]) ** 2).sum(axis=1)
+            order = np.argsort(scores, kind="stable")[:k]
+        return scores[order], allowed[order]
+    
+    def _search_selected(self,
+                         snapshot: _Snapshot,
+                         query_vector: np.ndarray,
+                         k: int,
+                         allowed: np.ndarray,
+                         nprobe: Optional[int] = None,
+                         ef_search: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate search restricted to the allowed ids with a FAISS ID selector, exact over the delta vectors."""
+        buffered = snapshot.delta.contains(allowed)
+        metric = snapshot.index.metric_type
+        parts = [snapshot.delta.search(query_vector, k, metric, allowed=allowed[buffered])]
+        
+        allowed = allowed[~buffered]
+        if len(allowed):
+            parts.append(self._search_index_selected(snapshot.index, query_vector, k, allowed, nprobe, ef_search))
+        
+        scores, indices = merge_results(parts, k, metric)
+        return scores[0], indices[0]
+    
+    def _search_index_selected(self,
+                               index,
+                               query_vector: np.ndarray,
+                               k: int,
+                               allowed: np.ndarray,
+                               nprobe: Optional[int] = None,
+                               ef_search: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate search of an index restricted to the allowed ids (ascending) with a FAISS ID selector."""
+        # Filtered-out vectors still take up search effort, so widen the
+        # search in proportion to how selective the filter is
+        widen = index.ntotal / len(allowed)
+        
+        refined = self._is_refined(index)
+        id_bound = int(allowed.max()) + 1
+        if refined:
+            # The re-ranker ignores selectors passed through the id map, so the
+            # IVF lists are filtered on the id map positions of the allowed ids
+            allowed = np.flatnonzero(np.isin(faiss.vector_to_array(faiss.downcast_index(index).id_map), allowed))
+            id_bound = index.ntotal
+        
+        if len(allowed) * 64 >= id_bound:
+            # Dense sets: one bit per vector id is smaller and faster than a hash set
+            bitmap = np.packbits(np.isin(np.arange(id_bound), allowed), bitorder="little")
+            selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+        else:
+            bitmap = None
+            selector = faiss.IDSelectorBatch(allowed)
+        
+        inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+        ivf = self._ivf_index(index)
+        
+        if self.index_type == "hnsw":
+            params = faiss.SearchParametersHNSW(sel=selector)
+            params.efSearch = int(min(index.ntotal, max(ef_search or inner.hnsw.efSearch, k) * widen))
+        elif ivf is not None:
+            params = faiss.SearchParametersIVF(sel=selector)
+            params.nprobe = int(min(ivf.nlist, math.ceil((nprobe or ivf.nprobe) * widen)))
+            if refined:
+                params = self._refine_params(params)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        
+        scores, indices = index.search(query_vector, k, params=params)
+        del bitmap  # Referenced by the selector until the search is done
+        return scores, indices
+    
     def _get_timestamp(self) -> str:
         """Get current timestamp as string."""
         from datetime import datetime
@@ -466,11 +2087,11 @@ class VectorDatabase:
     
     def __len__(self) -> int:
         """Return the number of chunks in the database."""
-        return self.index.ntotal
+        return len(self.chunks)
     
-    def __contains__(self, chunk_id: str) -> bool:
+    def __contains__(self, chunk_id: int) -> bool:
         """Check if a chunk ID exists in the database."""
-        return chunk_id in self.chunk_metadata
+        return chunk_id in self._snapshot.chunks
 
 
 # Convenience functions for easy integration
@@ -530,7 +2151,8 @@ def get_default_vector_database() -> VectorDatabase:
         default_vector_db = VectorDatabase(
             embedding_dim=384,  # all-MiniLM-L6-v2 dimension
             index_type="flat",
-            index_path=str(Path(settings.faiss_index_path))
+            index_path=str(Path(settings.faiss_index_path)),
+            precision=settings.vector_index_precision
         )
     
     return default_vector_db
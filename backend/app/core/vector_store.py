@@ -1,17 +1,18 @@
 """
 Vector store management using FAISS
 """
-import pickle
+import asyncio
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Callable, Optional, Tuple
 
-import faiss
 import numpy as np
 # Import will be handled by embeddings module
 
 from .config import settings
 from .logging import get_logger
 from .embeddings import get_default_embedding_generator
+from .query_batcher import get_query_batcher
+from .vector_db import get_default_vector_database
 
 logger = get_logger("vector_store")
 
@@ -23,60 +24,47 @@ class VectorStore:
         self.index_path = Path(settings.faiss_index_path)
         self.index_path.mkdir(parents=True, exist_ok=True)
         
-        # Initialize embedding generator
-        self.embedding_generator = get_default_embedding_generator()
         self.embedding_dim = self.embedding_generator.embedding_dim
         
-        # Initialize FAISS index
-        self.index = faiss.IndexFlatIP(self.embedding_dim)  # Inner product for cosine similarity
-        self.metadata = []
-        self.is_trained = False
+        # Shares one index, metadata and document registry with the RAG pipeline
+        self.vector_db = get_default_vector_database()
         
-        # Load existing index if available
-        self._load_index()
+        logger.info("Vector store ready",
+                   index_size=len(self.vector_db),
+                   documents=len(self.vector_db.documents))
     
-    def _load_index(self) -> None:
-        """Load existing FAISS index and metadata"""
-        try:
-            index_file = self.index_path / "faiss_index.bin"
-            metadata_file = self.index_path / "metadata.pkl"
-            
-            if index_file.exists() and metadata_file.exists():
-                self.index = faiss.read_index(str(index_file))
-                with open(metadata_file, "rb") as f:
-                    self.metadata = pickle.load(f)
-                self.is_trained = True
-                
-                logger.info("Loaded existing FAISS index", 
-                           index_size=self.index.ntotal,
-                           metadata_count=len(self.metadata))
-            else:
-                logger.info("No existing index found, starting fresh")
-                
-        except Exception as e:
-            logger.error("Failed to load existing index", error=str(e))
-            # Start fresh if loading fails
-            self.index = faiss.IndexFlatIP(self.embedding_dim)
-            self.metadata = []
-            self.is_trained = False
+    @property
+    def embedding_generator(self):
+        """Default embedding generator, resolved per use so a model unloaded from the registry is reloaded"""
+        return get_default_embedding_generator()
+    
+    @property
+    def query_batcher(self):
+        """Query micro-batcher of the current embedding generator"""
+        return get_query_batcher(self.embedding_generator)
+    
+    @property
+    def is_trained(self) -> bool:
+        """Whether the store holds any searchable vectors"""
+        return len(self.vector_db) > 0
     
     def _save_index(self) -> None:
-        """Save FAISS index and metadata to disk"""
-        try:
-            index_file = self.index_path / "faiss_index.bin"
-            metadata_file = self.index_path / "metadata.pkl"
-            
-            faiss.write_index(self.index, str(index_file))
-            with open(metadata_file, "wb") as f:
-                pickle.dump(self.metadata, f)
-            
-            logger.info("Saved FAISS index", 
-                       index_size=self.index.ntotal,
-                       metadata_count=len(self.metadata))
-            
-        except Exception as e:
-            logger.error("Failed to save index", error=str(e))
-            raise
+        """Save FAISS index and metadata to disk (changes are already logged when the segment log is enabled)"""
+        if self.vector_db.segment_log is None:
+            self.vector_db.save_index()
+    
+    def _embed_documents(self, documents: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[np.ndarray]]:
+        """Generate embeddings for documents"""
+        logger.info("Generating embeddings", document_count=len(documents))
+        
+        # Convert documents to chunks format
+        chunks = [{"text": doc["text"], "metadata": doc["metadata"]} for doc in documents]
+        
+        # Generate embeddings (already normalized by the embedding generator)
+        chunks_with_embeddings = self.embedding_generator.generate_embeddings(chunks)
+        embeddings = [chunk["embedding"] for chunk in chunks_with_embeddings]
+        
+        return chunks, embeddings
     
     def add_documents(self, documents: List[Dict[str, Any]]) -> None:
         """Add documents to the vector store"""
@@ -85,111 +73,242 @@ class VectorStore:
                 logger.warning("No documents to add")
                 return
             
-            # Generate embeddings using the embedding generator
-            logger.info("Generating embeddings", document_count=len(documents))
-            
-            # Convert documents to chunks format
-            chunks = []
-            for doc in documents:
-                chunk = {
-                    "text": doc["text"],
-                    "metadata": doc["metadata"]
-                }
-                chunks.append(chunk)
+            chunks, embeddings = self._embed_documents(documents)
             
-            # Generate embeddings
-            chunks_with_embeddings = self.embedding_generator.generate_embeddings(chunks)
+            # Add to index
+            self.vector_db.add_chunks(chunks, embeddings)
             
-            # Extract embeddings and metadata
-            embeddings = np.array([chunk["embedding"] for chunk in chunks_with_embeddings])
-            metadatas = [chunk["metadata"] for chunk in chunks_with_embeddings]
+            # Save index
+            self._save_index()
             
-            # Embeddings are already normalized by the embedding generator
+            logger.info("Documents added to vector store",
+                       new_docs=len(documents),
+                       total_docs=len(self.vector_db))
             
-            # Add to index
-            self.index.add(embeddings.astype('float32'))
+        except Exception as e:
+            logger.error("Failed to add documents to vector store", error=str(e))
+            raise
+    
+    def is_document_current(self, document_id: str, content_hash: str) -> bool:
+        """Check whether this document is stored with this content"""
+        return self.vector_db.is_document_current(document_id, content_hash)
+    
+    def upsert_document(self,
+                        document_id: str,
+                        content_hash: str,
+                        documents: List[Dict[str, Any]],
+                        on_progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, Any]:
+        """
+        Add or replace all chunks of one source document.
+        
+        Unchanged documents (same content hash) are skipped without embedding;
+        a changed document's old chunks are swapped for the new ones atomically.
+        
+        Args:
+            document_id: Stable document identifier (e.g. "file:<file_id>" or a caller-chosen ID)
+            content_hash: Hash of the document content
+            documents: Chunks of the document with 'text' and 'metadata'
+            on_progress: Optional callback receiving ("embedded", chunks) and ("indexed", chunks)
+        
+        Returns:
+            Dictionary with the status ("added", "replaced" or "unchanged") and chunk counts
+        """
+        try:
+            if self.is_document_current(document_id, content_hash):
+                logger.info("Document unchanged, skipping", document_id=document_id)
+                return {
+                    "document_id": document_id,
+                    "status": "unchanged",
+                    "chunks_added": 0,
+                    "chunks_removed": 0
+                }
             
-            # Add metadata
-            self.metadata.extend(metadatas)
+            for doc in documents:
+                doc["metadata"]["document_id"] = document_id
+                doc["metadata"]["content_hash"] = content_hash
             
-            # Mark as trained
-            self.is_trained = True
+            chunks, embeddings = self._embed_documents(documents) if documents else ([], [])
+            if on_progress is not None:
+                on_progress("embedded", len(chunks))
             
-            # Save index
+            result = self.vector_db.replace_document(document_id, content_hash, chunks, embeddings)
             self._save_index()
+            if on_progress is not None:
+                on_progress("indexed", result["chunks_added"])
             
-            logger.info("Documents added to vector store", 
-                       new_docs=len(documents),
-                       total_docs=self.index.ntotal)
+            return result
             
         except Exception as e:
-            logger.error("Failed to add documents to vector store", error=str(e))
+            logger.error("Failed to upsert document", error=str(e), document_id=document_id)
             raise
     
-    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Search for similar documents"""
+    def embed_documents(self, documents: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[np.ndarray]]:
+        """Generate embeddings for one batch of chunks of a streamed document"""
+        return self._embed_documents(documents)
+    
+    def append_document_chunks(self,
+                               document_id: str,
+                               content_hash: str,
+                               chunks: List[Dict[str, Any]],
+                               embeddings: List[np.ndarray]) -> List[int]:
+        """
+        Stage one embedded batch of a streamed document, returning its chunk IDs.
+        
+        The chunks stay hidden from searches until `commit_document` publishes
+        them together with the removal of the previous version.
+        """
+        for chunk in chunks:
+            chunk["metadata"]["document_id"] = document_id
+            chunk["metadata"]["content_hash"] = content_hash
+        return self.vector_db.add_chunks(chunks, embeddings, content_hash, staged=True)
+    
+    def commit_document(self, document_id: str, content_hash: str, chunk_ids: List[int]) -> Dict[str, Any]:
+        """Publish the staged chunks as the current version of a document, removing the previous one"""
+        result = self.vector_db.commit_document(document_id, content_hash, chunk_ids)
+        self._save_index()
+        return result
+    
+    def abort_document(self, chunk_ids: List[int]) -> None:
+        """Remove the staged chunks of a streamed document that will not be committed"""
+        if chunk_ids and self.vector_db.remove_chunks(chunk_ids):
+            self._save_index()
+    
+    def remove_document(self, document_id: str) -> int:
+        """Remove a document and its chunks, returning the number of chunks removed"""
+        removed = self.vector_db.remove_document(document_id)
+        if removed:
+            self._save_index()
+        return removed
+    
+    def search(self,
+               query: str,
+               top_k: int = 5,
+               metadata_filter: Optional[Dict[str, Any]] = None,
+               ef_search: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Search for similar documents, optionally only among chunks matching a metadata filter"""
         try:
-            if not self.is_trained or self.index.ntotal == 0:
+            if not self.is_trained:
                 logger.warning("Vector store is empty or not trained")
                 return []
             
-            # Generate query embedding using the embedding generator
-            query_chunk = {
-                "text": query,
-                "metadata": {"chunk_type": "query"}
-            }
-            query_chunks = self.embedding_generator.generate_embeddings([query_chunk], use_cache=False)
-            query_embedding = query_chunks[0]["embedding"].reshape(1, -1)
-            
-            # Search
-            scores, indices = self.index.search(query_embedding.astype('float32'), top_k)
-            
-            # Prepare results
-            results = []
-            for score, idx in zip(scores[0], indices[0]):
-                if idx < len(self.metadata):
-                    result = {
-                        "text": self.metadata[idx].get("text", ""),
-                        "metadata": self.metadata[idx],
-                        "score": float(score)
-                    }
-                    results.append(result)
-            
-            logger.info("Vector search completed", 
-                       query=query,
-                       results_count=len(results),
-                       top_score=float(scores[0][0]) if len(scores[0]) > 0 else 0.0)
+            # Concurrent queries share one forward pass through the micro-batcher
+            query_embedding = self.query_batcher.embed_sync(query)
             
-            return results
+            return self._search_embedding(query, query_embedding, top_k, metadata_filter, ef_search)
             
         except Exception as e:
             logger.error("Failed to search vector store", error=str(e), query=query)
             return []
     
+    async def asearch(self,
+                      query: str,
+                      top_k: int = 5,
+                      metadata_filter: Optional[Dict[str, Any]] = None,
+                      ef_search: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Search for similar documents without blocking the event loop"""
+        try:
+            if not self.is_trained:
+                logger.warning("Vector store is empty or not trained")
+                return []
+            
+            query_embedding = await self.query_batcher.embed(query)
+            
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._search_embedding, query, query_embedding, top_k,
+                                              metadata_filter, ef_search)
+            
+        except Exception as e:
+            logger.error("Failed to search vector store", error=str(e), query=query)
+            return []
+    
+    def search_many(self, queries: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+        """
+        Search for many queries at once (evaluation jobs, multi-query RAG).
+        
+        All queries are embedded in one batch and searched with one FAISS call.
+        
+        Args:
+            queries: Query texts
+            top_k: Number of results per query
+        
+        Returns:
+            Results for each query, in the same format as `search`
+        """
+        try:
+            if not queries:
+                return []
+            
+            if not self.is_trained:
+                logger.warning("Vector store is empty or not trained")
+                return [[] for _ in queries]
+            
+            query_embeddings = self.query_batcher.embed_many(queries)
+            hits = self.vector_db.query_top_k_batch(query_embeddings, k=top_k)
+            results = [self._to_results(query_hits) for query_hits in hits]
+            
+            logger.info("Batch vector search completed",
+                       queries=len(queries),
+                       results_count=sum(len(r) for r in results))
+            
+            return results
+            
+        except Exception as e:
+            logger.error("Failed to batch search vector store", error=str(e), queries=len(queries))
+            return [[] for _ in queries]
+    
+    @staticmethod
+    def _to_results(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Convert vector database hits to search results"""
+        return [
+            {
+                "chunk_id": hit["chunk_id"],
+                "text": hit["text"],
+                "metadata": hit["metadata"],
+                "score": hit["similarity_score"]
+            }
+            for hit in hits
+        ]
+    
+    def _search_embedding(self,
+                          query: str,
+                          query_embedding: np.ndarray,
+                          top_k: int,
+                          metadata_filter: Optional[Dict[str, Any]] = None,
+                          ef_search: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Search the index with a precomputed query embedding"""
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        if metadata_filter:
+            hits = self.vector_db.search_by_metadata(metadata_filter, query_embedding, k=top_k, ef_search=ef_search)
+        else:
+            hits = self.vector_db.query_top_k(query_embedding, k=top_k, ef_search=ef_search)
+        
+        # Prepare results
+        results = self._to_results(hits)
+        
+        logger.info("Vector search completed",
+                   query=query,
+                   metadata_filter=metadata_filter,
+                   results_count=len(results),
+                   top_score=results[0]["score"] if results else 0.0)
+        
+        return results
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get vector store statistics"""
+        db_stats = self.vector_db.get_stats()
         return {
-            "total_documents": self.index.ntotal,
+            "total_documents": db_stats["total_chunks"],
+            "source_documents": db_stats["document_count"],
             "embedding_dimension": self.embedding_dim,
             "is_trained": self.is_trained,
-            "index_type": "FAISS IndexFlatIP"
+            "index_type": f"FAISS {db_stats['index_type']} ({db_stats['precision']})"
         }
     
     def clear(self) -> None:
         """Clear the vector store"""
         try:
-            self.index = faiss.IndexFlatIP(self.embedding_dim)
-            self.metadata = []
-            self.is_trained = False
-            
-            # Remove saved files
-            index_file = self.index_path / "faiss_index.bin"
-            metadata_file = self.index_path / "metadata.pkl"
-            
-            if index_file.exists():
-                index_file.unlink()
-            if metadata_file.exists():
-                metadata_file.unlink()
+            self.vector_db.clear()
+            self._save_index()
             
             logger.info("Vector store cleared")
             
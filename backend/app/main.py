@@ -7,8 +7,11 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
+from .core.chunker import close_pdf_pool
 from .core.config import settings
 from .core.logging import configure_logging, get_logger
+from .core.model_registry import get_model_registry
+from .core.query_batcher import close_query_batchers
 from .api import upload, database, ingest, chat
 from .models.schemas import HealthResponse, ErrorResponse
 
@@ -25,9 +28,19 @@ async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
     logger.info("PrivAI backend starting up", version=settings.app_version)
+    get_model_registry().preload(
+        settings.embedding_model,
+        use_quantization=settings.embedding_quantization,
+        backend=settings.embedding_backend
+    )
+    ingest.ingest_jobs.start()
     yield
     # Shutdown
     logger.info("PrivAI backend shutting down")
+    ingest.ingest_jobs.close()
+    close_query_batchers()
+    close_pdf_pool()
+    get_model_registry().unload_all()
 
 
 # Create FastAPI application
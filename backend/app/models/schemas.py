@@ -41,6 +41,7 @@ class IngestRequest(BaseModel):
     """Request model for data ingestion"""
     source_type: str = Field(..., description="Source type: 'files' or 'database'")
     file_ids: Optional[List[str]] = Field(None, description="List of file IDs to ingest")
+    document_ids: Optional[Dict[str, str]] = Field(None, description="Document ID per file ID; giving a file the ID of an indexed document replaces that document (defaults to a new document per file)")
     connection_id: Optional[str] = Field(None, description="Database connection ID")
     chunk_size: int = Field(1000, description="Chunk size for text splitting")
     chunk_overlap: int = Field(200, description="Overlap between chunks")
@@ -53,6 +54,22 @@ class IngestResponse(BaseModel):
     chunks_processed: int
     index_size: int
     processing_time: float
+    documents_added: int = 0
+    documents_replaced: int = 0
+    documents_unchanged: int = 0
+
+
+class IngestJobResponse(BaseModel):
+    """Response model for a background ingestion job"""
+    job_id: str
+    status: str = Field(..., description="queued, running, completed, failed or cancelled")
+    stage: Optional[str] = Field(None, description="Last stage that made progress: parsed, chunked, embedded or indexed")
+    progress: Dict[str, int] = Field(default_factory=dict, description="Documents parsed/skipped and chunks chunked/embedded/indexed so far")
+    result: Optional[IngestResponse] = None
+    error: Optional[str] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
 
 
 class ChatRequest(BaseModel):
@@ -60,6 +77,8 @@ class ChatRequest(BaseModel):
     query: str = Field(..., description="User query")
     top_k: int = Field(5, description="Number of top chunks to retrieve")
     use_local_llm: bool = Field(True, description="Whether to use local LLM or API fallback")
+    document_ids: Optional[List[str]] = Field(None, description="Only retrieve chunks from these documents (file document IDs or database table IDs)")
+    ef_search: Optional[int] = Field(None, ge=1, le=1024, description="HNSW search depth (1-1024): higher improves recall at the cost of latency (defaults to the server setting)")
 
 
 class ChatResponse(BaseModel):
@@ -0,0 +1,121 @@
+"""
+Benchmark chunk metadata storage
+
+Compares the memory footprint and lookup latency of plain dicts keyed by UUID
+strings (the previous pickled layout) against the columnar ChunkStore with
+int64 chunk ids, both in memory and loaded from a memory-mapped snapshot.
+
+Run from the backend directory:
+    python -m benchmarks.chunk_metadata --chunks 200000
+"""
+import argparse
+import gc
+import pickle
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from app.core.chunk_table import ChunkStore, ChunkTable, derive_chunk_id
+
+
+def make_chunks(count: int, dim: int):
+    """Create synthetic chunk entries shaped like VectorDatabase.add_chunks output, with UUID and int64 ids"""
+    legacy_ids = [str(uuid.uuid4()) for _ in range(count)]
+    chunk_ids = [derive_chunk_id(f"hash_{i // 50}", i % 50) for i in range(count)]
+    entries = []
+    for i in range(count):
+        document = f"document_{i // 50}.pdf"
+        entries.append({
+            "text": f"Synthetic chunk {i} " + "lorem ipsum " * 40,
+            "metadata": {
+                "document_id": document,
+                "source_file": document,
+                "file_name": document,
+                "file_type": ".pdf",
+                "chunk_type": "document",
+                "page_number": i % 50,
+                "chunk_index": i % 50
+            },
+            "embedding_dim": dim,
+            "added_at": datetime.now().isoformat()
+        })
+    return legacy_ids, chunk_ids, entries
+
+
+def measure(build):
+    """Return (result, traced bytes) for building a structure"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def lookup_us(get, chunk_ids, samples: int = 20000) -> float:
+    """Average microseconds per chunk lookup"""
+    picks = [chunk_ids[i] for i in np.random.default_rng(0).integers(0, len(chunk_ids), samples)]
+    start = time.perf_counter()
+    for chunk_id in picks:
+        get(chunk_id)
+    return (time.perf_counter() - start) / samples * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunk metadata storage")
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+
+    print("🚀 PrivAI Chunk Metadata Benchmark")
+    print("=" * 60)
+
+    print(f"Generating {args.chunks} chunks ...")
+    legacy_ids, chunk_ids, entries = make_chunks(args.chunks, args.dim)
+    vector_ids = list(range(args.chunks))
+
+    pickled = pickle.dumps({
+        "chunk_metadata": dict(zip(legacy_ids, entries)),
+        "chunk_id_to_index": dict(zip(legacy_ids, vector_ids)),
+        "index_to_chunk_id": dict(zip(vector_ids, legacy_ids))
+    })
+
+    def build_dicts():
+        # Loaded the way the pickled metadata used to be
+        data = pickle.loads(pickled)
+        return data["chunk_metadata"], data["chunk_id_to_index"], data["index_to_chunk_id"]
+
+    def build_store():
+        store = ChunkStore(args.dim)
+        store.add(chunk_ids, entries, vector_ids)
+        return store
+
+    dicts, dict_bytes = measure(build_dicts)
+    store, store_bytes = measure(build_store)
+
+    directory = Path(tempfile.mkdtemp(prefix="privai_chunks_"))
+    for name, data in store.serialize().items():
+        (directory / name).write_bytes(data)
+    mapped, mapped_bytes = measure(lambda: ChunkStore(args.dim, ChunkTable.load(directory, mmap=True)))
+
+    print(f"\n{'Layout':<10} {'heap MB':>9} {'bytes/chunk':>12} {'lookup us':>10}")
+    print("-" * 45)
+    for name, nbytes, get, ids in (
+        ("dicts", dict_bytes, dicts[0].get, legacy_ids),
+        ("columnar", store_bytes, store.get, chunk_ids),
+        ("mmap", mapped_bytes, mapped.get, chunk_ids),
+    ):
+        print(f"{name:<10} {nbytes / 2**20:>9.1f} {nbytes / args.chunks:>12.0f} "
+              f"{lookup_us(get, ids):>10.2f}")
+
+    ids_file = directory / "chunk_ids.npy"
+    print(f"\nChunk id column: {ids_file.stat().st_size / args.chunks:.1f} bytes/chunk on disk")
+
+
+if __name__ == "__main__":
+    main()
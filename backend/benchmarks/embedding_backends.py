@@ -0,0 +1,106 @@
+"""
+Benchmark embedding inference backends on CPU
+
+Compares fp32 torch, int8 dynamic-quantized torch, ONNX Runtime fp32 and
+ONNX Runtime int8 for throughput and parity with the fp32 embeddings.
+
+Run from the backend directory:
+    python -m benchmarks.embedding_backends
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+from app.core.embedding_backends import (
+    OnnxEmbeddingModel,
+    quantize_dynamic_int8,
+    check_backend_parity,
+    measure_throughput,
+    ONNXRUNTIME_AVAILABLE
+)
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+
+def load_benchmark_texts(count: int):
+    """Build a mixed workload of short queries and longer document chunks"""
+    queries_file = Path(__file__).resolve().parents[2] / "samples" / "sample_queries.txt"
+    queries = []
+    if queries_file.exists():
+        queries = [line.strip() for line in queries_file.read_text(encoding="utf-8").splitlines() if line.strip()]
+    if not queries:
+        queries = ["What is the fee policy?", "When are the mid-term exams?"]
+
+    paragraph = ("Students must maintain a minimum attendance of 75 percent in every course. "
+                 "Fees for the semester are due before the start of classes and late payment "
+                 "attracts a fine as per the college fee policy. ")
+
+    texts = []
+    for i in range(count):
+        if i % 3 == 0:
+            texts.append(paragraph * (1 + i % 4))
+        else:
+            texts.append(queries[i % len(queries)])
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threshold", type=float, default=0.99)
+    args = parser.parse_args()
+
+    if not SENTENCE_TRANSFORMERS_AVAILABLE:
+        print("❌ sentence-transformers is required for this benchmark")
+        return
+
+    print("⚡ PrivAI Embedding Backend Benchmark")
+    print("=" * 60)
+
+    texts = load_benchmark_texts(args.texts)
+    reference = SentenceTransformer(args.model, device="cpu")
+
+    backends = {
+        "torch fp32": lambda: reference,
+        "torch int8": lambda: quantize_dynamic_int8(reference),
+    }
+
+    export_dir = tempfile.mkdtemp(prefix="privai_onnx_")
+    if ONNXRUNTIME_AVAILABLE:
+        backends["onnx fp32"] = lambda: OnnxEmbeddingModel.from_sentence_transformer(
+            reference, export_dir, args.model, use_quantization=False)
+        backends["onnx int8"] = lambda: OnnxEmbeddingModel.from_sentence_transformer(
+            reference, export_dir, args.model, use_quantization=True)
+    else:
+        print("⚠️  onnxruntime not installed, skipping ONNX backends")
+
+    print(f"\n{'Backend':<12} {'texts/s':>10} {'speedup':>9} {'min cos':>9} {'mean cos':>9} {'parity':>7}")
+    print("-" * 60)
+
+    baseline = None
+    for name, load in backends.items():
+        try:
+            model = load()
+            throughput = measure_throughput(model, texts, batch_size=args.batch_size)
+            parity = check_backend_parity(reference, model, texts[:64], threshold=args.threshold)
+
+            if baseline is None:
+                baseline = throughput["texts_per_second"]
+
+            speedup = throughput["texts_per_second"] / baseline if baseline else 0.0
+            print(f"{name:<12} {throughput['texts_per_second']:>10.1f} {speedup:>8.2f}x "
+                  f"{parity['min_cosine']:>9.4f} {parity['mean_cosine']:>9.4f} "
+                  f"{'✅' if parity['passed'] else '❌':>6}")
+
+        except Exception as e:
+            print(f"{name:<12} ❌ failed: {e}")
+
+
+if __name__ == "__main__":
+    main()
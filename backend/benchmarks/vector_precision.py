@@ -0,0 +1,117 @@
+"""
+Benchmark reduced-precision vector storage
+
+Compares float32, float16 and int8 scalar-quantized FAISS indexes for
+recall@k against exact float32 search, query latency and vector memory,
+plus the footprint and round-trip error of a float16 embedding cache.
+
+Run from the backend directory:
+    python -m benchmarks.vector_precision --vectors 200000
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.vector_db import VectorDatabase, INDEX_PRECISIONS
+from app.core.embedding_cache import EmbeddingCache
+
+
+def make_embeddings(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clustered, L2-normalized vectors that resemble sentence embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(count // 500, 8), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), count)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Ground-truth neighbours by brute-force inner product"""
+    scores = queries @ corpus.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def benchmark_index(precision: str, index_type: str, corpus: np.ndarray,
+                    queries: np.ndarray, truth: np.ndarray, k: int):
+    """Build one index and measure recall, latency and memory"""
+    db = VectorDatabase(
+        index_path=tempfile.mkdtemp(prefix="privai_precision_"),
+        embedding_dim=corpus.shape[1],
+        index_type=index_type,
+        precision=precision
+    )
+
+    chunks = [{"text": "", "metadata": {}} for _ in range(len(corpus))]
+
+    start = time.perf_counter()
+    db.add_chunks(chunks, list(corpus))
+    build_seconds = time.perf_counter() - start
+
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        _, indices = db.index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        found.append(indices[0])
+
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+
+    return {
+        "recall": float(recall),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "vector_mb": db.get_stats()["vector_bytes"] / 1e6,
+        "build_s": build_seconds
+    }
+
+
+def benchmark_cache(corpus: np.ndarray):
+    """Compare float32 and float16 embedding cache footprint and error"""
+    sample = corpus[:10000]
+    keys = [f"{i:032x}" for i in range(len(sample))]
+
+    print(f"\n{'Cache dtype':<12} {'bytes/row':>10} {'MB/1M rows':>11} {'max abs err':>12}")
+    print("-" * 48)
+
+    for dtype in ("float32", "float16"):
+        cache = EmbeddingCache(tempfile.mkdtemp(prefix="privai_cache_"), sample.shape[1], dtype=dtype)
+        cache.put_many(keys, sample)
+        _, restored = cache.get_many(keys)
+        error = float(np.abs(restored - sample).max())
+        print(f"{dtype:<12} {cache.row_bytes:>10} {cache.row_bytes:>11} {error:>12.2e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reduced-precision vector storage")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index-type", default="flat", choices=["flat", "ivf", "hnsw"])
+    args = parser.parse_args()
+
+    print("📦 PrivAI Vector Precision Benchmark")
+    print("=" * 60)
+    print(f"{args.vectors} vectors x {args.dim} dims, {args.queries} queries, recall@{args.k}, {args.index_type} index")
+
+    corpus = make_embeddings(args.vectors, args.dim)
+    queries = make_embeddings(args.queries, args.dim, seed=1)
+    truth = exact_top_k(corpus, queries, args.k)
+
+    print(f"\n{'Precision':<10} {'recall':>8} {'p50 ms':>8} {'p95 ms':>8} {'vectors MB':>11} {'build s':>8}")
+    print("-" * 60)
+
+    for precision in INDEX_PRECISIONS:
+        result = benchmark_index(precision, args.index_type, corpus, queries, truth, args.k)
+        print(f"{precision:<10} {result['recall']:>8.4f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+              f"{result['vector_mb']:>11.1f} {result['build_s']:>8.2f}")
+
+    benchmark_cache(corpus)
+
+
+if __name__ == "__main__":
+    main()
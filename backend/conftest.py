@@ -0,0 +1,41 @@
+"""
+Shared pytest setup for the backend tests
+"""
+import shutil
+import tempfile
+
+import pytest
+
+from app.core.config import settings
+
+_scratch_dir = None
+
+
+def pytest_configure(config):
+    """Point the data directories at a scratch directory before any test module is imported"""
+    global _scratch_dir
+    # Globals built on import (e.g. the vector store behind app.core.rag) open
+    # these paths, which would otherwise be the application's data directory
+    _scratch_dir = tempfile.mkdtemp(prefix="privai_tests_")
+    settings.faiss_index_path = f"{_scratch_dir}/faiss_index"
+    settings.ingest_jobs_dir = f"{_scratch_dir}/ingest_jobs"
+    settings.upload_dir = f"{_scratch_dir}/uploads"
+
+
+def pytest_unconfigure(config):
+    """Remove the scratch directory"""
+    if _scratch_dir is not None:
+        shutil.rmtree(_scratch_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    """
+    Temporary index directory, also set as `faiss_index_path`
+
+    Tests change other settings with `monkeypatch.setattr(settings, ...)`,
+    so every setting is restored when the test ends.
+    """
+    path = tmp_path / "faiss_index"
+    monkeypatch.setattr(settings, "faiss_index_path", str(path))
+    return str(path)
@@ -154,7 +154,7 @@ def demonstrate_basic_operations():
         chunk_ids = db.add_chunks(documents, embeddings)
         
         print(f"✅ Added {len(chunk_ids)} documents to database")
-        print(f"   Chunk IDs: {[id[:8] + '...' for id in chunk_ids[:3]]}")
+        print(f"   Chunk IDs: {chunk_ids[:3]}...")
         print(f"   Total chunks: {db.get_chunk_count()}")
         print(f"   Metadata entries: {db.get_metadata_count()}")
         
@@ -55,11 +55,24 @@ def test_ingest(file_id):
         }
         
         response = requests.post(f"{BASE_URL}/ingest/", json=data)
-        if response.status_code == 200:
-            print("✅ Ingest test passed")
-            result = response.json()
-            print(f"   Chunks processed: {result['chunks_processed']}")
-            print(f"   Index size: {result['index_size']}")
+        if response.status_code == 202:
+            job_id = response.json()["job_id"]
+            print(f"   Job queued: {job_id}")
+            
+            # Poll the job until it finishes
+            job = response.json()
+            while job["status"] in ("queued", "running"):
+                time.sleep(0.5)
+                job = requests.get(f"{BASE_URL}/ingest/jobs/{job_id}").json()
+            
+            if job["status"] == "completed":
+                print("✅ Ingest test passed")
+                result = job["result"]
+                print(f"   Chunks processed: {result['chunks_processed']}")
+                print(f"   Index size: {result['index_size']}")
+                print(f"   Progress: {job['progress']}")
+            else:
+                print(f"❌ Ingest job {job['status']}: {job['error']}")
         else:
             print(f"❌ Ingest test failed: {response.status_code}")
             print(f"   Response: {response.text}")
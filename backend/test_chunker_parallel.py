@@ -0,0 +1,102 @@
+"""
+Tests for parallel PDF page parsing in the FileChunker
+"""
+from pathlib import Path
+import numpy as np
+import pytest
+from app.core.chunker import FileChunker, close_pdf_pool, settings
+from app.core.chunk_table import derive_chunk_id
+from app.core.vector_db import VectorDatabase
+
+def write_pdf(path, pages):
+    """Write a minimal PDF with one line of Helvetica text per entry in `pages` (an empty entry is a blank page)"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 10 Tf 40 800 Td ({text}) Tj ET" if text else ""
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    data += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    Path(path).write_bytes(data)
+
+def without_timestamps(chunks):
+    """Chunk texts and metadata, minus the creation time"""
+    return [(c["text"], {k: v for k, v in c["metadata"].items() if k != "created_at"}) for c in chunks]
+
+PAGES = [f"Page {n} starts here. It has a few sentences of text. Sentence {n} ends the page."
+         if n % 7 else "" for n in range(1, 41)]
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    """40-page PDF with every seventh page blank"""
+    path = tmp_path / "report.pdf"
+    write_pdf(path, PAGES)
+    return path
+
+@pytest.fixture
+def chunker():
+    """Chunker with small chunks; the PDF worker pool is closed afterwards"""
+    yield FileChunker(chunk_size=10, chunk_overlap=3)
+    close_pdf_pool()
+
+def test_parallel_matches_serial(pdf_path, chunker, monkeypatch):
+    """Test that parallel page parsing gives the same chunks, in the same order, as serial parsing"""
+    monkeypatch.setattr(settings, "pdf_parse_workers", 1)
+    serial = chunker.parse_file(pdf_path)
+
+    monkeypatch.setattr(settings, "pdf_parse_workers", 2)
+    monkeypatch.setattr(settings, "pdf_parse_min_pages", 8)
+    parallel = chunker.parse_file(pdf_path)
+
+    assert serial
+    assert without_timestamps(parallel) == without_timestamps(serial)
+
+def test_page_order_and_empty_pages(pdf_path, chunker, monkeypatch):
+    """Test that parallel parsing keeps the page order and skips blank pages"""
+    monkeypatch.setattr(settings, "pdf_parse_workers", 2)
+    monkeypatch.setattr(settings, "pdf_parse_min_pages", 8)
+    page_numbers = [c['metadata']['page_number'] for c in chunker.parse_file(pdf_path)]
+
+    assert page_numbers == sorted(page_numbers)
+    assert set(page_numbers) == {n for n in range(1, 41) if n % 7}
+
+def test_stream_pages(pdf_path, chunker, monkeypatch):
+    """Test that streaming pages can stop part way through"""
+    monkeypatch.setattr(settings, "pdf_parse_workers", 2)
+    monkeypatch.setattr(settings, "pdf_parse_min_pages", 8)
+    stream = chunker.iter_chunks(pdf_path)
+    first = [next(stream) for _ in range(3)]
+    stream.close()
+
+    assert [page[0]['metadata']['page_number'] for page in first] == [1, 2, 3]
+
+def test_chunk_ids_stable_across_pages(tmp_path):
+    """Test that a multi-page PDF gets the same derived chunk IDs on every ingestion, without probing"""
+    pdf_path = tmp_path / "short.pdf"
+    write_pdf(pdf_path, [f"Page {n} has one sentence. And page {n} has another." for n in range(1, 6)])
+    chunker = FileChunker(chunk_size=5, chunk_overlap=1)
+
+    ingested = []
+    for _ in range(2):
+        chunks = chunker.parse_file(pdf_path)
+        embeddings = list(np.random.rand(len(chunks), 384).astype(np.float32))
+        ingested.append(VectorDatabase(index_type="flat").add_chunks(chunks, embeddings))
+
+    file_hash = chunks[0]["metadata"]["file_hash"]
+    assert len({c["metadata"]["page_number"] for c in chunks}) == 5
+    assert [c["metadata"]["chunk_index"] for c in chunks] == list(range(len(chunks)))
+    assert ingested[0] == ingested[1]
+    assert ingested[0] == [derive_chunk_id(file_hash, i) for i in range(len(chunks))]
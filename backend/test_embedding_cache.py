@@ -0,0 +1,85 @@
+"""
+Tests for the Embedding Cache module
+"""
+import hashlib
+import numpy as np
+import pytest
+from app.core.embedding_cache import EmbeddingCache, CacheWriter
+
+KEYS = [hashlib.md5(f"chunk {i}".encode()).hexdigest() for i in range(20)]
+
+@pytest.fixture
+def embeddings():
+    """Random embeddings, one per key"""
+    return np.random.rand(len(KEYS), 384).astype('float32')
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    """Temporary cache directory"""
+    return str(tmp_path / "embedding_cache")
+
+def test_batched_writes_and_lookups(cache_dir, embeddings):
+    """Test that a batch lookup returns the positions and values of the cached keys"""
+    cache = EmbeddingCache(cache_dir, embedding_dim=384, max_entries=100)
+    assert cache.put_many(KEYS[:10], embeddings[:10]) == 10
+
+    hit_positions, cached = cache.get_many(KEYS)
+    assert list(hit_positions) == list(range(10))
+    assert np.allclose(cached, embeddings[:10])
+
+def test_reopen(cache_dir, embeddings):
+    """Test that a reopened cache serves the rows written before"""
+    EmbeddingCache(cache_dir, embedding_dim=384, max_entries=100).put_many(KEYS[:10], embeddings[:10])
+
+    reopened = EmbeddingCache(cache_dir, embedding_dim=384, max_entries=100)
+    hit_positions, cached = reopened.get_many(KEYS[:10])
+    assert len(reopened) == 10
+    assert len(hit_positions) == 10
+    assert np.allclose(cached, embeddings[:10])
+
+def test_lru_eviction(cache_dir, embeddings):
+    """Test that the least recently used entries are evicted first"""
+    EmbeddingCache(cache_dir, embedding_dim=384, max_entries=100).put_many(KEYS[:10], embeddings[:10])
+
+    small = EmbeddingCache(cache_dir, embedding_dim=384, max_entries=12)
+    small.get_many(KEYS[5:10])  # Touch the newest half
+    small.put_many(KEYS[10:15], embeddings[10:15])
+    assert len(small) <= 12
+    assert KEYS[9] in small
+    assert KEYS[0] not in small
+
+def test_clear(cache_dir, embeddings):
+    """Test that clearing removes every entry"""
+    cache = EmbeddingCache(cache_dir, embedding_dim=384, max_entries=100)
+    cache.put_many(KEYS[:10], embeddings[:10])
+
+    assert cache.clear() == 10
+    assert len(cache) == 0
+    assert len(EmbeddingCache(cache_dir, embedding_dim=384, max_entries=100)) == 0
+
+def test_write_behind_writer(cache_dir, embeddings):
+    """Test that the writer stores every submitted embedding on flush"""
+    cache = EmbeddingCache(cache_dir, embedding_dim=384, max_entries=100)
+    writer = CacheWriter(cache, flush_size=8, flush_interval=0.05)
+    try:
+        for start in range(0, 10, 2):
+            writer.submit(KEYS[start:start + 2], embeddings[start:start + 2])
+        writer.flush()
+        assert writer.written == 10
+        assert len(cache) == 10
+        assert np.allclose(cache.get(KEYS[3]), embeddings[3])
+    finally:
+        writer.close()
+
+def test_shared_directory(cache_dir, embeddings):
+    """Test that two caches on one directory see each other's rows"""
+    first = EmbeddingCache(cache_dir, embedding_dim=384, max_entries=100)
+    second = EmbeddingCache(cache_dir, embedding_dim=384, max_entries=100)
+    first.put(KEYS[15], embeddings[15])
+    second.put(KEYS[16], embeddings[16])
+    first.put(KEYS[17], embeddings[17])
+
+    assert np.allclose(second.get(KEYS[16]), embeddings[16])
+    assert np.allclose(first.get(KEYS[16]), embeddings[16])
+    shared = EmbeddingCache(cache_dir, embedding_dim=384, max_entries=100)
+    assert all(np.allclose(shared.get(KEYS[i]), embeddings[i]) for i in (15, 16, 17))
@@ -30,7 +30,8 @@ class MockLogger:
 import sys
 from unittest.mock import MagicMock
 
-# Mock the modules
+# Mock the modules (only while importing, see below)
+_real_modules = dict(sys.modules)
 sys.modules['app.core.config'] = MagicMock()
 sys.modules['app.core.config'].settings = MockSettings()
 sys.modules['app.core.logging'] = MagicMock()
@@ -43,6 +44,12 @@ try:
 except ImportError as e:
     print(f"❌ Could not import embeddings module: {e}")
     EMBEDDINGS_AVAILABLE = False
+finally:
+    # Put the real modules back, so test modules imported after this one do not get the mocks
+    for name in [name for name in sys.modules if name.startswith("app.")]:
+        if sys.modules[name] is not _real_modules.get(name):
+            del sys.modules[name]
+    sys.modules.update({name: module for name, module in _real_modules.items() if name.startswith("app.")})
 
 def test_embeddings_standalone():
     """Test the embeddings functionality without full dependencies"""
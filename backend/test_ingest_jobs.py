@@ -0,0 +1,91 @@
+"""
+Tests for the background ingestion job queue
+"""
+import threading
+import time
+import pytest
+from app.core.ingest_jobs import IngestJobQueue, STAGES
+
+def make_runner(documents, release):
+    """Create a runner that reports every stage for each document, waiting for `release` before each one"""
+    def runner(job):
+        job.set_total(documents)
+        for _ in range(documents):
+            release.wait(timeout=5)
+            job.checkpoint()
+            for stage in STAGES:
+                job.advance(stage, 1 if stage == "parsed" else 10)
+        return {"status": "success", "documents": documents}
+    return runner
+
+def wait_for(job, statuses, timeout=5.0):
+    """Wait until a job reaches one of the statuses"""
+    deadline = time.time() + timeout
+    while job.status not in statuses and time.time() < deadline:
+        time.sleep(0.01)
+    return job.status
+
+@pytest.fixture
+def jobs_dir(tmp_path):
+    """Temporary job file directory"""
+    return str(tmp_path / "ingest_jobs")
+
+@pytest.fixture
+def release():
+    """Event the runner waits for before each document (set by default)"""
+    event = threading.Event()
+    event.set()
+    yield event
+    event.set()
+
+@pytest.fixture
+def queue(jobs_dir, release):
+    """Started job queue with one worker running three-document jobs"""
+    queue = IngestJobQueue(make_runner(3, release), jobs_dir=jobs_dir, max_workers=1)
+    queue.start()
+    yield queue
+    queue.close()
+
+def test_job_reports_progress(queue):
+    """Test that a job runs in the background and reports per-stage progress"""
+    job = queue.submit({"source_type": "files", "file_ids": ["a", "b", "c"]})
+
+    assert wait_for(job, ("completed", "failed")) == "completed"
+    assert job.progress == {"documents": 3, "skipped": 0, "parsed": 3, "chunked": 30, "embedded": 30, "indexed": 30}
+    assert job.result == {"status": "success", "documents": 3}
+
+def test_cancel_jobs(queue, release):
+    """Test cancelling a queued job and a running job"""
+    release.clear()
+    running = queue.submit({"source_type": "files", "file_ids": ["d"]})
+    queued = queue.submit({"source_type": "files", "file_ids": ["e"]})
+    assert wait_for(running, ("running",)) == "running"
+
+    queue.cancel(queued.job_id)
+    queue.cancel(running.job_id)
+    release.set()
+    assert wait_for(queued, ("cancelled",)) == "cancelled"
+    assert wait_for(running, ("cancelled",)) == "cancelled"
+
+def test_resume_after_restart(queue, release, jobs_dir):
+    """Test that a job interrupted by shutdown resumes on restart, unless it cannot"""
+    release.clear()
+    interrupted = queue.submit({"source_type": "files", "file_ids": ["f", "g"]})
+    assert wait_for(interrupted, ("running",)) == "running"
+    unresumable = queue.submit({"source_type": "database", "connection_id": "c"},
+                               restart_error="Connection lost on restart")
+    threading.Timer(0.1, release.set).start()
+    queue.close()
+    assert interrupted.status == "queued"
+
+    restarted = IngestJobQueue(make_runner(2, release), jobs_dir=jobs_dir, max_workers=1)
+    try:
+        assert restarted.start() == 1
+        assert wait_for(restarted.get(interrupted.job_id), ("completed", "failed")) == "completed"
+        failed = restarted.get(unresumable.job_id)
+        assert failed.status == "failed"
+        assert failed.error == "Connection lost on restart"
+        assert [job.job_id for job in restarted.list_jobs()] == [unresumable.job_id, interrupted.job_id]
+        assert restarted.get_stats()["jobs"] == {"completed": 1, "failed": 1}
+    finally:
+        restarted.close()
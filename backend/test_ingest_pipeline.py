@@ -0,0 +1,182 @@
+"""
+Tests for the streaming ingestion pipeline
+"""
+import threading
+import time
+import numpy as np
+import pytest
+from app.core.file_processor import file_processor
+from app.core.ingest_pipeline import IngestPipeline, run_stages
+from app.core.vector_db import VectorDatabase
+
+class RandomEmbeddingStore:
+    """Vector store stand-in embedding chunks with random vectors instead of the model"""
+
+    def __init__(self, index_path):
+        self.vector_db = VectorDatabase(index_type="flat", index_path=index_path)
+        self.batches = 0
+
+    def embed_documents(self, documents):
+        self.batches += 1
+        return documents, list(np.random.rand(len(documents), 384).astype('float32') - 0.5)
+
+    def append_document_chunks(self, document_id, content_hash, chunks, embeddings):
+        for chunk in chunks:
+            chunk["metadata"].update(document_id=document_id, content_hash=content_hash)
+        return self.vector_db.add_chunks(chunks, embeddings, content_hash, staged=True)
+
+    def commit_document(self, document_id, content_hash, chunk_ids):
+        return self.vector_db.commit_document(document_id, content_hash, chunk_ids)
+
+    def abort_document(self, chunk_ids):
+        self.vector_db.remove_chunks(chunk_ids)
+
+def make_source(document_id, pages, content_hash="v1"):
+    """Create a pipeline source serving the given pages"""
+    return {"document_id": document_id, "content_hash": content_hash,
+            "metadata": {"source": document_id}, "pages": lambda: iter(pages)}
+
+PAGES = [f"Page {p}. " + " ".join(f"word{p}_{i}" for i in range(150)) + "\n" for p in range(20)]
+
+def double(items):
+    for item in items:
+        yield item * 2
+
+@pytest.fixture
+def store(index_dir):
+    """Store with random embeddings on the temporary index"""
+    return RandomEmbeddingStore(index_dir)
+
+@pytest.fixture
+def pipeline(store):
+    """Pipeline with small chunks, batches and buffers"""
+    return IngestPipeline(store, chunk_size=200, chunk_overlap=40, batch_size=16, buffer_size=2)
+
+def test_run_stages_keeps_order():
+    """Test that chained stages run concurrently and keep the item order"""
+    assert list(run_stages(range(100), [double, double], 2)) == [i * 4 for i in range(100)]
+
+def test_run_stages_raises_stage_errors():
+    """Test that an error in a stage is raised to the consumer"""
+    def fail(items):
+        for item in items:
+            if item == 10:
+                raise ValueError("stage failed")
+            yield item
+
+    with pytest.raises(ValueError, match="stage failed"):
+        list(run_stages(range(100), [double, fail], 2))
+
+def test_run_stages_stops_on_early_exit():
+    """Test that the stage threads stop when the consumer stops reading"""
+    before = threading.active_count()
+    for _ in run_stages(iter(int, 1), [double], 2):
+        break
+    time.sleep(0.2)
+    assert threading.active_count() == before
+
+def test_streamed_chunks(store, pipeline):
+    """Test that streamed chunks match chunking the whole text, and progress covers every stage"""
+    progress = {}
+
+    def on_progress(stage, count):
+        progress[stage] = progress.get(stage, 0) + count
+
+    results = pipeline.run([make_source("doc_a", PAGES), make_source("doc_b", PAGES[:3])], on_progress)
+    chunks_added = sum(r["chunks_added"] for r in results)
+    texts = [store.vector_db.get_chunk_by_id(cid)["text"] for cid in store.vector_db.documents["doc_a"]["chunk_ids"]]
+
+    assert [(r["document_id"], r["status"]) for r in results] == [("doc_a", "added"), ("doc_b", "added")]
+    assert texts == file_processor.chunk_text("".join(PAGES).strip(), 200, 40)
+    assert progress == {"parsed": 2, "chunked": chunks_added, "embedded": chunks_added, "indexed": chunks_added}
+    assert store.batches > 1
+
+    # Committing folds the delta vectors into the index until the delta is
+    # below the committed threshold, a tenth of the index
+    fold_thread = store.vector_db._fold_thread
+    if fold_thread is not None:
+        fold_thread.join()
+    with store.vector_db._lock:
+        assert len(store.vector_db.delta) < store.vector_db._fold_threshold(committed=True)
+    assert store.vector_db.index.ntotal + len(store.vector_db.delta) == chunks_added
+    assert store.vector_db.index.ntotal >= len(store.vector_db.documents["doc_a"]["chunk_ids"])
+
+def test_replace_document(store, pipeline):
+    """Test that a new version replaces the old one only when it is committed"""
+    pipeline.run([make_source("doc_b", PAGES[:3])])
+    old_ids = set(store.vector_db.documents["doc_b"]["chunk_ids"])
+    query = np.random.rand(384).astype('float32')
+    visible = []
+
+    def watch():
+        hits = store.vector_db.search_by_metadata({"document_id": "doc_b"}, query, k=100)
+        visible.append({hit["chunk_id"] for hit in hits})
+
+    results = pipeline.run([make_source("doc_b", PAGES[5:7], content_hash="v2")], checkpoint=watch)
+    new_ids = set(store.vector_db.documents["doc_b"]["chunk_ids"])
+
+    assert results[0]["status"] == "replaced"
+    assert results[0]["chunks_removed"] == len(old_ids)
+    assert visible and all(ids == old_ids for ids in visible)
+    assert not any(cid in store.vector_db for cid in old_ids)
+    assert all(cid in store.vector_db for cid in new_ids)
+    assert store.vector_db.is_document_current("doc_b", "v2")
+    assert not store.vector_db.is_document_current("doc_copy", "v2")
+
+def test_abort_mid_document(store, pipeline):
+    """Test that a stopped run removes the chunks of the unfinished document"""
+    appends = []
+
+    def checkpoint():
+        appends.append(1)
+        if len(appends) > 3:
+            raise RuntimeError("cancelled")
+
+    with pytest.raises(RuntimeError):
+        pipeline.run([make_source("doc_c", PAGES * 3)], checkpoint=checkpoint)
+    assert len(store.vector_db) == 0
+    assert "doc_c" not in store.vector_db.documents
+
+def test_ready_chunks(store, pipeline):
+    """Test that sources already chunked (e.g. by the FileChunker) keep their order and metadata"""
+    page_chunks = [[{"text": f"Page {p} chunk {i}", "metadata": {"page_number": p, "chunk_index": i}}
+                    for i in range(3)] for p in range(1, 11)]
+    source = {"document_id": "doc_d", "content_hash": "v1", "metadata": {"source": "doc_d"},
+              "chunks": lambda: iter(page_chunks)}
+
+    results = pipeline.run([source])
+    stored = [store.vector_db.get_chunk_by_id(cid) for cid in store.vector_db.documents["doc_d"]["chunk_ids"]]
+    assert results[0]["chunks_added"] == 30
+    assert [c["text"] for c in stored] == [c["text"] for p in page_chunks for c in p]
+    assert stored[4]["metadata"]["page_number"] == 2
+    assert stored[4]["metadata"]["chunk_index"] == 1
+    assert stored[4]["metadata"]["source"] == "doc_d"
+
+def test_crash_while_staging(store, pipeline, index_dir):
+    """Test that chunks staged before a crash are dropped on the next start"""
+    pipeline.run([make_source("doc_e", PAGES[:2])])
+    staged = store.append_document_chunks("doc_e", "v2", *store.embed_documents(
+        [{"text": f"draft {i}", "metadata": {"chunk_index": i}} for i in range(5)]))
+    assert not any(cid in store.vector_db for cid in staged)
+    assert store.vector_db.merge_segments() > 0
+
+    restarted = VectorDatabase(index_type="flat", index_path=index_dir)
+    assert len(restarted) == len(store.vector_db)
+    assert restarted.chunks.staged_count() == 0
+    assert restarted.get_document("doc_e")["content_hash"] == "v1"
+
+def test_merge_keeps_staged_chunks(store, index_dir):
+    """Test that a merge during staging still lets the commit survive a restart"""
+    documents = [{"text": f"chunk {i}", "metadata": {"chunk_index": i}} for i in range(6)]
+    first = store.append_document_chunks("doc_f", "v1", *store.embed_documents(documents[:3]))
+    assert store.vector_db.merge_segments() > 0
+    chunks, embeddings = store.embed_documents(documents[3:])
+    second = store.append_document_chunks("doc_f", "v1", chunks, embeddings)
+    assert store.vector_db.merge_segments() > 0
+    store.commit_document("doc_f", "v1", first + second)
+
+    restarted = VectorDatabase(index_type="flat", index_path=index_dir)
+    assert restarted.chunks.staged_count() == 0
+    assert restarted.get_document("doc_f")["chunk_ids"] == first + second
+    assert [restarted.get_chunk_by_id(cid)["text"] for cid in first + second] == [d["text"] for d in documents]
+    assert restarted.query_top_k(embeddings[0], k=1)[0]["text"] == "chunk 3"
@@ -0,0 +1,89 @@
+"""
+Tests for pre-filtered metadata search
+"""
+import numpy as np
+import pytest
+from app.core.vector_db import VectorDatabase
+
+def make_chunks(count):
+    """Create chunks spread over 100 documents with random embeddings"""
+    chunks = [
+        {
+            "text": f"Chunk {i}",
+            "metadata": {
+                "document_id": f"document_{i % 100}.pdf",
+                "source_file": f"document_{i % 100}.pdf",
+                "chunk_type": "table" if i % 10 == 0 else "document",
+                "page_number": i % 30,
+                "department": "IT" if i % 3 else "HR"
+            }
+        }
+        for i in range(count)
+    ]
+    embeddings = np.random.rand(count, 384).astype('float32') - 0.5
+    return chunks, list(embeddings)
+
+@pytest.fixture(params=["flat", "hnsw"])
+def index_type(request):
+    """Index type under test"""
+    return request.param
+
+@pytest.fixture
+def filled_db(index_dir, index_type):
+    """Database of 5000 chunks over 100 documents, and their chunk IDs"""
+    db = VectorDatabase(index_path=index_dir, index_type=index_type)
+    return db, db.add_chunks(*make_chunks(5000))
+
+@pytest.fixture
+def db(filled_db):
+    """Database of 5000 chunks over 100 documents"""
+    return filled_db[0]
+
+@pytest.fixture
+def query():
+    """Random query vector"""
+    return np.random.rand(384).astype('float32') - 0.5
+
+def test_single_document(db, query):
+    """Test that filtering to one document still returns k results, all from it"""
+    results = db.search_by_metadata({"document_id": "document_7.pdf"}, query, k=5)
+    assert len(results) == 5
+    assert all(r['metadata']['document_id'] == 'document_7.pdf' for r in results)
+
+def test_value_list_and_range(db, query):
+    """Test value lists and page ranges"""
+    results = db.search_by_metadata(
+        {"source_file": ["document_1.pdf", "document_2.pdf"], "page_number": {"gte": 10, "lt": 20}},
+        query, k=10
+    )
+    assert len(results) == 10
+    assert all(r['metadata']['source_file'] in ("document_1.pdf", "document_2.pdf") for r in results)
+    assert all(10 <= r['metadata']['page_number'] < 20 for r in results)
+
+def test_large_candidate_set(db, query):
+    """Test a filter matching most chunks, which searches through a FAISS ID selector"""
+    results = db.search_by_metadata({"chunk_type": "document"}, query, k=5)
+    assert len(results) == 5
+    assert all(r['metadata']['chunk_type'] == 'document' for r in results)
+
+def test_non_indexed_field(db, query):
+    """Test that fields without an inverted index are checked on the hits"""
+    results = db.search_by_metadata({"document_id": "document_9.pdf", "department": "HR"}, query, k=5)
+    assert len(results) == 5
+    assert all(r['metadata']['document_id'] == 'document_9.pdf' for r in results)
+    assert all(r['metadata']['department'] == 'HR' for r in results)
+
+def test_removed_chunks_never_match(filled_db, query):
+    """Test that removed chunks are left out of filtered results"""
+    db, chunk_ids = filled_db
+    db.remove_chunks(chunk_ids[:100])
+    results = db.search_by_metadata({"document_id": "document_0.pdf"}, query, k=100)
+    assert len(results) == 49
+    assert not set(chunk_ids[:100]) & {r['chunk_id'] for r in results}
+
+def test_reopened_snapshot(db, query, index_dir, index_type):
+    """Test that the saved snapshot gives the same filtered results"""
+    db.save_index()
+    reopened = VectorDatabase(index_path=index_dir, index_type=index_type)
+    expected = [r['chunk_id'] for r in db.search_by_metadata({"page_number": 5}, query, k=5)]
+    assert [r['chunk_id'] for r in reopened.search_by_metadata({"page_number": 5}, query, k=5)] == expected
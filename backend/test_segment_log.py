@@ -0,0 +1,88 @@
+"""
+Tests for incremental vector database persistence (segment log)
+"""
+import json
+from pathlib import Path
+import numpy as np
+import pytest
+from app.core.segment_log import write_file_atomic, read_manifest, versioned_name, COMMIT_MARKER, NEXT_SUFFIX
+from app.core.vector_db import VectorDatabase
+
+def make_chunks(count, prefix):
+    """Create chunks with random normalized embeddings"""
+    chunks = [{"text": f"{prefix} chunk {i}", "metadata": {"chunk_type": prefix}} for i in range(count)]
+    embeddings = np.random.rand(count, 384).astype('float32')
+    return chunks, list(embeddings)
+
+@pytest.fixture
+def db(index_dir):
+    """Database with added, replaced and removed chunks, all still in segments"""
+    db = VectorDatabase(index_path=index_dir)
+    chunk_ids = db.add_chunks(*make_chunks(5, "document"))
+    db.replace_document("policy.pdf", "hash-1", *make_chunks(2, "policy"))
+    db.replace_document("policy.pdf", "hash-2", *make_chunks(3, "policy"))
+    db.remove_chunks(chunk_ids[:2])
+    return db
+
+def test_changes_appended_as_segments(db):
+    """Test that every change is logged as a segment"""
+    stats = db.get_stats()['segment_log']
+    assert stats['segments'] == 4
+    assert stats['bytes'] > 0
+    assert len(db) == 6
+
+def test_replay_on_startup(db, index_dir):
+    """Test that a reopened database replays the segments to the same state"""
+    query = np.random.rand(384).astype('float32')
+    expected = [r['chunk_id'] for r in db.query_top_k(query, k=10)]
+
+    reopened = VectorDatabase(index_path=index_dir)
+    assert len(reopened) == len(db)
+    assert [r['chunk_id'] for r in reopened.query_top_k(query, k=10)] == expected
+    assert reopened.get_document('policy.pdf')['content_hash'] == "hash-2"
+
+def test_merge_segments(db, index_dir):
+    """Test that merging folds the segments into a new generation and removes the old files"""
+    assert db.merge_segments() == 4
+    assert len(db.segment_log) == 0
+
+    first = read_manifest(Path(index_dir))
+    db.add_chunks(*make_chunks(1, "next"))
+    db.merge_segments()
+    db.add_chunks(*make_chunks(1, "next"))
+    db.merge_segments()
+    latest = read_manifest(Path(index_dir))
+    assert latest['generation'] > first['generation']
+    assert not any((Path(index_dir) / name).exists() for name in first['files'].values())
+
+    db.add_chunks(*make_chunks(2, "late"))
+    assert len(VectorDatabase(index_path=index_dir)) == 10
+
+def test_uncommitted_files_ignored(db, index_dir):
+    """Test that a half-written generation and a torn segment are ignored on load"""
+    db.merge_segments()
+    generation = read_manifest(Path(index_dir))["generation"] + 1
+    write_file_atomic(Path(index_dir) / versioned_name("faiss_index.bin", generation), b"half-written")
+    (Path(index_dir) / "segments" / "segment_0000009999.seg.tmp").write_bytes(b"torn")
+
+    assert len(VectorDatabase(index_path=index_dir)) == len(db)
+
+def test_committed_swap_rolled_forward(db, index_dir):
+    """Test that a swap committed before the manifest was written is completed on load"""
+    files = db._serialize_base(db.segment_log.last_seq)
+    for path in Path(index_dir).iterdir():
+        if path.is_file():
+            path.unlink()
+    for name, data in files.items():
+        write_file_atomic(Path(index_dir) / (name + NEXT_SUFFIX), data)
+    write_file_atomic(Path(index_dir) / COMMIT_MARKER, json.dumps(sorted(files)).encode())
+
+    rolled_forward = VectorDatabase(index_path=index_dir)
+    assert rolled_forward.segment_seq == db.segment_log.last_seq
+    assert len(rolled_forward) == len(db)
+
+def test_clear(db, index_dir):
+    """Test that clearing empties the database on disk and the segment log"""
+    db.clear()
+    assert len(VectorDatabase(index_path=index_dir)) == 0
+    assert len(db.segment_log) == 0
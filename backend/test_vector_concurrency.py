@@ -0,0 +1,89 @@
+"""
+Tests for searches running concurrently with ingestion (snapshot isolation)
+"""
+import threading
+import numpy as np
+import pytest
+from app.core.vector_db import VectorDatabase, settings
+
+def make_chunks(count, batch):
+    """Create chunks tagged with their batch, with random embeddings"""
+    chunks = [{"text": f"Batch {batch} chunk {i}", "metadata": {"chunk_type": f"batch_{batch}", "page_number": i}}
+              for i in range(count)]
+    embeddings = np.random.rand(count, 384).astype('float32') - 0.5
+    return chunks, list(embeddings)
+
+@pytest.fixture
+def db(index_dir, monkeypatch):
+    """Flat database that folds its delta vectors every 500 vectors"""
+    monkeypatch.setattr(settings, "vector_delta_fold_size", 500)
+    return VectorDatabase(index_type="flat", index_path=index_dir)
+
+@pytest.fixture
+def query():
+    """Random query vector"""
+    return np.random.rand(384).astype('float32') - 0.5
+
+def test_search_during_ingestion(db, query):
+    """Test that searches only ever see whole batches while chunks are added, folded and removed"""
+    stop = threading.Event()
+    errors = []
+
+    def search():
+        while not stop.is_set():
+            snapshot = db._snapshot
+            results = db.query_top_k(query, k=10)
+
+            # A snapshot holds whole batches: 200 chunks each, minus removed halves
+            if len(snapshot.chunks) % 100:
+                errors.append(f"partial batch visible: {len(snapshot.chunks)} chunks")
+            if len({r['chunk_id'] for r in results}) != len(results):
+                errors.append("duplicate results")
+
+            filtered = db.search_by_metadata({"chunk_type": "batch_0"}, query, k=5)
+            if any(r['metadata']['chunk_type'] != "batch_0" for r in filtered):
+                errors.append("filter returned other batches")
+
+    db.add_chunks(*make_chunks(200, 0))
+    readers = [threading.Thread(target=search) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+
+    try:
+        for batch in range(1, 20):
+            chunk_ids = db.add_chunks(*make_chunks(200, batch))
+            if batch % 4 == 0:
+                db.remove_chunks(chunk_ids[:100])
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+    assert errors == []
+    assert len(db) == 20 * 200 - 4 * 100
+
+def test_fold_delta(db, query):
+    """Test that folding the delta vectors into the index keeps the results"""
+    for batch in range(2):
+        db.add_chunks(*make_chunks(200, batch))
+    before = [r['chunk_id'] for r in db.query_top_k(query, k=10)]
+
+    db.fold_delta()
+    assert db.get_stats()['delta_vectors'] == 0
+    assert db.index.ntotal == 400
+    assert [r['chunk_id'] for r in db.query_top_k(query, k=10)] == before
+
+def test_snapshot_isolation(db, query):
+    """Test that an older snapshot is unaffected by later writes"""
+    db.add_chunks(*make_chunks(200, 0))
+    before = [r['chunk_id'] for r in db.query_top_k(query, k=10)]
+
+    snapshot = db._snapshot
+    chunk_count = len(snapshot.chunks)
+    db.add_chunks(*make_chunks(200, 99))
+    db.remove_chunks(before[:5])
+
+    assert len(snapshot.chunks) == chunk_count
+    assert before[0] in snapshot.chunks
+    assert len(db) == 395
+    assert before[0] not in db
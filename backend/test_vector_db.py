@@ -2,6 +2,7 @@
 Test script for the Vector Database module
 """
 import json
+import tempfile
 import numpy as np
 from pathlib import Path
 from app.core.vector_db import VectorDatabase, create_vector_database, load_vector_database
@@ -144,7 +145,7 @@ def test_vector_database():
         print("-" * 40)
         
         # Save index
-        test_index_path = "test_vector_index"
+        test_index_path = tempfile.mkdtemp(prefix="privai_test_vector_index_")
         db.save_index(test_index_path)
         print(f"✅ Index saved to: {test_index_path}")
         
@@ -297,11 +298,13 @@ def test_convenience_functions():
         
         # Test load_vector_database
         print(f"\n📂 Testing load_vector_database")
-        db2 = load_vector_database("non_existent_path", embedding_dim=384)
+        missing_path = Path(tempfile.mkdtemp(prefix="privai_missing_")) / "non_existent_path"
+        db2 = load_vector_database(str(missing_path), embedding_dim=384)
         if db2 is None:
             print(f"✅ Correctly returned None for non-existent path")
         else:
             print(f"✅ Loaded database from path")
+        print(f"   Nothing created at the missing path: {not missing_path.exists()}")
         
     except Exception as e:
         print(f"❌ Convenience function testing failed: {e}")
@@ -2,15 +2,19 @@
 Standalone test for the Vector Database module (no external dependencies)
 """
 import json
+import tempfile
 import numpy as np
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Tuple, Union
 import uuid
 import pickle
 
+from app.core.config import Settings
+
 # Mock the required modules for testing
-class MockSettings:
-    faiss_index_path = "data/faiss_index"
+class MockSettings(Settings):
+    """Application defaults, with the index kept out of the data directory"""
+    faiss_index_path: str = tempfile.mkdtemp(prefix="privai_standalone_")
 
 class MockLogger:
     def info(self, msg, **kwargs):
@@ -29,7 +33,8 @@ class MockLogger:
 import sys
 from unittest.mock import MagicMock
 
-# Mock the modules
+# Mock the modules (only while importing, see below)
+_real_modules = dict(sys.modules)
 sys.modules['app.core.config'] = MagicMock()
 sys.modules['app.core.config'].settings = MockSettings()
 sys.modules['app.core.logging'] = MagicMock()
@@ -42,6 +47,12 @@ try:
 except ImportError as e:
     print(f"❌ Could not import vector database module: {e}")
     VECTOR_DB_AVAILABLE = False
+finally:
+    # Put the real modules back, so test modules imported after this one do not get the mocks
+    for name in [name for name in sys.modules if name.startswith("app.")]:
+        if sys.modules[name] is not _real_modules.get(name):
+            del sys.modules[name]
+    sys.modules.update({name: module for name, module in _real_modules.items() if name.startswith("app.")})
 
 def test_vector_database_standalone():
     """Test the vector database functionality without full dependencies"""
@@ -122,7 +133,7 @@ def test_vector_database_standalone():
         chunk_ids = db.add_chunks(sample_chunks, sample_embeddings)
         
         print(f"✅ Added {len(chunk_ids)} chunks to database")
-        print(f"   Chunk IDs: {[id[:8] + '...' for id in chunk_ids[:3]]}")
+        print(f"   Chunk IDs: {chunk_ids[:3]}")
         print(f"   Total chunks in DB: {db.get_chunk_count()}")
         print(f"   Metadata count: {db.get_metadata_count()}")
         
@@ -167,7 +178,7 @@ def test_vector_database_standalone():
         print("-" * 40)
         
         # Save index
-        test_index_path = "test_vector_index"
+        test_index_path = tempfile.mkdtemp(prefix="privai_test_vector_index_")
         db.save_index(test_index_path)
         print(f"✅ Index saved to: {test_index_path}")
         
@@ -328,11 +339,13 @@ def test_convenience_functions():
         
         # Test load_vector_database
         print(f"\n📂 Testing load_vector_database")
-        db2 = load_vector_database("non_existent_path", embedding_dim=384)
+        missing_path = Path(tempfile.mkdtemp(prefix="privai_missing_")) / "non_existent_path"
+        db2 = load_vector_database(str(missing_path), embedding_dim=384)
         if db2 is None:
             print(f"✅ Correctly returned None for non-existent path")
         else:
             print(f"✅ Loaded database from path")
+        print(f"   Nothing created at the missing path: {not missing_path.exists()}")
         
     except Exception as e:
         print(f"❌ Convenience function testing failed: {e}")